@@ -0,0 +1,96 @@
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional, Tuple
+
+from prometheus_client import Counter, Gauge
+
+CACHE_SIZE = int(os.getenv("RPC_CALL_CACHE_SIZE", "20000"))
+# "latest" reads are only cached while the known head is this fresh (~2 Polygon blocks)
+HEAD_TTL = float(os.getenv("RPC_CALL_CACHE_HEAD_TTL", "4"))
+
+MET_CACHE = Counter("atom_rpc_call_cache_total", "eth_call cache lookups", ["result"])
+MET_CACHE_SIZE = Gauge("atom_rpc_call_cache_entries", "eth_call cache entries")
+MET_CACHE_HEAD = Gauge("atom_rpc_call_cache_head", "Block number the eth_call cache is scoped to")
+
+_MISS = object()
+
+class BlockCallCache:
+    """
+    LRU of eth_call results keyed by (block, to, calldata). "latest" reads are
+    keyed by the current head; when a newer head arrives every entry for older
+    blocks is dropped, so nothing outlives the block it was read at.
+    """
+
+    def __init__(self, maxsize: int = CACHE_SIZE, head_ttl: float = HEAD_TTL):
+        self.maxsize = maxsize
+        self.head_ttl = head_ttl
+        self.head: Optional[int] = None
+        self.head_ts = 0.0
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[Tuple[int, str, str], Any]" = OrderedDict()
+
+    def advance(self, block: int) -> None:
+        if self.head is not None and block < self.head:
+            return
+        self.head_ts = time.monotonic()
+        if block == self.head:
+            return
+        self.head = block
+        MET_CACHE_HEAD.set(block)
+        stale = [k for k in self._data if k[0] < block]
+        for k in stale:
+            del self._data[k]
+        MET_CACHE_SIZE.set(len(self._data))
+
+    def key(self, call: dict, tag: Any) -> Optional[Tuple[int, str, str]]:
+        """Cache key for eth_call params, or None when the read must go to the node."""
+        if tag in (None, "latest"):
+            if self.head is None or time.monotonic() - self.head_ts > self.head_ttl:
+                return None
+            block = self.head
+        elif isinstance(tag, int):
+            block = tag
+        elif isinstance(tag, str) and tag.startswith("0x"):
+            block = int(tag, 16)
+        else:
+            return None  # pending/safe/finalized
+        if set(call) - {"to", "data", "input"}:
+            return None  # from/value/gas overrides change the result
+        return (block, str(call.get("to", "")).lower(), str(call.get("data") or call.get("input") or "").lower())
+
+    def get(self, key: Optional[Hashable]) -> Any:
+        if key is None:
+            MET_CACHE.labels("bypass").inc()
+            return _MISS
+        try:
+            value = self._data[key]
+        except KeyError:
+            self.misses += 1
+            MET_CACHE.labels("miss").inc()
+            return _MISS
+        self._data.move_to_end(key)
+        self.hits += 1
+        MET_CACHE.labels("hit").inc()
+        return value
+
+    def put(self, key: Optional[Hashable], value: Any) -> None:
+        if key is None or (self.head is not None and key[0] < self.head):
+            return
+        self._data[key] = value
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+        MET_CACHE_SIZE.set(len(self._data))
+
+    def clear(self) -> None:
+        self._data.clear()
+        MET_CACHE_SIZE.set(0)
+
+    @staticmethod
+    def is_miss(value: Any) -> bool:
+        return value is _MISS
+
+# One cache per process, shared by every client and pool
+CALL_CACHE = BlockCallCache()
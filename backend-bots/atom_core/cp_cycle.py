@@ -0,0 +1,44 @@
+from math import isqrt
+from typing import Sequence, Tuple
+
+# (reserve in, reserve out, fee numerator, fee denominator), e.g. (r0, r1, 997, 1000) for a 0.30% V2 pair
+Hop = Tuple[int, int, int, int]
+
+def amount_out(amount_in: int, r_in: int, r_out: int, fee_num: int = 997, fee_den: int = 1000) -> int:
+    """UniswapV2Library.getAmountOut, with its rounding."""
+    if amount_in <= 0 or r_in <= 0 or r_out <= 0:
+        return 0
+    x = amount_in * fee_num
+    return x * r_out // (r_in * fee_den + x)
+
+def cycle_output(amount_in: int, hops: Sequence[Hop]) -> int:
+    """Exact output of swapping through every hop in turn, rounding down at each as the pairs do."""
+    out = amount_in
+    for r_in, r_out, fee_num, fee_den in hops:
+        out = amount_out(out, r_in, r_out, fee_num, fee_den)
+    return out
+
+def compose(hops: Sequence[Hop]) -> Tuple[int, int, int]:
+    """
+    A hop maps x to a*x / (b + c*x) with a = fee_num*r_out, b = fee_den*r_in,
+    c = fee_num, and composing two such maps gives another one, so a whole
+    chain is one constant-product curve (a, b, c). Integers, no rounding.
+    """
+    a, b, c = 1, 1, 0
+    for r_in, r_out, fee_num, fee_den in hops:
+        a2, b2, c2 = fee_num * r_out, fee_den * r_in, fee_num
+        a, b, c = a * a2, b * b2, b2 * c + a * c2
+    return a, b, c
+
+def optimal_input(hops: Sequence[Hop], cost_bps: int = 0) -> int:
+    """
+    Input maximising output - input * (1 + cost_bps / 10000) over the chain,
+    e.g. with cost_bps the flash-loan fee. For a*x/(b + c*x) the derivative
+    a*b/(b + c*x)^2 equals 1 + cost at x = (sqrt(a*b / (1 + cost)) - b) / c.
+    0 when even the first unit loses (marginal rate a/b at or below 1 + cost).
+    """
+    a, b, c = compose(hops)
+    if c == 0:
+        return 0
+    root = isqrt(a * b * 10000 // (10000 + cost_bps))
+    return max(0, (root - b) // c)
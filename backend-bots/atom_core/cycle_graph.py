@@ -0,0 +1,144 @@
+import math
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+_INF = float("inf")
+
+class RateGraph:
+    """
+    Directed token graph weighted by -log(rate): a cycle whose rates multiply to
+    more than 1 has negative total weight. Edges are set one at a time as
+    reserves change, so the graph is never rebuilt between searches.
+
+    For the tracked source tokens it also keeps return bounds: bounds[s][k][u]
+    is the lightest walk of at most k edges from u back to s, i.e. the best rate
+    u can still get back to s in k legs. The depth-first cycle search prunes any
+    path that cannot close profitably even at that rate. An improving edge
+    tightens the bounds in place; a worsening one leaves them admissible but
+    loose, so they are only rebuilt once enough edges have worsened.
+    """
+
+    def __init__(self):
+        self.out: Dict[str, Dict[str, Tuple[float, Any]]] = {}  # u -> v -> (weight, tag)
+        self.inc: Dict[str, Dict[str, float]] = {}              # v -> u -> weight
+        self.sources: List[str] = []
+        self.depth = 0
+        self.bounds: Dict[str, List[Dict[str, float]]] = {}
+        self.loosened = 0  # edges worsened or removed since the last rebuild
+
+    def set_edge(self, u: str, v: str, rate: Optional[float], tag: Any = None, tighten: bool = True) -> None:
+        """
+        Best rate u -> v (output per unit input, fees applied); None or <= 0 removes
+        the edge. With tighten=False the bounds are not updated, for bulk loads that
+        call rebuild() once afterwards.
+        """
+        if rate is None or rate <= 0:
+            self.remove_edge(u, v)
+            return
+        w = -math.log(rate)
+        old = self.inc.get(v, {}).get(u)
+        self.out.setdefault(u, {})[v] = (w, tag)
+        self.inc.setdefault(v, {})[u] = w
+        if not tighten:
+            return
+        if old is None or w < old:
+            self._tighten(u, v, w)
+        elif w > old:
+            self.loosened += 1
+
+    def remove_edge(self, u: str, v: str) -> None:
+        edges = self.out.get(u)
+        if edges is not None and edges.pop(v, None) is not None:
+            self.loosened += 1
+            if not edges:
+                del self.out[u]
+            preds = self.inc[v]
+            preds.pop(u, None)
+            if not preds:
+                del self.inc[v]
+
+    def edge(self, u: str, v: str) -> Optional[Tuple[float, Any]]:
+        """(rate, tag) of the edge u -> v, None if there is none."""
+        e = self.out.get(u, {}).get(v)
+        return (math.exp(-e[0]), e[1]) if e else None
+
+    def clear(self) -> None:
+        self.out.clear()
+        self.inc.clear()
+        self.rebuild()
+
+    # ---------- return bounds ----------
+
+    def track(self, sources: Iterable[str], depth: int) -> None:
+        """Keep return bounds of up to `depth` legs to each of `sources`, the tokens cycles start from."""
+        self.sources = list(dict.fromkeys(sources))
+        self.depth = depth
+        self.rebuild()
+
+    def rebuild(self) -> None:
+        """Exact bounds from the current edges: `depth` backward relaxations per source."""
+        self.bounds = {}
+        for s in self.sources:
+            levels = [{s: 0.0}]
+            for _ in range(self.depth):
+                prev = levels[-1]
+                cur = dict(prev)
+                for v, d in prev.items():
+                    for u, w in self.inc.get(v, {}).items():
+                        if d + w < cur.get(u, _INF):
+                            cur[u] = d + w
+                levels.append(cur)
+            self.bounds[s] = levels
+        self.loosened = 0
+
+    def _tighten(self, u: str, v: str, w: float) -> None:
+        """Lower the bounds that can use the improved edge u -> v, walking back from u."""
+        for levels in self.bounds.values():
+            work = [(u, k, w + levels[k - 1][v]) for k in range(1, self.depth + 1) if v in levels[k - 1]]
+            while work:
+                x, k, d = work.pop()
+                if d >= levels[k].get(x, _INF):
+                    continue
+                levels[k][x] = d
+                if k < self.depth:
+                    work.append((x, k + 1, d))
+                    work.extend((p, k + 1, d + wp) for p, wp in self.inc.get(x, {}).items())
+
+    # ---------- search ----------
+
+    def cycles(self, max_len: int, min_len: int = 2, min_gain: float = 0.0) -> List[Tuple[float, Tuple[str, ...]]]:
+        """
+        Every simple cycle of min_len..max_len edges through a tracked source whose
+        rate product exceeds 1 + min_gain, by depth-first search from each source
+        (max_len is capped at depth + 1). A branch is cut as soon as its weight plus
+        the return bound of the remaining legs cannot close below the threshold, so
+        the work follows the number of near-profitable paths, not all of them.
+        A cycle through several sources is found once, from the first of them.
+        Returns (rate product, (s, t1, ..., s)) best first.
+        """
+        threshold = -math.log1p(min_gain)
+        max_len = min(max_len, self.depth + 1)
+        found: List[Tuple[float, Tuple[str, ...]]] = []
+        done: set = set()
+        for s in self.sources:
+            levels = self.bounds.get(s)
+            if levels is None or s not in self.out:
+                done.add(s)
+                continue
+            stack = [(s, 0.0, (s,))]
+            while stack:
+                u, d, path = stack.pop()
+                k = len(path)  # edges used once u -> v is taken
+                for v, (w, _) in self.out.get(u, {}).items():
+                    nd = d + w
+                    if v == s:
+                        if k >= min_len and nd < threshold:
+                            found.append((nd, path + (s,)))
+                        continue
+                    if k >= max_len or v in done or v in path:
+                        continue
+                    if nd + levels[max_len - k].get(v, _INF) >= threshold:
+                        continue
+                    stack.append((v, nd, path + (v,)))
+            done.add(s)
+        found.sort(key=lambda x: x[0])
+        return [(math.exp(-w), c) for w, c in found]
@@ -0,0 +1,68 @@
+from typing import Union
+
+# USD amounts, prices and rates are ints scaled by WAD; fees are ints in bps
+WAD = 10 ** 18
+HALF_WAD = WAD // 2
+BPS = 10_000
+HALF_BPS = BPS // 2
+
+def parse_wad(value: Union[str, int]) -> int:
+    """Exact WAD from a plain decimal string such as an env value ("25000", "0.35"); no exponents."""
+    s = str(value).strip()
+    neg = s.startswith("-")
+    whole, _, frac = (s[1:] if s[:1] in "+-" else s).partition(".")
+    if not (whole or frac) or not (whole + frac).isdigit() or len(frac) > 18:
+        raise ValueError(f"not a decimal with at most 18 places: {value!r}")
+    x = int(whole or "0") * WAD + int(frac.ljust(18, "0"))
+    return -x if neg else x
+
+def to_wad(amount: int, decimals: int) -> int:
+    """Base units of a token with `decimals` to whole tokens in WAD (floors past 18 decimals)."""
+    if decimals <= 18:
+        return amount * 10 ** (18 - decimals)
+    return amount // 10 ** (decimals - 18)
+
+def from_wad(x: int) -> float:
+    """For publishing only."""
+    return x / WAD
+
+def mul_div(a: int, b: int, d: int) -> int:
+    """
+    FullMath.mulDiv: a * b / d rounded down (the 512-bit intermediate is free on ints).
+    A negative result, e.g. a losing cycle's PnL, rounds toward -inf, so a loss is never understated.
+    """
+    return a * b // d
+
+def mul_div_up(a: int, b: int, d: int) -> int:
+    """FullMath.mulDivRoundingUp."""
+    return -(-(a * b) // d)
+
+def wad_mul(a: int, b: int) -> int:
+    """WadRayMath.wadMul: a * b / WAD rounded half up."""
+    return (a * b + HALF_WAD) // WAD
+
+def wad_div(a: int, b: int) -> int:
+    """WadRayMath.wadDiv: a * WAD / b rounded half up."""
+    return (a * WAD + b // 2) // b
+
+def percent_mul(value: int, bps: int) -> int:
+    """PercentageMath.percentMul: value * bps / 10000 rounded half up (Aave flash premium, close factor, bonus)."""
+    return (value * bps + HALF_BPS) // BPS
+
+def after_fee(amount: int, fee_bps: int) -> int:
+    """Input left after a pair's fee, as UniswapV2 applies it (amountIn * 997 / 1000 for 30 bps), rounded down."""
+    return amount * (BPS - fee_bps) // BPS
+
+def price_wad(r_in: int, r_out: int, dec_in: int, dec_out: int, fee_bps: int = 0) -> int:
+    """Spot rate of a V2 pair in whole tokens out per whole token in, after `fee_bps`, in WAD; 0 if empty."""
+    if r_in <= 0 or r_out <= 0:
+        return 0
+    return r_out * 10 ** dec_in * (BPS - fee_bps) * WAD // (r_in * 10 ** dec_out * BPS)
+
+def chainlink_wad(answer: int, decimals: int = 8) -> int:
+    """Chainlink aggregator answer (8 decimals for USD feeds) in WAD; 0 for a non-positive answer."""
+    return to_wad(answer, decimals) if answer > 0 else 0
+
+def gas_cost_wad(gas_price_wei: int, gas_limit: int, native_usd: int) -> int:
+    """USD cost in WAD of `gas_limit` gas at `gas_price_wei`, native token priced at `native_usd` (WAD)."""
+    return gas_price_wei * gas_limit * native_usd // WAD
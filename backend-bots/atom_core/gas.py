@@ -1,5 +1,9 @@
+import asyncio
 import statistics
 from backend_bots.atom_core.rpc_pool import with_w3
+from backend_bots.atom_core.singleflight import SingleFlight
+
+_FLIGHT = SingleFlight("gas_cap")
 
 async def dynamic_gas_cap(multiplier: float = 1.20) -> int:
     def _job(w3):
@@ -10,4 +14,5 @@ async def dynamic_gas_cap(multiplier: float = 1.20) -> int:
             basefees.append(b.get('baseFeePerGas', 0))
         cap = int(statistics.median(basefees) * multiplier)
         return cap
-    return await with_w3(lambda w3: _job(w3)) 
\ No newline at end of file
+    # concurrent signals share one 6-RPC read instead of each issuing their own
+    return await _FLIGHT.do(multiplier, lambda: with_w3(lambda w3: asyncio.to_thread(_job, w3)))
@@ -0,0 +1,88 @@
+import os
+import asyncio
+from typing import Any, Awaitable, Callable, Tuple
+
+from prometheus_client import Counter, Gauge
+
+# Idempotent reads that are safe to send twice
+HEDGEABLE_METHODS = frozenset({"eth_call", "eth_getBlockByNumber", "eth_getTransactionReceipt"})
+
+HEDGE_ENABLED = os.getenv("RPC_HEDGE", "false").lower() == "true"
+# Hedges allowed per primary request (0.05 = at most ~5% extra load)
+HEDGE_BUDGET_RATIO = float(os.getenv("RPC_HEDGE_BUDGET_RATIO", "0.05"))
+HEDGE_BUDGET_BURST = float(os.getenv("RPC_HEDGE_BUDGET_BURST", "10"))
+# Delay used until an endpoint has enough samples for a p90
+HEDGE_DEFAULT_DELAY = float(os.getenv("RPC_HEDGE_DEFAULT_DELAY", "0.25"))
+HEDGE_MIN_DELAY = float(os.getenv("RPC_HEDGE_MIN_DELAY", "0.02"))
+
+MET_HEDGES = Counter("atom_rpc_hedges_total", "Hedged requests sent", ["method"])
+MET_HEDGE_WINS = Counter("atom_rpc_hedge_wins_total", "Hedged requests answered before the primary", ["method"])
+MET_HEDGE_DENIED = Counter("atom_rpc_hedges_denied_total", "Hedges skipped because the budget was spent", ["method"])
+MET_HEDGE_WIN_RATE = Gauge("atom_rpc_hedge_win_rate", "Share of hedges that beat the primary", ["method"])
+
+class HedgeBudget:
+    """Token bucket: every primary request earns `ratio` tokens, every hedge spends one."""
+
+    def __init__(self, ratio: float = HEDGE_BUDGET_RATIO, burst: float = HEDGE_BUDGET_BURST):
+        self.ratio = ratio
+        self.burst = burst
+        self.tokens = burst
+
+    def on_request(self) -> None:
+        self.tokens = min(self.burst, self.tokens + self.ratio)
+
+    def try_spend(self) -> bool:
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return True
+        return False
+
+_stats = {}  # method -> [hedges, wins]
+
+def _record(method: str, won: bool) -> None:
+    st = _stats.setdefault(method, [0, 0])
+    st[0] += 1
+    MET_HEDGES.labels(method).inc()
+    if won:
+        st[1] += 1
+        MET_HEDGE_WINS.labels(method).inc()
+    MET_HEDGE_WIN_RATE.labels(method).set(st[1] / st[0])
+
+async def hedged(method: str, primary: Callable[[], Awaitable[Any]], secondary: Callable[[], Awaitable[Any]],
+                 delay: float, budget: HedgeBudget, final: Callable[[BaseException], bool] = lambda e: False) -> Tuple[Any, bool]:
+    """
+    Start primary(); if it has not finished after `delay` seconds and the budget
+    allows, start secondary() too. Returns (result, hedge_won) from the first
+    success and cancels the other. `final(exc)` marks errors that are the answer
+    itself (e.g. a revert) rather than an endpoint failure.
+    """
+    budget.on_request()
+    first = asyncio.ensure_future(primary())
+    tasks = [first]
+    try:
+        done, _ = await asyncio.wait({first}, timeout=max(HEDGE_MIN_DELAY, delay))
+        if done:
+            return first.result(), False
+        if not budget.try_spend():
+            MET_HEDGE_DENIED.labels(method).inc()
+            return await first, False
+
+        second = asyncio.ensure_future(secondary())
+        tasks.append(second)
+        pending = {first, second}
+        err: BaseException | None = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for t in done:
+                exc = t.exception()
+                if exc is None or final(exc):
+                    _record(method, won=t is second and exc is None)
+                    return t.result(), t is second
+                err = err or exc
+        _record(method, won=False)
+        raise err
+    finally:
+        # also runs when the caller is cancelled mid-wait, so no request outlives it
+        for t in tasks:
+            if not t.done():
+                t.cancel()
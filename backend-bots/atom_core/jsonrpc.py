@@ -0,0 +1,218 @@
+import os
+import json
+import time
+import asyncio
+import itertools
+import logging
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import aiohttp
+
+from .call_cache import CALL_CACHE, BlockCallCache
+from .singleflight import SingleFlight
+from .ratelimit import SCANNING, PriorityTokenBucket, limiter_for, priority_for
+from .rpc_metrics import (
+    CACHE_HIT, COALESCED, NETWORK, endpoint_label, error_class, observe_bytes, observe_call, observe_outcome, payload_size,
+)
+
+log = logging.getLogger("atom.jsonrpc")
+
+# Max requests per JSON-RPC batch array; most providers cap between 100 and 1000
+MAX_BATCH = int(os.getenv("RPC_MAX_BATCH", "100"))
+# Keep-alive connections per client session
+HTTP_POOL_SIZE = int(os.getenv("RPC_HTTP_POOL_SIZE", "32"))
+
+class RPCError(Exception):
+    """Error object returned by the node for a single request."""
+
+    def __init__(self, code: int, message: str, data: Any = None):
+        super().__init__(f"[{code}] {message}")
+        self.code = code
+        self.message = message
+        self.data = data
+
+# Never coalesced: each of these must reach the node once per caller
+_UNSHARED_PREFIXES = ("eth_send", "eth_sign", "personal_", "eth_subscribe", "eth_unsubscribe")
+
+# Process-wide; keys include the client identity so pools for different chains never mix
+SINGLE_FLIGHT = SingleFlight("rpc")
+
+class RPCMethods(ABC):
+    """
+    Shared front door for clients and pools: eth_call results go through the
+    process-wide block-scoped cache, identical concurrent reads share one
+    in-flight request, eth_blockNumber answers advance the cache head, and the
+    wire work is handed to _dispatch(), which every subclass implements.
+    """
+
+    call_cache: Optional[BlockCallCache] = CALL_CACHE
+
+    async def request(self, method: str, params: Optional[List[Any]] = None, **kw: Any) -> Any:
+        params = params or []
+        cache = self.call_cache
+        key = None
+        if cache is not None and method == "eth_call" and params:
+            key = cache.key(params[0], params[1] if len(params) > 1 else "latest")
+            hit = cache.get(key)
+            if not cache.is_miss(hit):
+                observe_outcome(method, CACHE_HIT)
+                return hit
+        if method.startswith(_UNSHARED_PREFIXES):
+            observe_outcome(method, NETWORK)
+            return await self._dispatch(method, params, **kw)
+        flight_key = (id(self), method, json.dumps(params, sort_keys=True, default=str))
+        observe_outcome(method, COALESCED if SINGLE_FLIGHT.inflight(flight_key) else NETWORK)
+        return await SINGLE_FLIGHT.do(flight_key, lambda: self._fetch(method, params, key, **kw))
+
+    async def _fetch(self, method: str, params: List[Any], cache_key: Any, **kw: Any) -> Any:
+        result = await self._dispatch(method, params, **kw)
+        cache = self.call_cache
+        if cache is not None:
+            if method == "eth_call":
+                cache.put(cache_key, result)
+            elif method == "eth_blockNumber":
+                cache.advance(int(result, 16))
+        return result
+
+    @abstractmethod
+    async def _dispatch(self, method: str, params: List[Any], **kw: Any) -> Any:
+        """Send one request and return its result."""
+
+    async def eth_call(self, to: str, data: str, block: Any = "latest") -> bytes:
+        tag = hex(block) if isinstance(block, int) else block
+        out = await self.request("eth_call", [{"to": to, "data": data}, tag])
+        return bytes.fromhex(out[2:] if out.startswith("0x") else out)
+
+    async def block_number(self) -> int:
+        return int(await self.request("eth_blockNumber"), 16)
+
+    async def gas_price(self) -> int:
+        return int(await self.request("eth_gasPrice"), 16)
+
+    async def chain_id(self) -> int:
+        return int(await self.request("eth_chainId"), 16)
+
+    async def get_logs(self, address: Any, topics: List[Any], from_block: int, to_block: int) -> List[Dict[str, Any]]:
+        """`address` is one address, a list of them, or None for logs from any contract."""
+        flt: Dict[str, Any] = {"topics": topics, "fromBlock": hex(from_block), "toBlock": hex(to_block)}
+        if address is not None:
+            flt["address"] = address
+        return await self.request("eth_getLogs", [flt])
+
+class AsyncRPCClient(RPCMethods):
+    """
+    Native asyncio JSON-RPC client on a pooled aiohttp session.
+    Requests issued during one event-loop tick are merged into a single batch
+    array, so a gather of hundreds of eth_calls costs a handful of HTTP round-trips
+    and no threads. Each request first takes a token from the endpoint's rate
+    limiter (if one is configured) at its priority class.
+    """
+
+    def __init__(self, url: str, *, timeout: float = 10.0, max_batch: int = MAX_BATCH,
+                 session: Optional[aiohttp.ClientSession] = None, priority: int = SCANNING,
+                 limiter: Optional[PriorityTokenBucket] = None):
+        self.url = url
+        self.endpoint = endpoint_label(url)
+        self.priority = priority
+        self.limiter = limiter or limiter_for(url)
+        self.timeout = timeout
+        self.max_batch = max(1, max_batch)
+        self._session = session
+        self._owns_session = session is None
+        self._ids = itertools.count(1)
+        self._pending: List[Tuple[Dict[str, Any], asyncio.Future]] = []
+        self._flush_scheduled = False
+        self._tasks: Set[asyncio.Task] = set()  # batches in flight, kept so they are not collected mid-send
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=HTTP_POOL_SIZE, keepalive_timeout=30)
+            self._session = aiohttp.ClientSession(
+                connector=connector, timeout=aiohttp.ClientTimeout(total=self.timeout)
+            )
+            self._owns_session = True
+        return self._session
+
+    async def close(self) -> None:
+        tasks, self._tasks = self._tasks, set()
+        for t in tasks:
+            t.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+        if self._session and self._owns_session and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    async def _dispatch(self, method: str, params: List[Any], priority: Optional[int] = None, **kw: Any) -> Any:
+        if self.limiter is not None:
+            await self.limiter.acquire(priority if priority is not None else priority_for(method, self.priority))
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        payload = {"jsonrpc": "2.0", "id": next(self._ids), "method": method, "params": params}
+        self._pending.append((payload, fut))
+        if not self._flush_scheduled:
+            # call_soon runs after every task step already queued for this tick
+            self._flush_scheduled = True
+            loop.call_soon(self._flush)
+        t0 = time.perf_counter()
+        try:
+            result = await fut
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            observe_call(method, self.endpoint, time.perf_counter() - t0, error_class(e))
+            raise
+        observe_call(method, self.endpoint, time.perf_counter() - t0)
+        return result
+
+    def _flush(self) -> None:
+        self._flush_scheduled = False
+        pending, self._pending = self._pending, []
+        for i in range(0, len(pending), self.max_batch):
+            task = asyncio.ensure_future(self._send(pending[i:i + self.max_batch]))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _send(self, batch: List[Tuple[Dict[str, Any], asyncio.Future]]) -> None:
+        waiting = {p["id"]: fut for p, fut in batch if not fut.done()}
+        if not waiting:
+            return
+        body = [p for p, fut in batch if p["id"] in waiting]
+        methods = {p["id"]: p["method"] for p in body}
+        parts = [json.dumps(p, separators=(",", ":")) for p in body]
+        for p, part in zip(body, parts):
+            observe_bytes(p["method"], self.endpoint, out=len(part))
+        try:
+            async with self._get_session().post(
+                self.url, data="[" + ",".join(parts) + "]", headers={"Content-Type": "application/json"}
+            ) as resp:
+                resp.raise_for_status()
+                replies = await resp.json(content_type=None)
+            if isinstance(replies, dict):
+                # batch-level failure: the node answers with one error object
+                err = replies.get("error") or {}
+                raise RPCError(int(err.get("code", -32603)), str(err.get("message", "batch rejected")), err.get("data"))
+            for reply in replies:
+                fut = waiting.pop(reply.get("id"), None)
+                if fut is None or fut.done():
+                    continue
+                err = reply.get("error")
+                observe_bytes(methods.get(reply.get("id"), "-"), self.endpoint, inp=payload_size(err or reply.get("result")))
+                if err:
+                    fut.set_exception(RPCError(int(err.get("code", -32603)), str(err.get("message", "")), err.get("data")))
+                else:
+                    fut.set_result(reply.get("result"))
+            for fut in waiting.values():
+                if not fut.done():
+                    fut.set_exception(RPCError(-32603, "missing response in batch"))
+        except asyncio.CancelledError:
+            # client closed: callers get a cancellation instead of waiting forever
+            for fut in waiting.values():
+                fut.cancel()
+            raise
+        except Exception as e:
+            log.debug("batch of %d to %s failed: %s", len(body), self.url, e)
+            for fut in waiting.values():
+                if not fut.done():
+                    fut.set_exception(e)
@@ -0,0 +1,92 @@
+import os
+import asyncio
+from typing import Any, List, NamedTuple, Optional, Sequence, Tuple, Union
+
+from eth_abi import decode as abi_decode, encode as abi_encode
+from eth_utils import keccak
+
+from .jsonrpc import RPCMethods
+
+# Same address on Polygon, Ethereum, Base, Arbitrum and most EVM chains
+MULTICALL3 = os.getenv("MULTICALL3_ADDRESS", "0xcA11bde05977b3631167028862bE2a173976CA11")
+# Calls per aggregate3; chunks of one scan are sent concurrently and share an HTTP batch
+MULTICALL_CHUNK = int(os.getenv("MULTICALL_CHUNK", "400"))
+
+def selector(signature: str) -> bytes:
+    return keccak(text=signature)[:4]
+
+def encode_call(signature: str, types: Sequence[str] = (), args: Sequence[Any] = ()) -> bytes:
+    return selector(signature) + (abi_encode(list(types), list(args)) if types else b"")
+
+_AGGREGATE3 = selector("aggregate3((address,bool,bytes)[])")
+GET_BLOCK_NUMBER = selector("getBlockNumber()")
+
+class Call(NamedTuple):
+    target: str
+    data: bytes
+    allow_failure: bool = True
+
+def _as_bytes(data: Union[bytes, str]) -> bytes:
+    return bytes.fromhex(data[2:] if data.startswith("0x") else data) if isinstance(data, str) else data
+
+def _encode_aggregate3(chunk: Sequence[Call]) -> str:
+    data = _AGGREGATE3 + abi_encode(
+        ["(address,bool,bytes)[]"], [[(c.target, c.allow_failure, _as_bytes(c.data)) for c in chunk]]
+    )
+    return "0x" + data.hex()
+
+def _decode_aggregate3(raw: bytes) -> List[Tuple[bool, bytes]]:
+    (results,) = abi_decode(["(bool,bytes)[]"], raw)
+    return [(bool(ok), bytes(ret)) for ok, ret in results]
+
+async def aggregate3(rpc: RPCMethods, calls: Sequence[Call], block: Union[str, int] = "latest",
+                     chunk_size: int = MULTICALL_CHUNK) -> List[Tuple[bool, bytes]]:
+    """
+    Run `calls` through Multicall3.aggregate3 as eth_calls at `block`. Returns
+    (success, returndata) per call in order; with allow_failure a reverting call
+    comes back as (False, revert data) instead of failing the whole chunk.
+    """
+    if not calls:
+        return []
+
+    async def run(chunk: Sequence[Call]) -> List[Tuple[bool, bytes]]:
+        raw = await rpc.eth_call(MULTICALL3, _encode_aggregate3(chunk), block)
+        return _decode_aggregate3(raw)
+
+    chunks = [calls[i:i + chunk_size] for i in range(0, len(calls), max(1, chunk_size))]
+    out: List[Tuple[bool, bytes]] = []
+    for part in await asyncio.gather(*(run(c) for c in chunks)):
+        out.extend(part)
+    return out
+
+def decode_result(types: Sequence[str], result: Tuple[bool, bytes]) -> Optional[Tuple[Any, ...]]:
+    """Decode one aggregate3 result, None if the call reverted or returned nothing."""
+    ok, ret = result
+    if not ok or not ret:
+        return None
+    try:
+        return abi_decode(list(types), ret)
+    except Exception:
+        return None
+
+async def aggregate3_at_head(rpc: RPCMethods, calls: Sequence[Call],
+                             chunk_size: int = MULTICALL_CHUNK) -> Tuple[int, List[Tuple[bool, bytes]]]:
+    """
+    Read every call at one block and return (block, results). If everything fits
+    in one chunk, Multicall3.getBlockNumber rides along in the same eth_call (one
+    round-trip); otherwise the head is fetched first and all chunks are pinned to it.
+    """
+    if len(calls) + 1 <= chunk_size:
+        res = await aggregate3(rpc, [Call(MULTICALL3, GET_BLOCK_NUMBER, False), *calls], "latest", chunk_size)
+        return int(abi_decode(["uint256"], res[0][1])[0]), res[1:]
+    block = await rpc.block_number()
+    return block, await aggregate3(rpc, calls, block, chunk_size)
+
+def aggregate3_sync(w3, calls: Sequence[Call], block: Union[str, int] = "latest",
+                    chunk_size: int = MULTICALL_CHUNK) -> List[Tuple[bool, bytes]]:
+    """aggregate3() for synchronous web3 callers; chunks run one after another."""
+    out: List[Tuple[bool, bytes]] = []
+    for i in range(0, len(calls), max(1, chunk_size)):
+        raw = w3.eth.call({"to": MULTICALL3, "data": _encode_aggregate3(calls[i:i + chunk_size])}, block)
+        out.extend(_decode_aggregate3(bytes(raw)))
+    return out
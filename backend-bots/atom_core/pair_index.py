@@ -0,0 +1,310 @@
+import os
+import json
+import asyncio
+import logging
+import tempfile
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from prometheus_client import Gauge
+from web3 import Web3
+
+from .jsonrpc import RPCMethods
+from .multicall import Call, aggregate3, decode_result, encode_call
+
+log = logging.getLogger("atom.pair_index")
+
+# Local copy of the index and its checkpoints, shared by every bot on the host
+PAIR_INDEX_DIR = os.getenv("PAIR_INDEX_DIR", os.path.expanduser("~/.cache/atom"))
+PAIR_INDEX_REDIS_PREFIX = os.getenv("PAIR_INDEX_REDIS_PREFIX", "atom:pairs")
+# Blocks per eth_getLogs; halved for the rest of a sync when a provider rejects the range
+LOG_RANGE = int(os.getenv("PAIR_INDEX_LOG_RANGE", "2000"))
+# eth_getLogs windows in flight per factory during a catch-up
+LOG_CONCURRENCY = int(os.getenv("PAIR_INDEX_CONCURRENCY", "4"))
+# During a catch-up the checkpoint is persisted every this many blocks
+PERSIST_SPAN = int(os.getenv("PAIR_INDEX_PERSIST_SPAN", "500000"))
+# Stay this far behind head; 0 is fine because V2 pairs are CREATE2 and keep their address across a reorg
+CONFIRMATIONS = int(os.getenv("PAIR_INDEX_CONFIRMATIONS", "0"))
+# refresh() catches up inline when every factory is at most this far behind; a colder
+# index (a first start scans from the factory deployment) syncs in the background
+INLINE_SYNC_BLOCKS = int(os.getenv("PAIR_INDEX_INLINE_SYNC_BLOCKS", "50000"))
+
+PAIR_CREATED = "0x" + Web3.keccak(text="PairCreated(address,address,address,uint256)").hex().removeprefix("0x")
+
+# Factory deployment blocks, so a cold index does not scan empty history
+FACTORY_START_BLOCKS: Dict[str, int] = {
+    "0x5757371414417b8C6CAad45bAeF941aBc7d3Ab32": 4_931_780,   # QuickSwap V2, Polygon
+    "0xc35DADB65012eC5796536bD9864eD8773aBc74C4": 11_333_218,  # SushiSwap, Polygon
+    "0x5C69bEe701ef814a2B6a3EDD4B1652CB9cc5aA6f": 10_000_835,  # Uniswap V2, Ethereum
+    "0xC0AEe478e3658e2610c5F7A4A2E1777cE9e4f2Ac": 10_794_229,  # SushiSwap, Ethereum
+}
+
+MET_PAIRS = Gauge("atom_pair_index_pairs", "Pairs known to the PairCreated index", ["factory"])
+MET_BLOCK = Gauge("atom_pair_index_block", "Last block scanned for PairCreated", ["factory"])
+
+def _cs(addr: str) -> str:
+    return Web3.to_checksum_address(addr)
+
+def _topic_addr(topic) -> str:
+    raw = topic.hex() if isinstance(topic, (bytes, bytearray)) else topic
+    return _cs("0x" + raw[-40:])
+
+class PairIndex:
+    """
+    Every V2 pair of the configured factories, built from PairCreated logs and
+    advanced incrementally from a persisted per-factory checkpoint. Lookups by
+    token are in memory, so discovery no longer costs a getPair per token
+    combination. `factories` maps the caller's DEX names to factory addresses;
+    storage is keyed by factory address so bots with different names share it.
+    While a cold index catches up in the background, lookup() seeds the pairs a
+    caller needs from factory getPair reads.
+    """
+
+    def __init__(self, rpc: RPCMethods, factories: Dict[str, str], chain_id: int = 137, redis=None,
+                 path: Optional[str] = None):
+        self.rpc = rpc
+        self.chain_id = chain_id
+        self.redis = redis
+        self.path = path or os.path.join(PAIR_INDEX_DIR, f"pair_index_{chain_id}.json")
+        self.names: Dict[str, str] = {name: _cs(addr) for name, addr in factories.items()}
+        self.pairs: Dict[str, Dict[str, Tuple[str, str]]] = {f: {} for f in self.names.values()}  # factory -> pair -> (t0, t1)
+        self.checkpoint: Dict[str, int] = {f: FACTORY_START_BLOCKS.get(f, 0) - 1 for f in self.names.values()}
+        # token -> other token -> factory -> pair
+        self._adj: Dict[str, Dict[str, Dict[str, str]]] = {}
+        self._unsaved: Dict[str, Dict[str, Tuple[str, str]]] = {f: {} for f in self.names.values()}
+        self._lock = asyncio.Lock()
+        self._sync_task: Optional[asyncio.Task] = None
+
+    # ---------- lookups ----------
+
+    def pair(self, dex: str, a: str, b: str) -> Optional[str]:
+        return self._adj.get(a, {}).get(b, {}).get(self.names[dex])
+
+    def neighbors(self, token: str) -> Iterable[str]:
+        """Tokens that share an indexed pair with `token`."""
+        return self._adj.get(_cs(token), {}).keys()
+
+    def tokens_of(self, pair: str) -> Optional[Tuple[str, str]]:
+        for by_pair in self.pairs.values():
+            if pair in by_pair:
+                return by_pair[pair]
+        return None
+
+    def pairs_among(self, tokens: Iterable[str]) -> Iterator[Tuple[str, str, str, str]]:
+        """(dex, token0, token1, pair) for every indexed pair with both tokens in `tokens`."""
+        wanted = {_cs(t) for t in tokens}
+        by_factory = {f: name for name, f in self.names.items()}
+        for t in wanted:
+            for other, per_factory in self._adj.get(t, {}).items():
+                if other not in wanted:
+                    continue
+                for f, p in per_factory.items():
+                    t0, t1 = self.pairs[f][p]
+                    if t0 == t and f in by_factory:
+                        yield by_factory[f], t0, t1, p
+
+    async def lookup(self, queries: Iterable[Tuple[str, str, str]]) -> int:
+        """
+        Add the pairs behind (dex, token_a, token_b) queries the index does not
+        know yet, from one multicall of factory getPair reads. Returns the number
+        found; for use while a catch-up is still running.
+        """
+        todo = list(dict.fromkeys((dex, _cs(a), _cs(b)) for dex, a, b in queries))
+        todo = [q for q in todo if self.pair(*q) is None]
+        if not todo:
+            return 0
+        res = await aggregate3(self.rpc, [
+            Call(self.names[dex], encode_call("getPair(address,address)", ["address", "address"], [a, b])) for dex, a, b in todo
+        ])
+        found = 0
+        for (dex, a, b), r in zip(todo, res):
+            out = decode_result(["address"], r)
+            if not out or int(out[0], 16) == 0:
+                continue
+            # V2 factories sort the pair's tokens by address
+            t0, t1 = sorted((a, b), key=lambda t: int(t, 16))
+            factory, pair = self.names[dex], _cs(out[0])
+            if self._add(factory, pair, t0, t1):
+                self._unsaved[factory][pair] = (t0, t1)
+                found += 1
+        return found
+
+    # ---------- state ----------
+
+    def _add(self, factory: str, pair: str, t0: str, t1: str) -> bool:
+        if pair in self.pairs[factory]:
+            return False
+        self.pairs[factory][pair] = (t0, t1)
+        self._adj.setdefault(t0, {}).setdefault(t1, {})[factory] = pair
+        self._adj.setdefault(t1, {}).setdefault(t0, {})[factory] = pair
+        return True
+
+    def _merge(self, factory: str, pairs: Dict[str, Iterable[str]], block: int, to_redis: bool) -> None:
+        """Union with another copy; each copy is complete up to its own checkpoint, so the higher one holds."""
+        if factory not in self.pairs:
+            return
+        for p, (t0, t1) in pairs.items():
+            p, t0, t1 = _cs(p), _cs(t0), _cs(t1)
+            if self._add(factory, p, t0, t1) and to_redis:
+                self._unsaved[factory][p] = (t0, t1)
+        self.checkpoint[factory] = max(self.checkpoint[factory], int(block))
+
+    def _key(self, factory: str) -> str:
+        return f"{PAIR_INDEX_REDIS_PREFIX}:{self.chain_id}:{factory}"
+
+    def _read_disk(self) -> Dict[str, dict]:
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _merge_disk(self, raw: Dict[str, dict]) -> None:
+        for factory, entry in raw.items():
+            self._merge(factory, entry.get("pairs", {}), entry.get("block", -1), to_redis=True)
+
+    def _write_disk(self, data: Dict[str, dict]) -> None:
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(self.path), prefix=".pair_index.")
+        try:
+            with os.fdopen(fd, "w") as fh:
+                json.dump(data, fh, separators=(",", ":"))
+            os.replace(tmp, self.path)
+        except OSError:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+
+    async def _load_redis(self) -> None:
+        if self.redis is None:
+            return
+        for f in self.pairs:
+            try:
+                block, pairs = await asyncio.gather(self.redis.get(f"{self._key(f)}:block"), self.redis.hgetall(self._key(f)))
+            except Exception:
+                return
+            if block is not None:
+                self._merge(f, {p: v.split(",") for p, v in pairs.items()}, int(block), to_redis=False)
+
+    async def _save_redis(self) -> None:
+        if self.redis is None:
+            return
+        try:
+            for f, new in self._unsaved.items():
+                # pairs first: a reader that sees the checkpoint must also see every pair below it
+                if new:
+                    await self.redis.hset(self._key(f), mapping={p: f"{a},{b}" for p, (a, b) in new.items()})
+                await self.redis.set(f"{self._key(f)}:block", self.checkpoint[f])
+        except Exception:
+            return  # kept in _unsaved for the next round
+        for new in self._unsaved.values():
+            new.clear()
+
+    async def _persist(self) -> None:
+        # Other bots write the same file: merge with what is there, then replace it atomically.
+        # File I/O runs in a thread; the merge stays on the loop so lookups never see a dict mid-update.
+        data = await asyncio.to_thread(self._read_disk)
+        self._merge_disk(data)
+        for f in self.pairs:
+            data[f] = {"block": self.checkpoint[f], "pairs": {p: list(t) for p, t in self.pairs[f].items()}}
+        await asyncio.to_thread(self._write_disk, data)
+        await self._save_redis()
+        for f, by_pair in self.pairs.items():
+            MET_PAIRS.labels(f).set(len(by_pair))
+            MET_BLOCK.labels(f).set(self.checkpoint[f])
+
+    async def load(self, redis=None) -> None:
+        """Warm the index from disk and Redis; call once at startup, before sync()."""
+        if redis is not None:
+            self.redis = redis
+        self._merge_disk(await asyncio.to_thread(self._read_disk))
+        await self._load_redis()
+
+    # ---------- sync ----------
+
+    async def _scan(self, factory: str, head: int) -> int:
+        """Scan one factory from its checkpoint to `head`; returns the number of new pairs."""
+        found = 0
+        step = max(1, LOG_RANGE)
+        start = self.checkpoint[factory] + 1
+        while start <= head:
+            windows: List[Tuple[int, int]] = []
+            s = start
+            while s <= head and len(windows) < max(1, LOG_CONCURRENCY):
+                windows.append((s, min(head, s + step - 1)))
+                s += step
+            try:
+                results = await asyncio.gather(*(
+                    self.rpc.get_logs(factory, [PAIR_CREATED], a, b) for a, b in windows
+                ))
+            except Exception:
+                if step == 1:
+                    raise
+                step = max(1, step // 2)  # most providers reject wide ranges with an error rather than truncating
+                continue
+            for logs in results:
+                for lg in logs:
+                    topics = lg.get("topics") or []
+                    data = lg.get("data") or "0x"
+                    if len(topics) < 3 or len(data) < 66:
+                        continue
+                    pair = _cs("0x" + data[2:66][-40:])
+                    t0, t1 = _topic_addr(topics[1]), _topic_addr(topics[2])
+                    if self._add(factory, pair, t0, t1):
+                        self._unsaved[factory][pair] = (t0, t1)
+                        found += 1
+            self.checkpoint[factory] = windows[-1][1]
+            start = self.checkpoint[factory] + 1
+        return found
+
+    async def sync(self, head: Optional[int] = None) -> int:
+        """Bring every factory up to `head` (default: chain head). Returns the number of new pairs."""
+        async with self._lock:
+            if head is None:
+                head = await self.rpc.block_number()
+            head -= CONFIRMATIONS
+            found = 0
+            while True:
+                try:
+                    counts = await asyncio.gather(*(
+                        self._scan(f, min(head, self.checkpoint[f] + max(1, PERSIST_SPAN))) for f in self.pairs
+                    ))
+                finally:
+                    # progress made before a failure is kept
+                    await self._persist()
+                found += sum(counts)
+                if all(self.checkpoint[f] >= head for f in self.pairs):
+                    return found
+
+    @property
+    def catching_up(self) -> bool:
+        return self._sync_task is not None and not self._sync_task.done()
+
+    def _sync_done(self, task: asyncio.Task) -> None:
+        if not task.cancelled() and task.exception() is not None:
+            log.warning("pair index catch-up failed: %s", task.exception())
+
+    async def refresh(self) -> bool:
+        """
+        sync() inline when the index is at most INLINE_SYNC_BLOCKS behind, else
+        start it as a background task. True when the index is current on return;
+        False while a catch-up is running, when callers should lookup() the pairs
+        they need.
+        """
+        if self.catching_up:
+            return False
+        head = await self.rpc.block_number()
+        if min(self.checkpoint.values(), default=head) >= head - CONFIRMATIONS - max(0, INLINE_SYNC_BLOCKS):
+            await self.sync(head)
+            return True
+        log.info("pair index is %d blocks behind; catching up in the background",
+                 head - min(self.checkpoint.values()))
+        self._sync_task = asyncio.ensure_future(self.sync(head))
+        self._sync_task.add_done_callback(self._sync_done)
+        return False
+
+    async def wait_caught_up(self, timeout: float) -> bool:
+        """Wait up to `timeout` for a background catch-up; True once none is running."""
+        if self.catching_up:
+            await asyncio.wait({self._sync_task}, timeout=timeout)
+        return not self.catching_up
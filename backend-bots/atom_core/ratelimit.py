@@ -0,0 +1,228 @@
+import os
+import time
+import heapq
+import asyncio
+import itertools
+import threading
+from typing import Callable, Dict, List, Optional
+from urllib.parse import urlparse
+
+from prometheus_client import Counter, Gauge, Histogram
+
+# Priority classes, most urgent first
+EXECUTION = 0      # sends, and the reads that build a transaction
+CONFIRMATION = 1   # receipt polling for transactions already sent
+SCANNING = 2       # opportunity discovery
+PRIORITY_NAMES = {EXECUTION: "execution", CONFIRMATION: "confirmation", SCANNING: "scanning"}
+
+# Per-endpoint caps for this process: "host=rps[:burst],host2=rps". Providers
+# enforce their cap per API key, so give each bot process its share here.
+RATE_LIMITS = os.getenv("RPC_RATE_LIMITS", "")
+# Applied to hosts not listed above; 0 means unlimited
+RATE_DEFAULT_RPS = float(os.getenv("RPC_RATE_DEFAULT_RPS", "0"))
+# Longest a request of each class may queue before it is shed (0 = never shed)
+MAX_WAIT = {
+    EXECUTION: float(os.getenv("RPC_RATE_MAX_WAIT_EXECUTION", "0")),
+    CONFIRMATION: float(os.getenv("RPC_RATE_MAX_WAIT_CONFIRMATION", "10")),
+    SCANNING: float(os.getenv("RPC_RATE_MAX_WAIT_SCANNING", "2")),
+}
+# Share of the burst a class may not dip into, kept free for more urgent classes
+RESERVE = {
+    EXECUTION: 0.0,
+    CONFIRMATION: float(os.getenv("RPC_RATE_RESERVE_CONFIRMATION", "0.1")),
+    SCANNING: float(os.getenv("RPC_RATE_RESERVE_SCANNING", "0.25")),
+}
+
+MET_RL_WAIT = Histogram("atom_rpc_ratelimit_wait_seconds", "Time spent queued for an RPC token",
+                        ["endpoint", "priority"], buckets=(0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10))
+MET_RL_SHED = Counter("atom_rpc_ratelimit_shed_total", "RPC requests shed by the local rate limiter", ["endpoint", "priority"])
+MET_RL_QUEUE = Gauge("atom_rpc_ratelimit_queued", "RPC requests waiting for a token", ["endpoint", "priority"])
+
+_EXECUTION_METHODS = frozenset({"eth_sendRawTransaction", "eth_sendTransaction", "eth_estimateGas"})
+_CONFIRMATION_METHODS = frozenset({"eth_getTransactionReceipt", "eth_getTransactionByHash"})
+
+def priority_for(method: str, default: int = SCANNING) -> int:
+    """Sends are always execution and receipt polls confirmation; everything else uses the caller's class."""
+    if method in _EXECUTION_METHODS:
+        return EXECUTION
+    if method in _CONFIRMATION_METHODS:
+        return CONFIRMATION
+    return default
+
+class RateLimitedError(RuntimeError):
+    """Raised when a request is shed locally instead of being sent into a 429."""
+
+class _Waiter:
+    __slots__ = ("key", "priority", "wake")
+
+    def __init__(self, key, priority: int, wake: Callable[[], None]):
+        self.key = key
+        self.priority = priority
+        self.wake = wake
+
+    def __lt__(self, other: "_Waiter") -> bool:
+        return self.key < other.key
+
+class PriorityTokenBucket:
+    """
+    Token bucket for one endpoint with a priority queue in front of it. Waiters
+    are served strictly by (priority, arrival); lower classes cannot spend the
+    reserve kept for higher ones and are shed once they would wait longer than
+    their class allows. Usable from coroutines and from threads (sync web3).
+    """
+
+    def __init__(self, rate: float, burst: Optional[float] = None, label: str = ""):
+        self.rate = rate
+        self.burst = max(1.0, burst if burst is not None else rate)
+        self.label = label
+        self.tokens = self.burst
+        self._ts = time.monotonic()
+        self._lock = threading.Lock()
+        self._heap: List[_Waiter] = []
+        self._seq = itertools.count()
+        self._queued = {p: 0 for p in PRIORITY_NAMES}
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.burst, self.tokens + (now - self._ts) * self.rate)
+        self._ts = now
+
+    def _floor(self, priority: int) -> float:
+        # never above burst - 1, or a small bucket could not serve the class at all
+        return min(self.burst * RESERVE.get(priority, 0.0), self.burst - 1.0)
+
+    def _eta(self, priority: int) -> float:
+        """Rough wait for a new request of this class: everything ahead of it plus the reserve deficit."""
+        ahead = sum(1 for w in self._heap if w.priority <= priority)
+        need = ahead + 1 + self._floor(priority) - self.tokens
+        return max(0.0, need / self.rate)
+
+    def _step(self, w: _Waiter, now: float) -> Optional[float]:
+        """Under the lock: grant (returns None) or return seconds to sleep before retrying."""
+        self._refill(now)
+        if self._heap[0] is not w:
+            return 1.0  # the head wakes its successor when granted; this is only a safety poll
+        floor = self._floor(w.priority)
+        if self.tokens - 1.0 >= floor - 1e-9:
+            self.tokens -= 1.0
+            heapq.heappop(self._heap)
+            self._dequeued(w)
+            if self._heap:
+                self._heap[0].wake()
+            return None
+        return (1.0 + floor - self.tokens) / self.rate
+
+    def _enqueue(self, priority: int, wake: Callable[[], None], now: float) -> _Waiter:
+        max_wait = MAX_WAIT.get(priority, 0.0)
+        self._refill(now)
+        if max_wait > 0 and self._eta(priority) > max_wait:
+            MET_RL_SHED.labels(self.label, PRIORITY_NAMES.get(priority, str(priority))).inc()
+            raise RateLimitedError(f"{self.label}: {PRIORITY_NAMES.get(priority, priority)} request shed")
+        w = _Waiter((priority, next(self._seq)), priority, wake)
+        heapq.heappush(self._heap, w)
+        self._queued[priority] = self._queued.get(priority, 0) + 1
+        MET_RL_QUEUE.labels(self.label, PRIORITY_NAMES.get(priority, str(priority))).set(self._queued[priority])
+        if self._heap[0] is w:
+            wake()
+        return w
+
+    def _dequeued(self, w: _Waiter) -> None:
+        self._queued[w.priority] -= 1
+        MET_RL_QUEUE.labels(self.label, PRIORITY_NAMES.get(w.priority, str(w.priority))).set(self._queued[w.priority])
+
+    def _abandon(self, w: _Waiter) -> None:
+        with self._lock:
+            if w in self._heap:
+                was_head = self._heap[0] is w
+                self._heap.remove(w)
+                heapq.heapify(self._heap)
+                self._dequeued(w)
+                if was_head and self._heap:
+                    self._heap[0].wake()
+
+    def _deadline(self, priority: int, start: float) -> float:
+        max_wait = MAX_WAIT.get(priority, 0.0)
+        return start + max_wait if max_wait > 0 else float("inf")
+
+    def _shed(self, w: _Waiter) -> RateLimitedError:
+        self._abandon(w)
+        MET_RL_SHED.labels(self.label, PRIORITY_NAMES.get(w.priority, str(w.priority))).inc()
+        return RateLimitedError(f"{self.label}: {PRIORITY_NAMES.get(w.priority, w.priority)} request timed out in queue")
+
+    async def acquire(self, priority: int = SCANNING) -> None:
+        loop = asyncio.get_running_loop()
+        ev = asyncio.Event()
+        start = time.monotonic()
+        deadline = self._deadline(priority, start)
+        with self._lock:
+            w = self._enqueue(priority, lambda: loop.call_soon_threadsafe(ev.set), start)
+        try:
+            while True:
+                ev.clear()
+                now = time.monotonic()
+                with self._lock:
+                    wait = self._step(w, now)
+                if wait is None:
+                    MET_RL_WAIT.labels(self.label, PRIORITY_NAMES.get(priority, str(priority))).observe(now - start)
+                    return
+                if now >= deadline:
+                    raise self._shed(w)
+                try:
+                    await asyncio.wait_for(ev.wait(), timeout=min(wait, deadline - now))
+                except asyncio.TimeoutError:
+                    pass
+        except asyncio.CancelledError:
+            self._abandon(w)
+            raise
+
+    def acquire_sync(self, priority: int = SCANNING) -> None:
+        ev = threading.Event()
+        start = time.monotonic()
+        deadline = self._deadline(priority, start)
+        with self._lock:
+            w = self._enqueue(priority, ev.set, start)
+        while True:
+            ev.clear()
+            now = time.monotonic()
+            with self._lock:
+                wait = self._step(w, now)
+            if wait is None:
+                MET_RL_WAIT.labels(self.label, PRIORITY_NAMES.get(priority, str(priority))).observe(now - start)
+                return
+            if now >= deadline:
+                raise self._shed(w)
+            ev.wait(min(wait, deadline - now))
+
+def _parse_limits(spec: str) -> Dict[str, tuple]:
+    out = {}
+    for item in spec.split(","):
+        host, _, val = item.strip().partition("=")
+        if not host or not val:
+            continue
+        rps, _, burst = val.partition(":")
+        out[host.strip()] = (float(rps), float(burst) if burst else None)
+    return out
+
+_LIMITS = _parse_limits(RATE_LIMITS)
+_BUCKETS: Dict[str, Optional[PriorityTokenBucket]] = {}
+_BUCKETS_LOCK = threading.Lock()
+
+def limiter_for(url: str) -> Optional[PriorityTokenBucket]:
+    """Process-wide bucket for the endpoint's host, or None when it is not rate limited."""
+    host = urlparse(url).netloc or url
+    with _BUCKETS_LOCK:
+        if host not in _BUCKETS:
+            rps, burst = _LIMITS.get(host, (RATE_DEFAULT_RPS, None))
+            _BUCKETS[host] = PriorityTokenBucket(rps, burst, label=host) if rps > 0 else None
+        return _BUCKETS[host]
+
+def rate_limit_middleware(priority: int = SCANNING):
+    """web3 middleware that takes a token from the provider's bucket before every request."""
+    def middleware(make_request, w3):
+        bucket = limiter_for(getattr(w3.provider, "endpoint_uri", "") or "")
+
+        def inner(method, params):
+            if bucket is not None:
+                bucket.acquire_sync(priority_for(method, priority))
+            return make_request(method, params)
+        return inner
+    return middleware
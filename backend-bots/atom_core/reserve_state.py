@@ -0,0 +1,176 @@
+import os
+import time
+import asyncio
+import logging
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from prometheus_client import Gauge, Histogram
+from web3 import Web3
+
+from .jsonrpc import RPCMethods
+from .multicall import Call, aggregate3, aggregate3_at_head, decode_result, encode_call
+
+log = logging.getLogger("atom.reserve_state")
+
+# Head poll interval for run()
+POLL_SEC = float(os.getenv("RESERVE_POLL_SEC", "1.0"))
+# Further behind than this (restart, long stall) and a full getReserves snapshot is cheaper than the logs
+MAX_LOG_SPAN = int(os.getenv("RESERVE_MAX_LOG_SPAN", "50"))
+# Up to this many tracked pairs the eth_getLogs filter lists them; above it every Sync log is fetched and filtered here
+ADDRESS_FILTER_MAX = int(os.getenv("RESERVE_ADDRESS_FILTER_MAX", "500"))
+# Full snapshot every N blocks, so a reorged-out Sync cannot leave a reserve wrong for long (0 = never)
+RESYNC_BLOCKS = int(os.getenv("RESERVE_RESYNC_BLOCKS", "1800"))
+
+SYNC = "0x" + Web3.keccak(text="Sync(uint112,uint112)").hex().removeprefix("0x")
+_GET_RESERVES = encode_call("getReserves()")
+
+MET_BLOCK = Gauge("atom_reserve_state_block", "Block the local reserve table is current at")
+MET_TRACKED = Gauge("atom_reserve_state_pairs", "V2 pairs tracked by the reserve table")
+MET_CHANGED = Histogram("atom_reserve_state_changed_pairs", "Tracked pairs whose reserves changed, per block",
+                        buckets=(0, 1, 2, 5, 10, 25, 50, 100, 250, 1000))
+MET_LAG = Histogram("atom_reserve_state_update_seconds", "Time to bring the reserve table to a new head",
+                    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5))
+
+def _cs(addr: str) -> str:
+    return Web3.to_checksum_address(addr)
+
+def _int(v) -> int:
+    return int(v, 16) if isinstance(v, str) else int(v)
+
+class ReserveState:
+    """
+    Current reserves of tracked V2 pairs, kept by applying each new block's Sync
+    logs instead of polling getReserves. Pairs are snapshotted once when first
+    tracked (and after long gaps); afterwards a block costs one eth_blockNumber
+    and one eth_getLogs however many pairs there are. Consumers subscribe() and
+    get (block, changed pairs) per block, then read `reserves` locally.
+    """
+
+    def __init__(self, rpc: RPCMethods, pairs: Iterable[str] = ()):
+        self.rpc = rpc
+        self.reserves: Dict[str, Tuple[int, int]] = {}
+        self.block = 0
+        self.tracked: Set[str] = set()
+        self._pending: Set[str] = set()
+        self._resynced = 0
+        self._subs: List[asyncio.Queue] = []
+        self._lock = asyncio.Lock()
+        self.track(pairs)
+
+    def track(self, pairs: Iterable[str]) -> None:
+        """Add pairs; their first reserves are read by the next poll() that sees a new block."""
+        new = {_cs(p) for p in pairs} - self.tracked
+        self.tracked |= new
+        self._pending |= new
+        MET_TRACKED.set(len(self.tracked))
+
+    def get(self, pair: str) -> Optional[Tuple[int, int]]:
+        return self.reserves.get(pair)
+
+    def subscribe(self) -> asyncio.Queue:
+        q: asyncio.Queue = asyncio.Queue()
+        self._subs.append(q)
+        return q
+
+    @staticmethod
+    async def changes(q: asyncio.Queue, timeout: Optional[float] = None) -> Tuple[int, Set[str]]:
+        """
+        Wait for the next update on a subscription and fold in any that queued
+        behind it: (latest block, pairs changed since the last call). Returns
+        (0, empty) if nothing arrives within `timeout`.
+        """
+        try:
+            block, changed = await asyncio.wait_for(q.get(), timeout)
+        except asyncio.TimeoutError:
+            return 0, set()
+        changed = set(changed)
+        while not q.empty():
+            block, more = q.get_nowait()
+            changed |= more
+        return block, changed
+
+    def _publish(self, per_block: Dict[int, Set[str]]) -> None:
+        for block in sorted(per_block):
+            MET_CHANGED.observe(len(per_block[block]))
+            for q in self._subs:
+                q.put_nowait((block, per_block[block]))
+
+    def _apply(self, pairs: List[str], results) -> Set[str]:
+        changed = set()
+        for p, r in zip(pairs, results):
+            dec = decode_result(["uint112", "uint112", "uint32"], r)
+            if dec is None:
+                continue
+            new = (int(dec[0]), int(dec[1]))
+            if self.reserves.get(p) != new:
+                self.reserves[p] = new
+                changed.add(p)
+        return changed
+
+    async def _snapshot_all(self) -> Set[str]:
+        pairs = sorted(self.tracked)
+        block, res = await aggregate3_at_head(self.rpc, [Call(p, _GET_RESERVES) for p in pairs])
+        self.block = self._resynced = block
+        self._pending.clear()
+        return self._apply(pairs, res)
+
+    async def _snapshot_pending(self) -> Set[str]:
+        pairs = sorted(self._pending)
+        self._pending.clear()
+        res = await aggregate3(self.rpc, [Call(p, _GET_RESERVES) for p in pairs], self.block)
+        return self._apply(pairs, res)
+
+    async def _apply_logs(self, head: int) -> Dict[int, Set[str]]:
+        address = sorted(self.tracked) if len(self.tracked) <= ADDRESS_FILTER_MAX else None
+        logs = await self.rpc.get_logs(address, [SYNC], self.block + 1, head)
+        per_block: Dict[int, Set[str]] = {}
+        # the last Sync of a pair in a block is its reserve after the block
+        for lg in sorted(logs, key=lambda x: (_int(x["blockNumber"]), _int(x["logIndex"]))):
+            if lg.get("removed"):
+                continue
+            pair = _cs(lg["address"])
+            if pair not in self.tracked:
+                continue
+            data = lg.get("data") or "0x"
+            raw = bytes.fromhex(data[2:] if data.startswith("0x") else data)
+            if len(raw) < 64:
+                continue
+            self.reserves[pair] = (int.from_bytes(raw[:32], "big"), int.from_bytes(raw[32:64], "big"))
+            per_block.setdefault(_int(lg["blockNumber"]), set()).add(pair)
+        self.block = head
+        return per_block
+
+    async def poll(self) -> Dict[int, Set[str]]:
+        """Bring the table to the chain head; returns {block: changed pairs} and publishes it."""
+        async with self._lock:
+            if not self.tracked:
+                return {}
+            t0 = time.perf_counter()
+            head = await self.rpc.block_number()
+            if head <= self.block:
+                # no new block, or a lagging endpoint answered: pairs added since the
+                # last round wait for the next head rather than being read at a
+                # block this endpoint may not have
+                return {}
+            if (not self.block or head - self.block > MAX_LOG_SPAN
+                    or (RESYNC_BLOCKS > 0 and head - self._resynced >= RESYNC_BLOCKS)):
+                changed = await self._snapshot_all()
+                per_block = {self.block: changed} if changed else {}
+            else:
+                per_block = await self._apply_logs(head)
+                if self._pending:
+                    changed = await self._snapshot_pending()
+                    if changed:
+                        per_block.setdefault(self.block, set()).update(changed)
+            MET_BLOCK.set(self.block)
+            MET_LAG.observe(time.perf_counter() - t0)
+            self._publish(per_block)
+            return per_block
+
+    async def run(self, interval: float = POLL_SEC) -> None:
+        while True:
+            try:
+                await self.poll()
+            except Exception as e:
+                log.warning("reserve poll failed: %s", e)
+            await asyncio.sleep(interval)
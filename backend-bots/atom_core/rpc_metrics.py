@@ -0,0 +1,159 @@
+import os
+import sys
+import time
+import asyncio
+import threading
+from collections import defaultdict
+from typing import Any, Callable, Dict, Optional
+from urllib.parse import urlparse
+
+from prometheus_client import Counter, Histogram
+
+# Calling bot, as a metrics label and in the JSON summary
+BOT_NAME = os.getenv("ATOM_BOT_NAME") or os.path.splitext(os.path.basename(sys.argv[0] or ""))[0] or "unknown"
+SUMMARY_INTERVAL = float(os.getenv("RPC_SUMMARY_INTERVAL", "60"))
+
+_LABELS = ["method", "endpoint", "bot"]
+MET_RPC_CALLS = Counter("atom_rpc_calls_total", "JSON-RPC requests sent, by result", _LABELS + ["result"])
+MET_RPC_LATENCY = Histogram("atom_rpc_latency_seconds", "JSON-RPC request latency", _LABELS,
+                            buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10))
+MET_RPC_BYTES = Histogram("atom_rpc_payload_bytes", "JSON-RPC payload size", _LABELS + ["direction"],
+                          buckets=(64, 256, 1024, 4096, 16384, 65536, 262144, 1048576))
+MET_RPC_ERRORS = Counter("atom_rpc_errors_total", "JSON-RPC errors by class", _LABELS + ["error"])
+MET_RPC_OUTCOME = Counter("atom_rpc_outcomes_total", "Where a request was answered from", ["method", "bot", "outcome"])
+
+# Outcomes for RPCMethods.request: answered by the block cache, by another caller's
+# in-flight request, or by this request going to the network
+CACHE_HIT = "cache_hit"
+COALESCED = "coalesced"
+NETWORK = "network"
+
+def endpoint_label(url: str) -> str:
+    """Host part only, so API keys in paths/queries never reach metrics or logs."""
+    return urlparse(url).netloc or url
+
+def error_class(e: BaseException) -> str:
+    """Low-cardinality label for an exception: http_<status>, rpc_<code>, timeout or the type name."""
+    if isinstance(e, asyncio.TimeoutError):
+        return "timeout"
+    status = getattr(e, "status", None)
+    if isinstance(status, int):
+        return f"http_{status}"
+    code = getattr(e, "code", None)
+    if isinstance(code, int):
+        return f"rpc_{code}"
+    return type(e).__name__
+
+def payload_size(value: Any) -> int:
+    if isinstance(value, (str, bytes)):
+        return len(value)
+    if value is None:
+        return 0
+    return len(str(value))
+
+class RPCStats:
+    """In-process per (method, endpoint) totals behind the periodic JSON summary."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self) -> None:
+        self.since = time.time()
+        self.calls: Dict[tuple, Dict[str, Any]] = {}
+        self.outcomes: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+
+    def _entry(self, method: str, endpoint: str) -> Dict[str, Any]:
+        st = self.calls.get((method, endpoint))
+        if st is None:
+            st = self.calls[(method, endpoint)] = {"count": 0, "errors": defaultdict(int), "lat_sum": 0.0,
+                                                   "lat_max": 0.0, "bytes_out": 0, "bytes_in": 0}
+        return st
+
+    def record(self, method: str, endpoint: str, latency_s: float, error: Optional[str] = None) -> None:
+        with self._lock:
+            st = self._entry(method, endpoint)
+            st["count"] += 1
+            st["lat_sum"] += latency_s
+            st["lat_max"] = max(st["lat_max"], latency_s)
+            if error:
+                st["errors"][error] += 1
+
+    def record_bytes(self, method: str, endpoint: str, out: int = 0, inp: int = 0) -> None:
+        with self._lock:
+            st = self._entry(method, endpoint)
+            st["bytes_out"] += out
+            st["bytes_in"] += inp
+
+    def record_outcome(self, method: str, outcome: str) -> None:
+        with self._lock:
+            self.outcomes[method][outcome] += 1
+
+    def summary(self, reset: bool = True) -> Dict[str, Any]:
+        with self._lock:
+            now = time.time()
+            methods = [
+                {
+                    "method": m, "endpoint": ep, "count": st["count"],
+                    "avg_ms": round(1000 * st["lat_sum"] / st["count"], 2) if st["count"] else 0.0,
+                    "max_ms": round(1000 * st["lat_max"], 2),
+                    "bytes_out": st["bytes_out"], "bytes_in": st["bytes_in"],
+                    "errors": dict(st["errors"]),
+                }
+                for (m, ep), st in sorted(self.calls.items(), key=lambda kv: -kv[1]["count"])
+            ]
+            out = {
+                "bot": BOT_NAME, "window_s": round(now - self.since, 1), "methods": methods,
+                "outcomes": {m: dict(o) for m, o in self.outcomes.items()},
+            }
+            if reset:
+                self._reset()
+            return out
+
+STATS = RPCStats()
+
+def observe_call(method: str, endpoint: str, latency_s: float, error: Optional[str] = None) -> None:
+    """Record one request; `error` is an error_class() label, None on success."""
+    MET_RPC_CALLS.labels(method, endpoint, BOT_NAME, "error" if error else "ok").inc()
+    MET_RPC_LATENCY.labels(method, endpoint, BOT_NAME).observe(latency_s)
+    if error:
+        MET_RPC_ERRORS.labels(method, endpoint, BOT_NAME, error).inc()
+    STATS.record(method, endpoint, latency_s, error)
+
+def observe_bytes(method: str, endpoint: str, out: int = 0, inp: int = 0) -> None:
+    if out:
+        MET_RPC_BYTES.labels(method, endpoint, BOT_NAME, "out").observe(out)
+    if inp:
+        MET_RPC_BYTES.labels(method, endpoint, BOT_NAME, "in").observe(inp)
+    STATS.record_bytes(method, endpoint, out, inp)
+
+def observe_outcome(method: str, outcome: str) -> None:
+    MET_RPC_OUTCOME.labels(method, BOT_NAME, outcome).inc()
+    STATS.record_outcome(method, outcome)
+
+async def summary_loop(jlog: Callable[..., None], interval: float = SUMMARY_INTERVAL) -> None:
+    """Emit STATS as one structured log line every `interval` seconds via the bot's jlog."""
+    while True:
+        await asyncio.sleep(interval)
+        jlog("info", event="rpc_summary", **STATS.summary())
+
+def metrics_middleware(make_request, w3):
+    """web3 middleware recording the same per-method metrics for synchronous providers."""
+    endpoint = endpoint_label(getattr(w3.provider, "endpoint_uri", "") or "-")
+
+    def inner(method, params):
+        t0 = time.perf_counter()
+        try:
+            resp = make_request(method, params)
+        except Exception as e:
+            observe_call(method, endpoint, time.perf_counter() - t0, error_class(e))
+            raise
+        err = resp.get("error") if isinstance(resp, dict) else None
+        cls = None
+        if err:
+            cls = f"rpc_{err.get('code')}" if isinstance(err, dict) else "rpc_error"
+        observe_call(method, endpoint, time.perf_counter() - t0, cls)
+        if isinstance(resp, dict):
+            observe_bytes(method, endpoint, inp=payload_size(resp.get("result")))
+        return resp
+    return inner
@@ -1,9 +1,18 @@
 import os
-import random
+import time
 import asyncio
-from typing import List, Callable, Awaitable, Any
+import logging
+from collections import deque
+from typing import List, Callable, Awaitable, Any, Optional
+from prometheus_client import Gauge
 from web3 import Web3, HTTPProvider
-from .safe_async import CircuitBreaker, guard
+from .safe_async import BreakerRegistry, CircuitOpenError, guard
+from .jsonrpc import AsyncRPCClient, RPCError, RPCMethods
+from .hedge import HEDGE_DEFAULT_DELAY, HEDGE_ENABLED, HEDGEABLE_METHODS, HedgeBudget, hedged
+from .ratelimit import SCANNING, RateLimitedError
+from .rpc_metrics import endpoint_label
+
+log = logging.getLogger("atom.rpc_pool")
 
 # Comma-separated list of HTTP RPC URLs
 _RPCs: List[str] = [x.strip() for x in os.environ.get("ETH_RPC_URLS", "").split(",") if x.strip()]
@@ -15,34 +24,225 @@ if not _RPCs:
             _RPCs.append(v)
 
 _PROVIDERS: List[Web3] = [Web3(HTTPProvider(u, request_kwargs={"timeout": 10})) for u in _RPCs]
-_breaker = CircuitBreaker(fail_max=int(os.getenv("RPC_FAIL_MAX", "5")), reset_after=float(os.getenv("RPC_BREAKER_RESET", "30")))
+
+# Method classes for per-endpoint breakers: a flaky send path must not block reads
+READ = "read"
+SEND = "send"
+_BREAKERS = BreakerRegistry(
+    fail_max=int(os.getenv("RPC_FAIL_MAX", "5")),
+    reset_after=float(os.getenv("RPC_BREAKER_RESET", "30")),
+    half_open_max=int(os.getenv("RPC_BREAKER_HALF_OPEN", "1")),
+)
+
+# Health tracking (background latency probe + passive error samples from with_w3)
+HEALTH_INTERVAL = float(os.getenv("RPC_HEALTH_INTERVAL", "5"))
+HEALTH_TIMEOUT = float(os.getenv("RPC_HEALTH_TIMEOUT", "3"))
+EWMA_ALPHA = float(os.getenv("RPC_EWMA_ALPHA", "0.2"))
+MAX_ERROR_RATE = float(os.getenv("RPC_MAX_ERROR_RATE", "0.5"))
+LATENCY_WINDOW = int(os.getenv("RPC_LATENCY_WINDOW", "200"))
+
+MET_EP_SCORE = Gauge("atom_rpc_endpoint_score", "Selection score per RPC endpoint (lower is better)", ["endpoint"])
+MET_EP_LATENCY = Gauge("atom_rpc_endpoint_latency_ms", "EWMA latency per RPC endpoint", ["endpoint"])
+MET_EP_ERRORS = Gauge("atom_rpc_endpoint_error_rate", "EWMA error rate per RPC endpoint", ["endpoint"])
+
+class EndpointHealth:
+    """EWMA of latency and error rate for one endpoint."""
+
+    def __init__(self, url: str, alpha: float = EWMA_ALPHA):
+        self.url = url
+        self.label = endpoint_label(url)
+        self.alpha = alpha
+        self.latency_ms: Optional[float] = None
+        self.error_rate = 0.0
+        self.samples: deque = deque(maxlen=LATENCY_WINDOW)
+
+    def observe(self, ok: bool, latency_s: Optional[float] = None) -> None:
+        a = self.alpha
+        self.error_rate = (1 - a) * self.error_rate + a * (0.0 if ok else 1.0)
+        if ok and latency_s is not None:
+            ms = latency_s * 1000.0
+            self.samples.append(latency_s)
+            self.latency_ms = ms if self.latency_ms is None else (1 - a) * self.latency_ms + a * ms
+        MET_EP_SCORE.labels(self.label).set(self.score())
+        MET_EP_LATENCY.labels(self.label).set(self.latency_ms or 0.0)
+        MET_EP_ERRORS.labels(self.label).set(self.error_rate)
+
+    @property
+    def healthy(self) -> bool:
+        return self.error_rate < MAX_ERROR_RATE
+
+    def p90(self) -> Optional[float]:
+        """Rolling p90 latency in seconds, None until there are enough samples."""
+        if len(self.samples) < 10:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[int(0.9 * (len(ordered) - 1))]
+
+    def score(self) -> float:
+        # unmeasured endpoints are scored as if they answered at the probe timeout
+        base = self.latency_ms if self.latency_ms is not None else HEALTH_TIMEOUT * 1000.0
+        return base * (1.0 + 4.0 * self.error_rate)
+
+_HEALTH: List[EndpointHealth] = [EndpointHealth(u) for u in _RPCs]
+_health_task: Optional[asyncio.Task] = None
+
+async def _probe(i: int) -> None:
+    w3 = _PROVIDERS[i]
+    t0 = time.perf_counter()
+    try:
+        await asyncio.wait_for(asyncio.to_thread(lambda: w3.eth.block_number), timeout=HEALTH_TIMEOUT)
+        _HEALTH[i].observe(True, time.perf_counter() - t0)
+    except Exception as e:
+        _HEALTH[i].observe(False)
+        log.debug("probe %s failed: %s", _HEALTH[i].label, e)
+
+async def health_loop(interval: float = HEALTH_INTERVAL) -> None:
+    """Probe every endpoint concurrently, off the request path."""
+    while True:
+        await asyncio.gather(*(_probe(i) for i in range(len(_PROVIDERS))))
+        await asyncio.sleep(interval)
+
+def start_health_tracker() -> None:
+    global _health_task
+    if _PROVIDERS and (_health_task is None or _health_task.done()):
+        _health_task = asyncio.get_running_loop().create_task(health_loop())
+
+def _ranked(exclude: Optional[set] = None) -> List[int]:
+    order = sorted((i for i in range(len(_PROVIDERS)) if not exclude or i not in exclude), key=lambda i: _HEALTH[i].score())
+    # healthy endpoints first, each group by score
+    return [i for i in order if _HEALTH[i].healthy] + [i for i in order if not _HEALTH[i].healthy]
+
+def _best_index(exclude: Optional[set] = None) -> int:
+    return _ranked(exclude)[0]
+
+def breaker_for(i: int, kind: str = READ):
+    return _BREAKERS.get(_HEALTH[i].label, kind)
 
 async def choose_web3() -> Web3:
-    """Pick a healthy provider by sampling the pool and verifying block access."""
+    """Return the best-scoring healthy provider; no network probe on this path."""
     if not _PROVIDERS:
         raise RuntimeError("ETH_RPC_URLS not configured")
-    for _ in range(len(_PROVIDERS)):
-        w3 = random.choice(_PROVIDERS)
-        try:
-            _ = await guard(asyncio.to_thread(lambda: w3.eth.block_number), timeout=5.0, retries=2, backoff=0.2, breaker=_breaker)
-            return w3
-        except Exception:
-            await asyncio.sleep(0.05)
-            continue
-    raise RuntimeError("All RPC endpoints failed")
+    start_health_tracker()
+    return _PROVIDERS[_best_index()]
 
-async def with_w3(fn: Callable[[Web3], Awaitable[Any]]):
-    """Run a coroutine factory with failover retries over the provider pool."""
+async def with_w3(fn: Callable[[Web3], Awaitable[Any]], kind: str = READ):
+    """
+    Run a coroutine factory with failover over the provider pool. Endpoints whose
+    (endpoint, kind) breaker is open are skipped without waiting; a half-open one
+    gets a trial call.
+    """
     last_err: Exception | None = None
     if not _PROVIDERS:
         raise RuntimeError("ETH_RPC_URLS not configured")
-    for _ in range(len(_PROVIDERS)):
-        w3 = await choose_web3()
+    start_health_tracker()
+    for i in _ranked():
+        breaker = breaker_for(i, kind)
+        w3 = _PROVIDERS[i]
         try:
-            return await guard(fn(w3), timeout=15.0, retries=2, backoff=0.5, breaker=_breaker)
+            result = await guard(lambda: fn(w3), timeout=15.0, retries=2, backoff=0.5, breaker=breaker)
+            # latency samples come from the probe loop; fn() may do arbitrary work
+            _HEALTH[i].observe(True)
+            return result
+        except CircuitOpenError as e:
+            last_err = e
+            continue
         except Exception as e:
+            _HEALTH[i].observe(False)
             last_err = e
             await asyncio.sleep(0.5)
+    if isinstance(last_err, CircuitOpenError):
+        raise CircuitOpenError(f"with_w3: all {len(_PROVIDERS)} endpoints have open {kind} circuits")
     if last_err:
         raise last_err
-    raise RuntimeError("with_w3: unexpected failure") 
\ No newline at end of file
+    raise RuntimeError("with_w3: unexpected failure")
+
+# JSON-RPC error codes that mean "this endpoint is struggling", not "the call failed"
+RETRYABLE_RPC_CODES = frozenset({-32005, -32603, 429})
+
+def _endpoint_fault(e: BaseException) -> bool:
+    return not isinstance(e, RPCError) or e.code in RETRYABLE_RPC_CODES
+
+class RPCPool(RPCMethods):
+    """
+    Async JSON-RPC over several endpoints of one chain: health-ranked selection,
+    the shared per-endpoint breakers, and opt-in hedging of idempotent reads.
+    `priority` is the rate-limit class for requests that do not pass their own.
+    An endpoint whose limiter sheds a request is skipped like a failed one, but
+    its breaker and health are left alone.
+    """
+
+    def __init__(self, urls: List[str], *, hedge: bool = HEDGE_ENABLED, priority: int = SCANNING):
+        if not urls:
+            raise RuntimeError("RPCPool needs at least one endpoint")
+        self.clients = [AsyncRPCClient(u, priority=priority) for u in urls]
+        self.health = [EndpointHealth(u) for u in urls]
+        self.hedge = hedge
+        self.budget = HedgeBudget()
+
+    async def close(self) -> None:
+        await asyncio.gather(*(c.close() for c in self.clients))
+
+    def _order(self, kind: str) -> List[int]:
+        order = sorted(range(len(self.clients)), key=lambda i: self.health[i].score())
+        order = [i for i in order if self.health[i].healthy] + [i for i in order if not self.health[i].healthy]
+        return [i for i in order if _BREAKERS.get(self.health[i].label, kind).state() != "open"]
+
+    async def _send(self, i: int, method: str, params: Optional[List[Any]], kind: str, **kw: Any) -> Any:
+        h = self.health[i]
+        breaker = _BREAKERS.get(h.label, kind)
+        if not breaker.can_run():
+            raise CircuitOpenError(f"{h.label}/{kind} circuit open")
+        t0 = time.perf_counter()
+        try:
+            result = await self.clients[i]._dispatch(method, params, **kw)
+        except RateLimitedError:
+            breaker.release()
+            raise
+        except asyncio.CancelledError:
+            # lost a hedge race or the caller went away: the elapsed time is not a
+            # latency sample, and counting it would pull the EWMA and p90 down
+            breaker.release()
+            raise
+        except Exception as e:
+            fault = _endpoint_fault(e)
+            breaker.record(not fault)
+            h.observe(not fault, None if fault else time.perf_counter() - t0)
+            raise
+        breaker.record(True)
+        h.observe(True, time.perf_counter() - t0)
+        return result
+
+    async def _dispatch(self, method: str, params: List[Any], kind: str = READ, **kw: Any) -> Any:
+        order = self._order(kind)
+        if not order:
+            raise CircuitOpenError(f"RPCPool: all endpoints have open {kind} circuits")
+        last_err: Exception | None = None
+        tried: set = set()
+
+        def attempt(i: int):
+            tried.add(i)
+            return self._send(i, method, params, kind, **kw)
+
+        if self.hedge and kind == READ and method in HEDGEABLE_METHODS and len(order) > 1:
+            p, s = order[0], order[1]
+            delay = self.health[p].p90() or HEDGE_DEFAULT_DELAY
+            try:
+                result, _ = await hedged(
+                    method, lambda: attempt(p), lambda: attempt(s),
+                    delay, self.budget, final=lambda e: not _endpoint_fault(e),
+                )
+                return result
+            except Exception as e:
+                if not _endpoint_fault(e):
+                    raise
+                last_err = e
+        for i in order:
+            if i in tried:
+                continue
+            try:
+                return await self._send(i, method, params, kind, **kw)
+            except Exception as e:
+                if not _endpoint_fault(e):
+                    raise
+                last_err = e
+        raise last_err or RuntimeError("RPCPool: unexpected failure")
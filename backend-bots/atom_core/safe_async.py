@@ -1,41 +1,125 @@
+import time
 import asyncio
 import contextlib
 import logging
+from typing import Dict, Hashable, Optional
 
 log = logging.getLogger("atom.safe")
 
+class CircuitOpenError(RuntimeError):
+    """Raised when a breaker rejects a call without running it."""
+
 class CircuitBreaker:
-    def __init__(self, fail_max: int = 5, reset_after: float = 30.0):
+    """
+    closed -> open after fail_max consecutive failures; open -> half_open once
+    reset_after has elapsed. In half_open at most half_open_max trial calls run:
+    a success closes the circuit, a failure re-opens it for another reset_after.
+    """
+
+    def __init__(self, fail_max: int = 5, reset_after: float = 30.0, half_open_max: int = 1, name: str = ""):
         self.fail_max = fail_max
         self.reset_after = reset_after
+        self.half_open_max = max(1, half_open_max)
+        self.name = name
         self.fail_count = 0
         self.open_until = 0.0
+        self.trials = 0
+
+    def state(self, now: Optional[float] = None) -> str:
+        now = time.monotonic() if now is None else now
+        if self.open_until == 0.0:
+            return "closed"
+        return "open" if now < self.open_until else "half_open"
+
+    @property
+    def is_open(self) -> bool:
+        return self.state() == "open"
 
-    def can_run(self, now: float) -> bool:
-        return now >= self.open_until
+    def can_run(self, now: Optional[float] = None) -> bool:
+        """True if a call may proceed; in half_open this reserves a trial slot."""
+        st = self.state(now)
+        if st == "closed":
+            return True
+        if st == "open":
+            return False
+        if self.trials < self.half_open_max:
+            self.trials += 1
+            return True
+        return False
 
-    def record(self, ok: bool, now: float) -> None:
+    def record(self, ok: bool, now: Optional[float] = None) -> None:
+        now = time.monotonic() if now is None else now
         if ok:
+            if self.open_until:
+                log.info("Circuit %s closed", self.name or "-")
             self.fail_count = 0
-        else:
-            self.fail_count += 1
-            if self.fail_count >= self.fail_max:
-                self.open_until = now + self.reset_after
-                log.error("Circuit opened for %ss", self.reset_after)
+            self.open_until = 0.0
+            self.trials = 0
+            return
+        self.fail_count += 1
+        half_open = self.state(now) == "half_open"
+        if half_open or self.fail_count >= self.fail_max:
+            self.open_until = now + self.reset_after
+            self.trials = 0
+            log.error("Circuit %s opened for %ss", self.name or "-", self.reset_after)
+
+    def release(self) -> None:
+        """Give back a half-open trial slot for a call that was abandoned (e.g. cancelled)."""
+        if self.trials > 0:
+            self.trials -= 1
+
+    def record_success(self) -> None:
+        self.record(True)
+
+    def record_failure(self) -> None:
+        self.record(False)
+
+class BreakerRegistry:
+    """One CircuitBreaker per key, e.g. (endpoint, "read") / (endpoint, "send")."""
+
+    def __init__(self, fail_max: int = 5, reset_after: float = 30.0, half_open_max: int = 1):
+        self.fail_max = fail_max
+        self.reset_after = reset_after
+        self.half_open_max = half_open_max
+        self._breakers: Dict[Hashable, CircuitBreaker] = {}
+
+    def get(self, *key: Hashable) -> CircuitBreaker:
+        b = self._breakers.get(key)
+        if b is None:
+            b = CircuitBreaker(self.fail_max, self.reset_after, self.half_open_max, name="/".join(map(str, key)))
+            self._breakers[key] = b
+        return b
+
+    def items(self):
+        return self._breakers.items()
 
 async def guard(coro, *, timeout: float = 10.0, retries: int = 3, backoff: float = 0.5, breaker: CircuitBreaker | None = None):
+    """
+    Await with timeout, retries and an optional breaker. Pass a zero-arg factory
+    instead of a coroutine object to get a fresh coroutine per attempt; a bare
+    coroutine can only be awaited once, so it effectively gets a single try.
+    Retries stop as soon as the breaker opens, re-raising the error that opened it.
+    """
     for attempt in range(retries):
         if breaker and not breaker.can_run(asyncio.get_event_loop().time()):
-            raise RuntimeError("Circuit open")
+            if not callable(coro):
+                coro.close()
+            raise CircuitOpenError("Circuit open")
         try:
-            result = await asyncio.wait_for(coro, timeout=timeout)
+            result = await asyncio.wait_for(coro() if callable(coro) else coro, timeout=timeout)
             if breaker:
                 breaker.record(True, asyncio.get_event_loop().time())
             return result
-        except Exception as e:
+        except asyncio.CancelledError:
+            # neither success nor failure; free a half-open trial slot for the next caller
+            if breaker:
+                breaker.release()
+            raise
+        except Exception:
+            now = asyncio.get_event_loop().time()
             if breaker:
-                breaker.record(False, asyncio.get_event_loop().time())
-            if attempt == retries - 1:
+                breaker.record(False, now)
+            if attempt == retries - 1 or not callable(coro) or (breaker and breaker.state(now) == "open"):
                 raise
             await asyncio.sleep(backoff * (2 ** attempt))
 
@@ -44,4 +128,4 @@ async def cancellation_shield():
     try:
         yield
     except asyncio.CancelledError:
-        raise 
\ No newline at end of file
+        raise
@@ -0,0 +1,311 @@
+import os
+import mmap
+import time
+import struct
+import asyncio
+import logging
+import tempfile
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+from prometheus_client import Gauge
+from web3 import Web3
+
+from .jsonrpc import RPCMethods
+from .reserve_state import MET_BLOCK, POLL_SEC, ReserveState
+
+log = logging.getLogger("atom.shm_reserves")
+
+# Memory-mapped reserve table shared by the bots on one host. Bots read it when
+# this is set (the orchestrator sets it for its children); otherwise each polls on its own.
+RESERVE_SHM_PATH = os.getenv("RESERVE_SHM_PATH", "")
+# Only the chain the writer serves is read from the table
+RESERVE_SHM_CHAIN = int(os.getenv("RESERVE_SHM_CHAIN", "137"))
+# Slots in the table, fixed when the writer creates it
+SHM_SLOTS = int(os.getenv("RESERVE_SHM_SLOTS", "16384"))
+# How often readers look at the sequence number (one 8-byte read)
+SHM_POLL_SEC = float(os.getenv("RESERVE_SHM_POLL_SEC", "0.05"))
+# Readers add the pairs they need to this Redis set; the writer tracks its members
+SHM_WANT_PREFIX = os.getenv("RESERVE_SHM_WANT_PREFIX", "atom:reserves:want")
+SHM_WANT_SEC = float(os.getenv("RESERVE_SHM_WANT_SEC", "2.0"))
+# No new block in the table for this long and a reader polls the chain itself until the writer is back
+SHM_STALE_SEC = float(os.getenv("RESERVE_SHM_STALE_SEC", "15"))
+
+# Layout, little-endian. Header (64 bytes):
+#   0 magic | 4 version u16 | 6 slot size u16 | 8 capacity u32 | 12 chain id u32
+#   16 used slots u32 | 24 seq u64 | 32 block u64
+# then `capacity` slots of: pair address 20s | reserve0 u128 | reserve1 u128 | block last written u64
+MAGIC = b"ATRS"
+VERSION = 1
+_META = struct.Struct("<4sHHII")
+_U32 = struct.Struct("<I")
+_U64 = struct.Struct("<Q")
+_SLOT = struct.Struct("<20s16s16sQ4x")
+_COUNT, _SEQ, _BLOCK = 16, 24, 32
+HEADER_SIZE = 64
+# A write section is a few memcpys; a reader that keeps landing in one tries again on its next poll
+_READ_TRIES = 64
+
+MET_ATTACHED = Gauge("atom_reserve_shm_attached", "1 while reserves come from the shared table, 0 while polled locally")
+MET_SLOTS = Gauge("atom_reserve_shm_slots", "Slots in use in the shared reserve table")
+
+def _cs(addr: str) -> str:
+    return Web3.to_checksum_address(addr)
+
+def default_path(chain_id: int = 137) -> str:
+    base = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+    return os.path.join(base, f"atom_reserves_{chain_id}")
+
+def want_key(chain_id: int) -> str:
+    return f"{SHM_WANT_PREFIX}:{chain_id}"
+
+def _slot_offset(slot: int) -> int:
+    return HEADER_SIZE + slot * _SLOT.size
+
+class ReserveTable:
+    """
+    Writer side: one process keeps a ReserveState for the union of the pairs the
+    bots asked for and publishes it into a fixed-layout memory-mapped table. Each
+    write is bracketed by the sequence number (odd while writing, even when done),
+    so readers take a consistent snapshot with no lock and no serialization.
+    A slot keeps its pair for the life of the file.
+    """
+
+    def __init__(self, rpc: RPCMethods, path: Optional[str] = None, chain_id: int = 137,
+                 capacity: int = SHM_SLOTS, redis=None):
+        self.state = ReserveState(rpc)
+        self.path = path or default_path(chain_id)
+        self.chain_id = chain_id
+        self.capacity = capacity
+        self.redis = redis
+        self.slots: Dict[str, int] = {}
+        self._wanted = 0
+        self._full_logged = False
+        self.buf = self._open()
+
+    def _valid(self, buf) -> bool:
+        return _META.unpack_from(buf, 0) == (MAGIC, VERSION, _SLOT.size, self.capacity, self.chain_id)
+
+    def _open(self) -> mmap.mmap:
+        size = _slot_offset(self.capacity)
+        try:
+            # reuse a table with the same layout, so attached readers carry on across a writer restart
+            with open(self.path, "r+b") as f:
+                if os.fstat(f.fileno()).st_size == size:
+                    buf = mmap.mmap(f.fileno(), size)
+                    if self._valid(buf):
+                        seq = _U64.unpack_from(buf, _SEQ)[0]
+                        if seq & 1:
+                            _U64.pack_into(buf, _SEQ, seq + 1)  # died mid-write; the first poll rewrites every slot
+                        count = _U32.unpack_from(buf, _COUNT)[0]
+                        for slot in range(count):
+                            self.slots[_cs("0x" + buf[_slot_offset(slot):_slot_offset(slot) + 20].hex())] = slot
+                        self.state.track(self.slots)
+                        return buf
+                    buf.close()
+        except OSError:
+            pass
+        # a fresh file replaces the old one; readers notice the new inode and re-attach
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(self.path), prefix=".atom_reserves.")
+        try:
+            os.ftruncate(fd, size)
+            buf = mmap.mmap(fd, size)
+            _META.pack_into(buf, 0, MAGIC, VERSION, _SLOT.size, self.capacity, self.chain_id)
+            os.fchmod(fd, 0o644)
+            os.replace(tmp, self.path)
+        finally:
+            os.close(fd)
+        return buf
+
+    def _write(self, changed: Iterable[str]) -> None:
+        buf = self.buf
+        seq = _U64.unpack_from(buf, _SEQ)[0] + 1
+        # Python writes these in program order and x86 keeps stores in order, which the seqlock relies on
+        _U64.pack_into(buf, _SEQ, seq)
+        try:
+            for pair in changed:
+                slot = self.slots.get(pair)
+                if slot is None:
+                    if len(self.slots) >= self.capacity:
+                        if not self._full_logged:
+                            log.warning("reserve table full (%d slots); raise RESERVE_SHM_SLOTS", self.capacity)
+                            self._full_logged = True
+                        continue
+                    slot = self.slots[pair] = len(self.slots)
+                r0, r1 = self.state.reserves[pair]
+                _SLOT.pack_into(buf, _slot_offset(slot), bytes.fromhex(pair[2:]),
+                                r0.to_bytes(16, "little"), r1.to_bytes(16, "little"), self.state.block)
+            _U32.pack_into(buf, _COUNT, len(self.slots))
+            _U64.pack_into(buf, _BLOCK, self.state.block)
+        finally:
+            _U64.pack_into(buf, _SEQ, seq + 1)
+        MET_SLOTS.set(len(self.slots))
+
+    async def _refresh_wanted(self) -> None:
+        if self.redis is None:
+            return
+        key = want_key(self.chain_id)
+        # the set only grows, so its size says whether there is anything new
+        n = await self.redis.scard(key)
+        if n != self._wanted:
+            self.state.track(await self.redis.smembers(key))
+            self._wanted = n
+
+    async def run(self, interval: float = POLL_SEC) -> None:
+        last_want = 0.0
+        published = -1
+        while True:
+            try:
+                if time.monotonic() - last_want >= SHM_WANT_SEC:
+                    await self._refresh_wanted()
+                    last_want = time.monotonic()
+                per_block = await self.state.poll()
+                changed = set().union(*per_block.values())
+                if changed or self.state.block != published:
+                    self._write(changed)
+                    published = self.state.block
+            except Exception as e:
+                log.warning("reserve table update failed: %s", e)
+            await asyncio.sleep(interval)
+
+class SharedReserves(ReserveState):
+    """
+    Reader side, a drop-in ReserveState: track(), get(), `reserves`, `block` and
+    subscribe() behave the same, but poll() copies the tracked pairs out of the
+    writer's table instead of asking the chain. Newly tracked pairs are requested
+    from the writer through Redis. While the table is missing or stops advancing,
+    poll() falls back to reading the chain like a plain ReserveState.
+    """
+
+    def __init__(self, rpc: RPCMethods, path: str, pairs: Iterable[str] = (), chain_id: int = 137, redis=None):
+        self._want: Set[str] = set()
+        super().__init__(rpc, pairs)
+        self.path = path
+        self.chain_id = chain_id
+        self.redis = redis
+        self.buf: Optional[mmap.mmap] = None
+        self._ino: Optional[int] = None
+        self._slots: Dict[str, int] = {}
+        self._seq = 0
+        self._table_block = 0  # table rows newer than this have not been copied yet
+        self._advanced = time.monotonic()
+        self._local_at = 0.0
+
+    def track(self, pairs: Iterable[str]) -> None:
+        pairs = {_cs(p) for p in pairs}
+        self._want |= pairs - self.tracked
+        super().track(pairs)
+
+    async def _request(self) -> None:
+        if not self._want:
+            return
+        if self.redis is None:
+            from .redis_pool import get_redis  # needs REDIS_URL, which every bot has
+            self.redis = get_redis()
+        want = list(self._want)
+        try:
+            await self.redis.sadd(want_key(self.chain_id), *want)
+        except Exception:
+            return  # asked again next poll
+        self._want.difference_update(want)
+
+    def _attach(self) -> bool:
+        if self.buf is not None:
+            self.buf.close()
+            self.buf = None
+        try:
+            with open(self.path, "rb") as f:
+                st = os.fstat(f.fileno())
+                if st.st_size < HEADER_SIZE:
+                    return False
+                buf = mmap.mmap(f.fileno(), st.st_size, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return False
+        magic, version, slot_size, capacity, chain_id = _META.unpack_from(buf, 0)
+        if (magic, version, slot_size, chain_id) != (MAGIC, VERSION, _SLOT.size, self.chain_id) \
+                or st.st_size < _slot_offset(capacity):
+            buf.close()
+            return False
+        self.buf, self._ino = buf, st.st_ino
+        self._slots.clear()
+        self._seq = self._table_block = 0
+        return True
+
+    def _replaced(self) -> bool:
+        try:
+            return os.stat(self.path).st_ino != self._ino
+        except OSError:
+            return True
+
+    def _read(self) -> Optional[Tuple[int, int, Dict[str, Tuple[int, int]]]]:
+        """One consistent copy of the tracked pairs: (seq, table block, pair -> reserves written since the last copy)."""
+        buf = self.buf
+        for _ in range(_READ_TRIES):
+            seq = _U64.unpack_from(buf, _SEQ)[0]
+            if seq & 1:
+                continue
+            count = _U32.unpack_from(buf, _COUNT)[0]
+            block = _U64.unpack_from(buf, _BLOCK)[0]
+            new_slots: Dict[str, int] = {}
+            for slot in range(len(self._slots), count):
+                off = _slot_offset(slot)
+                new_slots[_cs("0x" + buf[off:off + 20].hex())] = slot
+            rows: Dict[str, Tuple[int, int]] = {}
+            for pair in self.tracked:
+                slot = self._slots.get(pair, new_slots.get(pair))
+                if slot is None:
+                    continue
+                _, r0, r1, written = _SLOT.unpack_from(buf, _slot_offset(slot))
+                if written > self._table_block or pair not in self.reserves:
+                    rows[pair] = (int.from_bytes(r0, "little"), int.from_bytes(r1, "little"))
+            if _U64.unpack_from(buf, _SEQ)[0] == seq:
+                self._slots.update(new_slots)
+                return seq, block, rows
+        return None
+
+    async def _poll_local(self) -> Dict[int, Set[str]]:
+        if time.monotonic() - self._local_at < POLL_SEC:
+            return {}
+        self._local_at = time.monotonic()
+        MET_ATTACHED.set(0)
+        self._table_block = 0  # whole table is re-copied once it is back
+        self._pending |= self.tracked - self.reserves.keys()
+        return await super().poll()
+
+    async def poll(self) -> Dict[int, Set[str]]:
+        await self._request()
+        stale = time.monotonic() - self._advanced > SHM_STALE_SEC
+        if self.buf is None or (stale and self._replaced()):
+            self._attach()
+        snap = None
+        # read on a new sequence number, or while tracked pairs still have no reserves
+        if self.buf is not None and (_U64.unpack_from(self.buf, _SEQ)[0] != self._seq or self._pending):
+            snap = self._read()
+        if snap is None or snap[1] < self.block:
+            # nothing new in the table (or a local poll got ahead of it); the chain is asked only if the writer went quiet
+            return await self._poll_local() if stale else {}
+        seq, block, rows = snap
+        async with self._lock:
+            self._seq = seq
+            if block > self._table_block:
+                self._advanced = time.monotonic()
+            self._table_block = block
+            changed = {p for p, r in rows.items() if self.reserves.get(p) != r}
+            for p in changed:
+                self.reserves[p] = rows[p]
+            self._pending -= self.reserves.keys()
+            self.block = block
+            MET_ATTACHED.set(1)
+            MET_BLOCK.set(block)
+        per_block = {block: changed} if changed else {}
+        self._publish(per_block)
+        return per_block
+
+    async def run(self, interval: float = SHM_POLL_SEC) -> None:
+        await super().run(interval)
+
+def open_reserves(rpc: RPCMethods, chain_id: int = 137) -> ReserveState:
+    """The shared table when RESERVE_SHM_PATH is set and serves this chain, else a local ReserveState."""
+    if RESERVE_SHM_PATH and chain_id == RESERVE_SHM_CHAIN:
+        return SharedReserves(rpc, RESERVE_SHM_PATH, chain_id=chain_id)
+    return ReserveState(rpc)
@@ -0,0 +1,49 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+from prometheus_client import Counter, Gauge
+
+MET_FLIGHT = Counter("atom_rpc_singleflight_total", "Single-flight calls by outcome", ["group", "outcome"])
+MET_COALESCE_RATIO = Gauge("atom_rpc_coalescing_ratio", "Share of calls served by another caller's in-flight request", ["group"])
+
+class SingleFlight:
+    """
+    Concurrent calls with the same key share one underlying awaitable. The
+    shared task is shielded, so a cancelled waiter does not cancel it for the others.
+    """
+
+    def __init__(self, group: str = "rpc"):
+        self.group = group
+        self.leaders = 0
+        self.shared = 0
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+
+    def _observe(self, outcome: str) -> None:
+        MET_FLIGHT.labels(self.group, outcome).inc()
+        total = self.leaders + self.shared
+        MET_COALESCE_RATIO.labels(self.group).set(self.shared / total if total else 0.0)
+
+    def _done(self, key: Hashable, fut: asyncio.Future) -> None:
+        self._inflight.pop(key, None)
+        if not fut.cancelled():
+            fut.exception()  # mark retrieved even if every waiter went away
+
+    async def do(self, key: Hashable, factory: Callable[[], Awaitable[Any]]) -> Any:
+        fut = self._inflight.get(key)
+        if fut is not None:
+            self.shared += 1
+            self._observe("shared")
+            return await asyncio.shield(fut)
+        fut = asyncio.ensure_future(factory())
+        self._inflight[key] = fut
+        fut.add_done_callback(lambda f, k=key: self._done(k, f))
+        self.leaders += 1
+        self._observe("leader")
+        return await asyncio.shield(fut)
+
+    def inflight(self, key: Hashable) -> bool:
+        return key in self._inflight
+
+    def ratio(self) -> float:
+        total = self.leaders + self.shared
+        return self.shared / total if total else 0.0
@@ -0,0 +1,189 @@
+import os
+import json
+import asyncio
+import tempfile
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from eth_abi import decode as abi_decode
+from prometheus_client import Counter
+from web3 import Web3
+
+from .jsonrpc import RPCMethods
+from .multicall import Call, aggregate3, decode_result, encode_call
+
+# Local copy of the registry, shared by every bot on the host
+TOKEN_META_DIR = os.getenv("TOKEN_META_DIR", os.path.expanduser("~/.cache/atom"))
+# Shared copy, so a bot on another host starts warm too
+TOKEN_META_REDIS_PREFIX = os.getenv("TOKEN_META_REDIS_PREFIX", "atom:meta")
+
+MET_META = Counter("atom_token_meta_total", "Token metadata lookups by where they were answered",
+                   ["kind", "source"])
+
+_DECIMALS = encode_call("decimals()")
+_SYMBOL = encode_call("symbol()")
+_TOKEN0 = encode_call("token0()")
+_TOKEN1 = encode_call("token1()")
+
+def _cs(addr: str) -> str:
+    return Web3.to_checksum_address(addr)
+
+def _symbol(result: Tuple[bool, bytes]) -> Optional[str]:
+    """symbol() as string, or as bytes32 for the older tokens (MKR-style) that return that."""
+    dec = decode_result(["string"], result)
+    if dec is not None:
+        return str(dec[0])
+    ok, ret = result
+    if ok and len(ret) == 32:
+        return abi_decode(["bytes32"], ret)[0].rstrip(b"\0").decode("utf-8", "replace") or None
+    return None
+
+class TokenRegistry:
+    """
+    ERC-20 decimals/symbol and pair token0/token1 for one chain. These never
+    change once deployed, so each is read from chain at most once: lookups go
+    memory -> disk -> Redis, and misses are filled in one multicall and written
+    back to both. Reads that fail are not stored and are retried on the next fill.
+    """
+
+    def __init__(self, rpc: RPCMethods, chain_id: int = 137, redis=None, path: Optional[str] = None):
+        self.rpc = rpc
+        self.chain_id = chain_id
+        self.redis = redis
+        self.path = path or os.path.join(TOKEN_META_DIR, f"token_meta_{chain_id}.json")
+        self.decimals: Dict[str, int] = {}
+        self.symbols: Dict[str, str] = {}
+        self.pair_tokens: Dict[str, Tuple[str, str]] = {}
+        self._lock = asyncio.Lock()
+
+    def _key(self, kind: str) -> str:
+        return f"{TOKEN_META_REDIS_PREFIX}:{self.chain_id}:{kind}"
+
+    # ---------- storage ----------
+
+    def _merge(self, decimals: Dict[str, int], symbols: Dict[str, str], pairs: Dict[str, Tuple[str, str]]) -> None:
+        self.decimals.update({_cs(k): int(v) for k, v in decimals.items()})
+        self.symbols.update({_cs(k): str(v) for k, v in symbols.items()})
+        self.pair_tokens.update({_cs(k): (_cs(v[0]), _cs(v[1])) for k, v in pairs.items()})
+
+    def _read_disk(self) -> dict:
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _merge_disk(self, raw: dict) -> None:
+        self._merge(raw.get("decimals", {}), raw.get("symbols", {}), raw.get("pairs", {}))
+
+    def _write_disk(self, data: dict) -> None:
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(self.path), prefix=".token_meta.")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(data, f, separators=(",", ":"))
+            os.replace(tmp, self.path)
+        except OSError:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+
+    async def _load_redis(self) -> None:
+        if self.redis is None:
+            return
+        try:
+            decimals, symbols, pairs = await asyncio.gather(
+                self.redis.hgetall(self._key("decimals")),
+                self.redis.hgetall(self._key("symbols")),
+                self.redis.hgetall(self._key("pairs")),
+            )
+        except Exception:
+            return
+        self._merge(decimals, symbols, {k: v.split(",") for k, v in pairs.items()})
+
+    async def _save_redis(self, decimals: Dict[str, int], symbols: Dict[str, str],
+                          pairs: Dict[str, Tuple[str, str]]) -> None:
+        if self.redis is None:
+            return
+        try:
+            if decimals:
+                await self.redis.hset(self._key("decimals"), mapping=decimals)
+            if symbols:
+                await self.redis.hset(self._key("symbols"), mapping=symbols)
+            if pairs:
+                await self.redis.hset(self._key("pairs"), mapping={k: f"{a},{b}" for k, (a, b) in pairs.items()})
+        except Exception:
+            pass  # the disk copy and memory still have it
+
+    async def load(self, redis=None) -> None:
+        """Warm the registry from disk and Redis; call once at startup."""
+        if redis is not None:
+            self.redis = redis
+        self._merge_disk(await asyncio.to_thread(self._read_disk))
+        await self._load_redis()
+
+    async def _persist(self, decimals: Dict[str, int], symbols: Dict[str, str],
+                       pairs: Dict[str, Tuple[str, str]]) -> None:
+        if decimals or symbols or pairs:
+            # Other bots write the same file: merge with what is there, then replace it atomically.
+            # File I/O runs in a thread; the merge stays on the loop so lookups never see a dict mid-update.
+            self._merge_disk(await asyncio.to_thread(self._read_disk))
+            data = {"decimals": dict(self.decimals), "symbols": dict(self.symbols),
+                    "pairs": {k: list(v) for k, v in self.pair_tokens.items()}}
+            await asyncio.to_thread(self._write_disk, data)
+            await self._save_redis(decimals, symbols, pairs)
+
+    # ---------- fill ----------
+
+    async def ensure_tokens(self, tokens: Iterable[str], block="latest") -> None:
+        """Make sure decimals and symbol are known for every token; misses cost one multicall."""
+        async with self._lock:
+            wanted = list(dict.fromkeys(_cs(t) for t in tokens))
+            todo = [t for t in wanted if t not in self.decimals or t not in self.symbols]
+            MET_META.labels("token", "cache").inc(len(wanted) - len(todo))
+            if not todo:
+                return
+            calls: List[Call] = []
+            for t in todo:
+                calls += [Call(t, _DECIMALS), Call(t, _SYMBOL)]
+            res = await aggregate3(self.rpc, calls, block)
+            decimals: Dict[str, int] = {}
+            symbols: Dict[str, str] = {}
+            for n, t in enumerate(todo):
+                dec = decode_result(["uint8"], res[2 * n])
+                if dec is not None and t not in self.decimals:
+                    decimals[t] = self.decimals[t] = int(dec[0])
+                sym = _symbol(res[2 * n + 1])
+                if sym is not None and t not in self.symbols:
+                    symbols[t] = self.symbols[t] = sym
+            MET_META.labels("token", "rpc").inc(len(todo))
+            await self._persist(decimals, symbols, {})
+
+    async def ensure_pairs(self, pairs: Iterable[str], block="latest") -> None:
+        """Make sure token0/token1 are known for every pair; misses cost one multicall."""
+        async with self._lock:
+            wanted = list(dict.fromkeys(_cs(p) for p in pairs))
+            todo = [p for p in wanted if p not in self.pair_tokens]
+            MET_META.labels("pair", "cache").inc(len(wanted) - len(todo))
+            if not todo:
+                return
+            calls: List[Call] = []
+            for p in todo:
+                calls += [Call(p, _TOKEN0), Call(p, _TOKEN1)]
+            res = await aggregate3(self.rpc, calls, block)
+            found: Dict[str, Tuple[str, str]] = {}
+            for n, p in enumerate(todo):
+                t0 = decode_result(["address"], res[2 * n])
+                t1 = decode_result(["address"], res[2 * n + 1])
+                if t0 and t1:
+                    found[p] = self.pair_tokens[p] = (_cs(t0[0]), _cs(t1[0]))
+            MET_META.labels("pair", "rpc").inc(len(todo))
+            await self._persist({}, {}, found)
+
+    # ---------- lookups ----------
+
+    def decimals_of(self, token: str, default: int = 18) -> int:
+        return self.decimals.get(token, default)
+
+    def symbol_of(self, token: str) -> str:
+        return self.symbols.get(token, token[:6])
@@ -0,0 +1,381 @@
+import os
+import bisect
+import logging
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from web3 import Web3
+
+from .multicall import Call, aggregate3_sync, decode_result, encode_call
+
+log = logging.getLogger("atom.v3_pool")
+
+UNISWAP_V3_FACTORY = os.getenv("UNISWAP_V3_FACTORY", "0x1F98431c8aD98523631AE4a59f267346ea31F984")
+# tickBitmap words loaded each side of the current tick; a swap that runs past them is not quoted locally
+TICK_WORDS = int(os.getenv("V3_TICK_WORDS", "4"))
+# Further behind than this and pools are re-read instead of replaying their logs
+MAX_LOG_SPAN = int(os.getenv("V3_MAX_LOG_SPAN", "50"))
+# Full re-read every N blocks, which also re-centres the loaded tick range (0 = never)
+RESYNC_BLOCKS = int(os.getenv("V3_RESYNC_BLOCKS", "1800"))
+
+# ---------- swap math (integer port of TickMath / SqrtPriceMath / SwapMath) ----------
+
+Q96 = 1 << 96
+MIN_TICK = -887272
+MAX_TICK = 887272
+MIN_SQRT_RATIO = 4295128739
+MAX_SQRT_RATIO = 1461446703485210103287273052203988822378723970342
+_U256_MAX = (1 << 256) - 1
+_U160_MAX = (1 << 160) - 1
+_FEE_DEN = 1_000_000
+
+_TICK_FACTORS = (
+    (0x2, 0xfff97272373d413259a46990580e213a),
+    (0x4, 0xfff2e50f5f656932ef12357cf3c7fdcc),
+    (0x8, 0xffe5caca7e10e4e61c3624eaa0941cd0),
+    (0x10, 0xffcb9843d60f6159c9db58835c926644),
+    (0x20, 0xff973b41fa98c081472e6896dfb254c0),
+    (0x40, 0xff2ea16466c96a3843ec78b326b52861),
+    (0x80, 0xfe5dee046a99a2a811c461f1969c3053),
+    (0x100, 0xfcbe86c7900a88aedcffc83b479aa3a4),
+    (0x200, 0xf987a7253ac413176f2b074cf7815e54),
+    (0x400, 0xf3392b0822b70005940c7a398e4b70f3),
+    (0x800, 0xe7159475a2c29b7443b29c7fa6e889d9),
+    (0x1000, 0xd097f3bdfd2022b8845ad8f792aa5825),
+    (0x2000, 0xa9f746462d870fdf8a65dc1f90e061e5),
+    (0x4000, 0x70d869a156d2a1b890bb3df62baf32f7),
+    (0x8000, 0x31be135f97d08fd981231505542fcfa6),
+    (0x10000, 0x9aa508b5b7a84e1c677de54f3e99bc9),
+    (0x20000, 0x5d6af8dedb81196699c329225ee604),
+    (0x40000, 0x2216e584f5fa1ea926041bedfe98),
+    (0x80000, 0x48a170391f7dc42444e8fa2),
+)
+
+def sqrt_ratio_at_tick(tick: int) -> int:
+    a = abs(tick)
+    if a > MAX_TICK:
+        raise ValueError(f"tick out of range: {tick}")
+    ratio = 0xfffcb933bd6fad37aa2d162d1a594001 if a & 0x1 else 1 << 128
+    for bit, factor in _TICK_FACTORS:
+        if a & bit:
+            ratio = (ratio * factor) >> 128
+    if tick > 0:
+        ratio = _U256_MAX // ratio
+    return (ratio >> 32) + (1 if ratio & 0xffffffff else 0)
+
+def _mul_div_up(a: int, b: int, d: int) -> int:
+    return -(-(a * b) // d)
+
+def _amount0_delta(a: int, b: int, liquidity: int, round_up: bool) -> int:
+    if a > b:
+        a, b = b, a
+    n1, n2 = liquidity << 96, b - a
+    if round_up:
+        return -(-_mul_div_up(n1, n2, b) // a)
+    return n1 * n2 // b // a
+
+def _amount1_delta(a: int, b: int, liquidity: int, round_up: bool) -> int:
+    if a > b:
+        a, b = b, a
+    return _mul_div_up(liquidity, b - a, Q96) if round_up else liquidity * (b - a) // Q96
+
+def _next_sqrt_from_input(sqrt_p: int, liquidity: int, amount_in: int, zero_for_one: bool) -> int:
+    if zero_for_one:
+        if amount_in == 0:
+            return sqrt_p
+        n1 = liquidity << 96
+        product = amount_in * sqrt_p
+        # the contract takes the cheaper form unless it would overflow 256 bits; rounding differs, so follow it
+        if product <= _U256_MAX and n1 + product <= _U256_MAX:
+            return _mul_div_up(n1, sqrt_p, n1 + product)
+        return -(-n1 // (n1 // sqrt_p + amount_in))
+    q = (amount_in << 96) // liquidity if amount_in <= _U160_MAX else amount_in * Q96 // liquidity
+    return sqrt_p + q
+
+def swap_step(sqrt_p: int, sqrt_target: int, liquidity: int, remaining: int,
+              fee: int) -> Tuple[int, int, int, int]:
+    """SwapMath.computeSwapStep for exact input: (next sqrt price, amount in, amount out, fee)."""
+    zero_for_one = sqrt_p >= sqrt_target
+    less_fee = remaining * (_FEE_DEN - fee) // _FEE_DEN
+    if zero_for_one:
+        amount_in = _amount0_delta(sqrt_target, sqrt_p, liquidity, True)
+    else:
+        amount_in = _amount1_delta(sqrt_p, sqrt_target, liquidity, True)
+    if less_fee >= amount_in:
+        sqrt_next = sqrt_target
+    else:
+        sqrt_next = _next_sqrt_from_input(sqrt_p, liquidity, less_fee, zero_for_one)
+    reached = sqrt_next == sqrt_target
+    if zero_for_one:
+        if not reached:
+            amount_in = _amount0_delta(sqrt_next, sqrt_p, liquidity, True)
+        amount_out = _amount1_delta(sqrt_next, sqrt_p, liquidity, False)
+    else:
+        if not reached:
+            amount_in = _amount1_delta(sqrt_p, sqrt_next, liquidity, True)
+        amount_out = _amount0_delta(sqrt_p, sqrt_next, liquidity, False)
+    fee_amount = _mul_div_up(amount_in, fee, _FEE_DEN - fee) if reached else remaining - amount_in
+    return sqrt_next, amount_in, amount_out, fee_amount
+
+# ---------- pool mirror ----------
+
+SWAP = "0x" + Web3.keccak(text="Swap(address,address,int256,int256,uint160,uint128,int24)").hex().removeprefix("0x")
+MINT = "0x" + Web3.keccak(text="Mint(address,address,int24,int24,uint128,uint256,uint256)").hex().removeprefix("0x")
+BURN = "0x" + Web3.keccak(text="Burn(address,int24,int24,uint128,uint256,uint256)").hex().removeprefix("0x")
+
+_SLOT0 = encode_call("slot0()")
+_LIQUIDITY = encode_call("liquidity()")
+_TICK_SPACING = encode_call("tickSpacing()")
+_FEE = encode_call("fee()")
+_TOKEN0 = encode_call("token0()")
+_TOKEN1 = encode_call("token1()")
+
+def _cs(addr: str) -> str:
+    return Web3.to_checksum_address(addr)
+
+def _raw(v) -> bytes:
+    if isinstance(v, (bytes, bytearray)):
+        return bytes(v)
+    return bytes.fromhex(v[2:] if v.startswith("0x") else v)
+
+def _int(v) -> int:
+    return int(v, 16) if isinstance(v, str) else int(v)
+
+def _word(data: bytes, i: int, signed: bool = False) -> int:
+    return int.from_bytes(data[32 * i:32 * i + 32], "big", signed=signed)
+
+class V3Pool:
+    """
+    Local copy of one Uniswap V3 pool: price, in-range liquidity and the
+    initialized ticks of the loaded bitmap words. quote() runs the pool's own swap
+    loop, so a ladder of sizes costs no RPC and matches quoteExactInputSingle to
+    the wei while the swap stays inside the loaded ticks.
+    """
+
+    def __init__(self, address: str, token0: str, token1: str, fee: int, tick_spacing: int):
+        self.address = address
+        self.token0 = token0
+        self.token1 = token1
+        self.fee = fee
+        self.tick_spacing = tick_spacing
+        self.sqrt_price = 0
+        self.tick = 0
+        self.liquidity = 0
+        self.gross: Dict[int, int] = {}  # tick -> liquidityGross
+        self.net: Dict[int, int] = {}    # tick -> liquidityNet
+        self._initialized: List[int] = []  # sorted compressed ticks with gross > 0
+        self.words = (0, -1)              # bitmap words loaded, inclusive
+
+    def set_ticks(self, ticks: Dict[int, Tuple[int, int]], words: Tuple[int, int]) -> None:
+        self.gross = {t: g for t, (g, _) in ticks.items()}
+        self.net = {t: n for t, (_, n) in ticks.items()}
+        self._initialized = sorted(t // self.tick_spacing for t, g in self.gross.items() if g)
+        self.words = words
+
+    def _modify(self, lower: int, upper: int, delta: int) -> None:
+        """Position liquidity change (Mint > 0, Burn < 0), as Pool._updatePosition applies it to ticks."""
+        for t, net in ((lower, delta), (upper, -delta)):
+            before = self.gross.get(t, 0)
+            after = before + delta
+            self.gross[t] = after
+            self.net[t] = self.net.get(t, 0) + net
+            c = t // self.tick_spacing
+            if before == 0 and after > 0:
+                bisect.insort(self._initialized, c)
+            elif before > 0 and after <= 0:
+                i = bisect.bisect_left(self._initialized, c)
+                if i < len(self._initialized) and self._initialized[i] == c:
+                    del self._initialized[i]
+                self.gross.pop(t, None)
+                self.net.pop(t, None)
+        if lower <= self.tick < upper:
+            self.liquidity += delta
+
+    def apply_log(self, topics: Sequence[bytes], data: bytes) -> None:
+        sig = "0x" + topics[0].hex()
+        if sig == SWAP:
+            self.sqrt_price = _word(data, 2)
+            self.liquidity = _word(data, 3)
+            self.tick = _word(data, 4, signed=True)
+        elif sig in (MINT, BURN) and len(topics) >= 4:
+            lower = int.from_bytes(topics[2], "big", signed=True)
+            upper = int.from_bytes(topics[3], "big", signed=True)
+            amount = _word(data, 1 if sig == MINT else 0)
+            if amount:
+                self._modify(lower, upper, amount if sig == MINT else -amount)
+
+    def _next_tick(self, tick: int, lte: bool) -> Optional[Tuple[int, bool]]:
+        """TickBitmap.nextInitializedTickWithinOneWord; None outside the loaded words."""
+        compressed = tick // self.tick_spacing
+        if not lte:
+            compressed += 1
+        word = compressed >> 8
+        if not self.words[0] <= word <= self.words[1]:
+            return None
+        if lte:
+            i = bisect.bisect_right(self._initialized, compressed) - 1
+            if i >= 0 and self._initialized[i] >= word << 8:
+                return self._initialized[i] * self.tick_spacing, True
+            return (word << 8) * self.tick_spacing, False
+        i = bisect.bisect_left(self._initialized, compressed)
+        if i < len(self._initialized) and self._initialized[i] <= (word << 8) + 255:
+            return self._initialized[i] * self.tick_spacing, True
+        return ((word << 8) + 255) * self.tick_spacing, False
+
+    def quote(self, zero_for_one: bool, amount_in: int) -> Optional[int]:
+        """Exact-input output with no price limit; None if the swap leaves the loaded ticks."""
+        if amount_in <= 0 or not self.sqrt_price:
+            return None
+        limit = MIN_SQRT_RATIO + 1 if zero_for_one else MAX_SQRT_RATIO - 1
+        sqrt_p, tick, liquidity = self.sqrt_price, self.tick, self.liquidity
+        remaining, out = amount_in, 0
+        while remaining > 0 and sqrt_p != limit:
+            nxt = self._next_tick(tick, zero_for_one)
+            if nxt is None:
+                return None
+            t_next, initialized = nxt
+            t_next = min(max(t_next, MIN_TICK), MAX_TICK)
+            sqrt_next = sqrt_ratio_at_tick(t_next)
+            target = max(sqrt_next, limit) if zero_for_one else min(sqrt_next, limit)
+            sqrt_p, step_in, step_out, fee_amount = swap_step(sqrt_p, target, liquidity, remaining, self.fee)
+            remaining -= step_in + fee_amount
+            out += step_out
+            if sqrt_p != sqrt_next:
+                break  # input used up inside this range
+            if initialized:
+                liquidity += -self.net.get(t_next, 0) if zero_for_one else self.net.get(t_next, 0)
+            tick = t_next - 1 if zero_for_one else t_next
+        return out
+
+class V3Pools:
+    """
+    Mirrors of the V3 pools a bot quotes through, for synchronous web3 callers.
+    Pools are read in a few multicalls when first quoted and re-read every
+    RESYNC_BLOCKS; in between, update() replays their Swap/Mint/Burn logs with a
+    single eth_getLogs, so quoting any number of sizes costs nothing per quote.
+    """
+
+    def __init__(self, w3: Web3, factory: str = UNISWAP_V3_FACTORY, words: int = TICK_WORDS):
+        self.w3 = w3
+        self.factory = _cs(factory)
+        self.words = words
+        self.pools: Dict[str, V3Pool] = {}
+        self.by_key: Dict[Tuple[str, str, int], Optional[str]] = {}  # (token0, token1, fee) -> pool
+        self.block = 0
+        self._resynced = 0
+
+    @staticmethod
+    def _key(a: str, b: str, fee: int) -> Tuple[str, str, int]:
+        a, b = _cs(a), _cs(b)
+        return (a, b, fee) if int(a, 16) < int(b, 16) else (b, a, fee)
+
+    def _resolve(self, keys: List[Tuple[str, str, int]], block) -> None:
+        calls = [Call(self.factory, encode_call("getPool(address,address,uint24)", ["address", "address", "uint24"],
+                                                list(k))) for k in keys]
+        for k, r in zip(keys, aggregate3_sync(self.w3, calls, block)):
+            dec = decode_result(["address"], r)
+            pool = _cs(dec[0]) if dec and int(dec[0], 16) else None
+            self.by_key[k] = pool
+
+    def _load(self, addresses: List[str], block) -> None:
+        """Read price, liquidity and the initialized ticks near the price of each pool at `block`."""
+        if not addresses:
+            return
+        calls: List[Call] = []
+        for a in addresses:
+            calls += [Call(a, _SLOT0), Call(a, _LIQUIDITY), Call(a, _TICK_SPACING), Call(a, _FEE),
+                      Call(a, _TOKEN0), Call(a, _TOKEN1)]
+        res = aggregate3_sync(self.w3, calls, block)
+        loaded: List[Tuple[V3Pool, Tuple[int, int]]] = []
+        for n, a in enumerate(addresses):
+            r = res[6 * n:6 * n + 6]
+            slot0 = decode_result(["uint160", "int24", "uint16", "uint16", "uint16", "uint8", "bool"], r[0])
+            liq, spacing, fee = (decode_result([t], x) for t, x in zip(("uint128", "int24", "uint24"), r[1:4]))
+            t0, t1 = decode_result(["address"], r[4]), decode_result(["address"], r[5])
+            if not (slot0 and liq and spacing and fee and t0 and t1):
+                continue
+            pool = V3Pool(a, _cs(t0[0]), _cs(t1[0]), int(fee[0]), int(spacing[0]))
+            pool.sqrt_price, pool.tick, pool.liquidity = int(slot0[0]), int(slot0[1]), int(liq[0])
+            centre = (pool.tick // pool.tick_spacing) >> 8
+            loaded.append((pool, (max(centre - self.words, -(1 << 15)), min(centre + self.words, (1 << 15) - 1))))
+        # initialized ticks from the bitmap words, then their liquidity
+        calls = [Call(p.address, encode_call("tickBitmap(int16)", ["int16"], [w]))
+                 for p, (lo, hi) in loaded for w in range(lo, hi + 1)]
+        res = iter(aggregate3_sync(self.w3, calls, block))
+        ticks: List[List[int]] = []
+        for p, (lo, hi) in loaded:
+            found = []
+            for w in range(lo, hi + 1):
+                bits = decode_result(["uint256"], next(res))
+                bits = int(bits[0]) if bits else 0
+                while bits:
+                    low = bits & -bits
+                    found.append(((w << 8) + low.bit_length() - 1) * p.tick_spacing)
+                    bits ^= low
+            ticks.append(found)
+        calls = [Call(p.address, encode_call("ticks(int24)", ["int24"], [t])) for (p, _), ts in zip(loaded, ticks) for t in ts]
+        res = iter(aggregate3_sync(self.w3, calls, block))
+        for (p, words), ts in zip(loaded, ticks):
+            state: Dict[int, Tuple[int, int]] = {}
+            for t in ts:
+                dec = decode_result(["uint128", "int128"], next(res))
+                if dec is not None and dec[0]:
+                    state[t] = (int(dec[0]), int(dec[1]))
+            p.set_ticks(state, words)
+            self.pools[p.address] = p
+
+    def _resync(self, head: int) -> None:
+        # forget missing pools too, they may have been created since
+        keys = list(self.by_key)
+        self.by_key.clear()
+        self.pools.clear()
+        self.block = self._resynced = head
+        self._resolve(keys, head)
+        self._load([p for p in self.by_key.values() if p], head)
+
+    def ensure(self, pairs: Iterable[Tuple[str, str, int]]) -> None:
+        """Load the pools for (tokenA, tokenB, fee) not seen yet, at the block the others are at."""
+        keys = [k for k in dict.fromkeys(self._key(*p) for p in pairs) if k not in self.by_key]
+        if not keys:
+            return
+        if not self.block:
+            self.block = self._resynced = self.w3.eth.block_number
+        self._resolve(keys, self.block)
+        self._load([self.by_key[k] for k in keys if self.by_key[k]], self.block)
+
+    def update(self) -> None:
+        """Bring every loaded pool to the chain head."""
+        if not self.by_key:
+            return
+        head = self.w3.eth.block_number
+        if head <= self.block:
+            return
+        if head - self.block > MAX_LOG_SPAN or (RESYNC_BLOCKS > 0 and head - self._resynced >= RESYNC_BLOCKS):
+            self._resync(head)
+            return
+        if self.pools:
+            logs = self.w3.eth.get_logs({"address": list(self.pools), "topics": [[SWAP, MINT, BURN]],
+                                         "fromBlock": self.block + 1, "toBlock": head})
+            for lg in sorted(logs, key=lambda x: (_int(x["blockNumber"]), _int(x["logIndex"]))):
+                pool = self.pools.get(_cs(lg["address"]))
+                if pool is not None and not lg.get("removed") and lg.get("topics"):
+                    pool.apply_log([_raw(t) for t in lg["topics"]], _raw(lg["data"]))
+        self.block = head
+
+    def pool_of(self, token_a: str, token_b: str, fee: int) -> Optional[V3Pool]:
+        self.ensure([(token_a, token_b, fee)])
+        addr = self.by_key.get(self._key(token_a, token_b, fee))
+        return self.pools.get(addr) if addr else None
+
+    def quote(self, token_in: str, token_out: str, fee: int, amount_in: int) -> Optional[int]:
+        """Local quoteExactInputSingle; None if there is no pool or the swap leaves its loaded ticks."""
+        pool = self.pool_of(token_in, token_out, fee)
+        if pool is None:
+            return None
+        return pool.quote(_cs(token_in) == pool.token0, amount_in)
+
+    def quote_many(self, token_in: str, token_out: str, fee: int, amounts: Sequence[int]) -> List[Optional[int]]:
+        pool = self.pool_of(token_in, token_out, fee)
+        if pool is None:
+            return [None] * len(amounts)
+        zero_for_one = _cs(token_in) == pool.token0
+        return [pool.quote(zero_for_one, a) for a in amounts]
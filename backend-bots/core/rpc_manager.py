@@ -1,11 +1,17 @@
+import os
+import asyncio
 import logging
 import threading
 import time
+from dataclasses import dataclass
 from typing import Dict, List, Optional
 
+import aiohttp
 from web3 import Web3
 from prometheus_client import Gauge, Counter
 from config.secure_config import SecureConfig
+from backend_bots.atom_core.ratelimit import EXECUTION, SCANNING, limiter_for, rate_limit_middleware
+from backend_bots.atom_core.rpc_metrics import metrics_middleware
 
 # ------------------------------------------------------------------------------
 # Logging
@@ -19,6 +25,32 @@ logger.setLevel(logging.INFO)
 rpc_latency_gauge = Gauge("rpc_latency_ms", "RPC latency in ms", ["chain", "provider"])
 rpc_failovers_total = Counter("rpc_failovers_total", "RPC failovers", ["chain"])
 rpc_current_provider = Gauge("rpc_current_provider", "Active RPC provider (index)", ["chain"])
+rpc_provider_healthy = Gauge("rpc_provider_healthy", "1 if the provider passed its last probes", ["chain", "provider"])
+
+# ------------------------------------------------------------------------------
+# Health monitor tuning
+# ------------------------------------------------------------------------------
+PROBE_INTERVAL = float(os.getenv("RPC_PROBE_INTERVAL", "2"))
+PROBE_TIMEOUT = float(os.getenv("RPC_PROBE_TIMEOUT", "3"))
+# Consecutive failed probes before an endpoint is taken out of rotation
+PROBE_FAIL_MAX = int(os.getenv("RPC_PROBE_FAIL_MAX", "2"))
+# An endpoint this many blocks behind the best one for its chain counts as unhealthy
+MAX_BLOCK_LAG = int(os.getenv("RPC_MAX_BLOCK_LAG", "5"))
+# Every N probe rounds, touch each standby through its own Web3 so its HTTP session stays open
+WARM_EVERY = int(os.getenv("RPC_WARM_EVERY", "5"))
+
+@dataclass
+class EndpointState:
+    url: str
+    w3: Web3
+    latency_ms: Optional[float] = None
+    block: Optional[int] = None
+    failures: int = 0
+    lagging: bool = False
+
+    @property
+    def healthy(self) -> bool:
+        return self.failures < PROBE_FAIL_MAX and not self.lagging
 
 # ------------------------------------------------------------------------------
 # RPC Manager
@@ -39,51 +71,68 @@ class RPCManager:
             "arbitrum": [self.config.require("ARBITRUM_RPC_URL")],
         }
 
+        # Warm standby per endpoint: failover only swaps which one is current
+        self.endpoints: Dict[str, List[EndpointState]] = {
+            c: [EndpointState(u, self._make_web3(c, u)) for u in urls] for c, urls in self.rpc_endpoints.items()
+        }
+
         # Track current provider index per chain
         self.current_provider_idx: Dict[str, int] = {c: 0 for c in self.rpc_endpoints.keys()}
 
-        # Web3 instances per chain
-        self.web3_instances: Dict[str, Optional[Web3]] = {
-            c: self._make_web3(c, self.rpc_endpoints[c][0]) for c in self.rpc_endpoints.keys()
-        }
+        # Web3 instances per chain (always one of the standbys above)
+        self.web3_instances: Dict[str, Optional[Web3]] = {c: eps[0].w3 for c, eps in self.endpoints.items()}
 
         # Thread safety fix - don't start here
         self._monitor_thread = None
+        self._monitor_task: Optional[asyncio.Task] = None
+        self._lock = threading.Lock()
 
     def start_background(self):
-        """Start background monitoring thread (thread-safe)"""
-        if self._monitor_thread and self._monitor_thread.is_alive():
-            return
-        self._monitor_thread = threading.Thread(target=self._health_loop, daemon=True)
-        self._monitor_thread.start()
+        """
+        Start the health monitor: as a task on the running event loop if there is
+        one, otherwise on a daemon thread with its own loop. get_web3 calls this on
+        first use, so constructing the manager is enough; calling it early only
+        starts the probes before the first request.
+        """
+        with self._lock:
+            if self._monitor_running():
+                return
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                loop = None
+            if loop is not None:
+                self._monitor_task = loop.create_task(self.monitor())
+            else:
+                self._monitor_thread = threading.Thread(target=lambda: asyncio.run(self.monitor()), daemon=True)
+                self._monitor_thread.start()
 
-    def _make_web3(self, chain: str, url: str) -> Optional[Web3]:
-        try:
-            w3 = Web3(Web3.HTTPProvider(url, request_kwargs={"timeout": 10}))
-            if not w3.is_connected():
-                raise Exception("Not connected")
-            logger.info(f"✅ Connected to {chain} RPC: {url}")
-            return w3
-        except Exception as e:
-            logger.error(f"❌ Failed to connect to {chain} RPC {url}: {e}")
-            return None
+    def _monitor_running(self) -> bool:
+        task, thread = self._monitor_task, self._monitor_thread
+        return bool((task and not task.done()) or (thread and thread.is_alive()))
+
+    def _make_web3(self, chain: str, url: str) -> Web3:
+        # No connectivity check here: the monitor decides health, construction stays off the network
+        w3 = Web3(Web3.HTTPProvider(url, request_kwargs={"timeout": 10}))
+        # Executor traffic: sends and tx building at execution priority, receipt polls at confirmation
+        w3.middleware_onion.add(metrics_middleware, "rpc_metrics")
+        w3.middleware_onion.add(rate_limit_middleware(EXECUTION), "rate_limit")
+        return w3
 
     def get_web3(self, chain: str = "polygon") -> Web3:
         """
         Get current working Web3 instance for a chain.
         Fail-fast if none available.
         """
-        w3 = self.web3_instances.get(chain)
-        if w3 and w3.is_connected():
-            return w3
-        else:
-            logger.warning(f"⚠️ {chain} RPC unavailable, attempting failover...")
+        if not self._monitor_running():
+            self.start_background()
+        eps = self.endpoints[chain]
+        if not eps[self.current_provider_idx[chain]].healthy:
             self._failover(chain)
-            w3 = self.web3_instances.get(chain)
-            if not w3 or not w3.is_connected():
-                logger.critical(f"❌ No working RPC providers for {chain}")
-                raise RuntimeError(f"No working RPC providers for {chain}")
-            return w3
+        if not any(ep.healthy for ep in eps):
+            logger.critical(f"❌ No working RPC providers for {chain}")
+            raise RuntimeError(f"No working RPC providers for {chain}")
+        return self.web3_instances[chain]
 
     @property
     def web3(self) -> Web3:
@@ -91,37 +140,77 @@ class RPCManager:
         return self.get_web3("polygon")
 
     def _failover(self, chain: str):
-        endpoints = self.rpc_endpoints[chain]
-        self.current_provider_idx[chain] = (self.current_provider_idx[chain] + 1) % len(endpoints)
-        idx = self.current_provider_idx[chain]
-        new_url = endpoints[idx]
-
-        w3 = self._make_web3(chain, new_url)
-        if w3 and w3.is_connected():
-            self.web3_instances[chain] = w3
-            rpc_failovers_total.labels(chain=chain).inc()
-            rpc_current_provider.labels(chain=chain).set(idx)
-            logger.info(f"🔄 {chain} failover: switched to {new_url}")
-        else:
-            logger.error(f"❌ {chain} failover failed for {new_url}")
-
-    def _health_loop(self):
+        """Point the chain at its best healthy standby; no connection is built here."""
+        eps = self.endpoints[chain]
+        cur = self.current_provider_idx[chain]
+        candidates = [i for i, ep in enumerate(eps) if i != cur and ep.healthy]
+        if not candidates:
+            logger.error(f"❌ {chain} failover failed: no healthy standby")
+            return
+        idx = min(candidates, key=lambda i: eps[i].latency_ms if eps[i].latency_ms is not None else PROBE_TIMEOUT * 1000)
+        self.current_provider_idx[chain] = idx
+        self.web3_instances[chain] = eps[idx].w3
+        rpc_failovers_total.labels(chain=chain).inc()
+        rpc_current_provider.labels(chain=chain).set(idx)
+        logger.info(f"🔄 {chain} failover: switched to provider {idx}")
+
+    async def _probe(self, session: aiohttp.ClientSession, chain: str, idx: int):
+        ep = self.endpoints[chain][idx]
+        payload = {"jsonrpc": "2.0", "id": 1, "method": "eth_blockNumber", "params": []}
+        start = time.perf_counter()
+        try:
+            async with session.post(ep.url, json=payload, timeout=aiohttp.ClientTimeout(total=PROBE_TIMEOUT)) as resp:
+                resp.raise_for_status()
+                body = await resp.json(content_type=None)
+            ep.block = int(body["result"], 16)
+            ep.latency_ms = (time.perf_counter() - start) * 1000
+            ep.failures = 0
+            rpc_latency_gauge.labels(chain=chain, provider=idx).set(ep.latency_ms)
+        except Exception as e:
+            ep.failures += 1
+            logger.warning(f"⚠️ {chain} RPC provider {idx} unhealthy: {e!r}")
+
+    async def _warm(self, chain: str, idx: int):
+        ep = self.endpoints[chain][idx]
+        bucket = limiter_for(ep.url)
+        try:
+            # Straight to the provider, past the EXECUTION-class middleware: keeping a
+            # standby's session alive takes a token at the lowest class, never one a send needs
+            if bucket is not None:
+                await bucket.acquire(SCANNING)
+            await asyncio.wait_for(asyncio.to_thread(ep.w3.provider.make_request, "eth_blockNumber", []),
+                                   timeout=PROBE_TIMEOUT)
+        except Exception:
+            pass  # health comes from the probes; this only keeps the session alive
+
+    def _evaluate(self, chain: str):
+        eps = self.endpoints[chain]
+        best = max((ep.block for ep in eps if ep.block is not None and ep.failures == 0), default=None)
+        for i, ep in enumerate(eps):
+            ep.lagging = best is not None and ep.block is not None and best - ep.block > MAX_BLOCK_LAG
+            rpc_provider_healthy.labels(chain=chain, provider=i).set(1 if ep.healthy else 0)
+        if not eps[self.current_provider_idx[chain]].healthy:
+            self._failover(chain)
+
+    async def monitor(self):
         """
-        Periodically ping all RPC providers to measure latency and auto-failover.
-        Web3 blocking call mitigation with timeout.
+        Probe every endpoint of every chain concurrently, off the caller's path,
+        and fail over by swapping to an already-built standby.
         """
-        while True:
-            for chain, w3 in self.web3_instances.items():
-                if not w3:
-                    continue
-                try:
-                    # Web3 blocking call mitigation
-                    w3.provider._request_kwargs = {"timeout": 3}
-                    start = time.time()
-                    _ = w3.eth.block_number
-                    latency = (time.time() - start) * 1000
-                    rpc_latency_gauge.labels(chain=chain, provider=self.current_provider_idx[chain]).set(latency)
-                except Exception as e:
-                    logger.warning(f"⚠️ {chain} RPC unhealthy: {e}")
-                    self._failover(chain)
-            time.sleep(2)  # every 2s
\ No newline at end of file
+        rounds = 0
+        async with aiohttp.ClientSession() as session:
+            while True:
+                await asyncio.gather(*(
+                    self._probe(session, chain, i) for chain, eps in self.endpoints.items() for i in range(len(eps))
+                ))
+                for chain in self.endpoints:
+                    self._evaluate(chain)
+                rounds += 1
+                if WARM_EVERY > 0 and rounds % WARM_EVERY == 0:
+                    await asyncio.gather(*(
+                        self._warm(chain, i)
+                        for chain, eps in self.endpoints.items()
+                        for i, ep in enumerate(eps)
+                        if i != self.current_provider_idx[chain] and ep.healthy
+                    ))
+                await asyncio.sleep(PROBE_INTERVAL)
@@ -1,13 +1,17 @@
+import os
+import asyncio
 import logging
 import math
 import time
-from typing import Dict, Optional, List
+from typing import Dict, Optional, List, Tuple
 
 from web3 import Web3
 from prometheus_client import Gauge, Counter
 
 from config.secure_config import SecureConfig
-from backend-bots.rpc_manager import RPCManager
+from backend_bots.rpc_manager import RPCManager
+from backend_bots.atom_core.multicall import Call, aggregate3, aggregate3_sync, decode_result, encode_call
+from backend_bots.atom_core.rpc_pool import RPCPool
 
 # ------------------------------------------------------------------------------
 # Logging
@@ -97,6 +101,23 @@ _MAX_AGE_SECONDS = 60 * 60  # 1 hour max staleness
 _MIN_POSITIVE_PRICE = 0.0001  # basically > 0
 _MAX_REASONABLE_PRICE = 10_000_000  # USD sanity cap, we're not pricing planets
 
+# Local cache: within TTL a read is served from memory; up to STALE_SEC past that
+# the cached value is still returned while one background refresh re-reads the feeds
+_PRICE_TTL_SEC = float(os.getenv("CHAINLINK_PRICE_TTL_SEC", "15"))
+_PRICE_STALE_SEC = float(os.getenv("CHAINLINK_PRICE_STALE_SEC", "120"))
+
+_DECIMALS_CALL = encode_call("decimals()")
+_LATEST_ROUND_CALL = encode_call("latestRoundData()")
+_ROUND_TYPES = ["uint80", "int256", "uint256", "uint256", "uint80"]
+
+# Feed decimals never change, so they are read once per feed and kept
+_decimals: Dict[str, int] = {}
+# symbol -> (validated price or None, local fetch time)
+_cache: Dict[str, Tuple[Optional[float], float]] = {}
+_refresh_task: Optional[asyncio.Task] = None
+_pool: Optional[RPCPool] = None
+_pool_loop: Optional[asyncio.AbstractEventLoop] = None
+
 # ------------------------------------------------------------------------------
 # Helpers
 # ------------------------------------------------------------------------------
@@ -104,41 +125,65 @@ def _get_w3_polygon() -> Web3:
     # Use RPCManager so failover/latency logic applies
     return _rpc.get_web3("polygon")
 
-def _read_latest_price(w3: Web3, feed_address: str) -> Optional[Dict[str, float]]:
-    """
-    Read latest price from Chainlink aggregator.
-    Returns dict with price, decimals, updated_at.
-    """
-    try:
-        contract = w3.eth.contract(
-            address=Web3.to_checksum_address(feed_address),
-            abi=AGGREGATOR_V3_ABI
-        )
-        decimals = contract.functions.decimals().call()
-        round_id, answer, started_at, updated_at, answered_in_round = contract.functions.latestRoundData().call()
-        if answer is None:
-            return None
-        price = float(answer) / (10 ** decimals)
-        return {"price": price, "decimals": decimals, "updated_at": float(updated_at)}
-    except Exception as e:
-        logger.error(f"Chainlink read failed for {feed_address}: {e}")
-        return None
+def _feed_calls(symbols: List[str]) -> List[Call]:
+    """latestRoundData for every feed, preceded by decimals() for feeds not read before."""
+    calls: List[Call] = []
+    for sym in symbols:
+        feed = Web3.to_checksum_address(_FEED_ADDRS[sym])
+        if feed not in _decimals:
+            calls.append(Call(feed, _DECIMALS_CALL))
+        calls.append(Call(feed, _LATEST_ROUND_CALL))
+    return calls
+
+def _decode_feeds(symbols: List[str], results: List[Tuple[bool, bytes]]) -> Dict[str, Optional[Dict[str, float]]]:
+    """Walk aggregate3 results in _feed_calls() order; returns price, decimals, updated_at per symbol."""
+    out: Dict[str, Optional[Dict[str, float]]] = {}
+    it = iter(results)
+    for sym in symbols:
+        feed = Web3.to_checksum_address(_FEED_ADDRS[sym])
+        if feed not in _decimals:
+            dec = decode_result(["uint8"], next(it))
+            if dec is not None:
+                _decimals[feed] = int(dec[0])
+        rnd = decode_result(_ROUND_TYPES, next(it))
+        decimals = _decimals.get(feed)
+        if rnd is None or decimals is None:
+            logger.error(f"Chainlink read failed for {sym} ({feed})")
+            out[sym] = None
+            continue
+        _, answer, _, updated_at, _ = rnd
+        out[sym] = {"price": float(answer) / (10 ** decimals), "decimals": decimals, "updated_at": float(updated_at)}
+    return out
 
-def _retry_price(symbol: str, feed_address: str, attempts: int = 3, backoff_sec: float = 0.4) -> Optional[Dict[str, float]]:
+def _read_feeds_sync() -> Dict[str, Optional[Dict[str, float]]]:
     """
-    Retry wrapper with simple backoff, using RPC failover if needed.
+    All configured feeds in one multicall through RPCManager, so failover applies.
+    A failed call is retried once on whatever provider is current afterwards.
     """
-    for i in range(attempts):
+    symbols = list(_FEED_ADDRS)
+    for attempt in range(2):
         try:
-            w3 = _get_w3_polygon()
-            data = _read_latest_price(w3, feed_address)
-            if data:
-                return data
+            return _decode_feeds(symbols, aggregate3_sync(_get_w3_polygon(), _feed_calls(symbols)))
         except Exception as e:
-            logger.warning(f"[{symbol}] RPC/price read attempt {i+1}/{attempts} failed: {e}")
-        time.sleep(backoff_sec * (2 ** i))
-    chainlink_request_failures.labels(symbol=symbol).inc()
-    return None
+            logger.warning(f"Chainlink multicall attempt {attempt + 1}/2 failed: {e}")
+    return {s: None for s in symbols}
+
+def _get_pool() -> RPCPool:
+    # The pool's HTTP sessions belong to one event loop; rebuild if called from another
+    global _pool, _pool_loop
+    loop = asyncio.get_running_loop()
+    if _pool is None or _pool_loop is not loop:
+        _pool = RPCPool(_rpc.rpc_endpoints["polygon"])
+        _pool_loop = loop
+    return _pool
+
+async def _read_feeds() -> Dict[str, Optional[Dict[str, float]]]:
+    symbols = list(_FEED_ADDRS)
+    try:
+        return _decode_feeds(symbols, await aggregate3(_get_pool(), _feed_calls(symbols)))
+    except Exception as e:
+        logger.warning(f"Chainlink multicall failed: {e}")
+        return {s: None for s in symbols}
 
 def _is_fresh(updated_at: float) -> bool:
     return (time.time() - updated_at) <= _MAX_AGE_SECONDS
@@ -149,20 +194,10 @@ def _is_sane(price: float) -> bool:
 # ------------------------------------------------------------------------------
 # Public API
 # ------------------------------------------------------------------------------
-def get_token_price_usd(symbol: str) -> Optional[float]:
-    """
-    Return latest USD price for a token symbol using Chainlink feeds on Polygon.
-    Supported out of the box: ETH, MATIC, USDC, USDT, DAI (and GHO if env set).
-    """
-    sym = symbol.upper()
-    feed = _FEED_ADDRS.get(sym)
-    if not feed:
-        logger.warning(f"No Chainlink feed configured for symbol {sym}")
-        chainlink_feed_healthy.labels(symbol=sym).set(0)
-        return None
-
-    data = _retry_price(sym, feed)
+def _validate(sym: str, data: Optional[Dict[str, float]]) -> Optional[float]:
+    """Freshness/sanity checks and metrics for one feed read; None if unusable."""
     if not data:
+        chainlink_request_failures.labels(symbol=sym).inc()
         chainlink_feed_healthy.labels(symbol=sym).set(0)
         return None
 
@@ -185,18 +220,90 @@ def get_token_price_usd(symbol: str) -> Optional[float]:
     chainlink_price_usd.labels(symbol=sym).set(price)
     return price
 
+def _store(reads: Dict[str, Optional[Dict[str, float]]]) -> None:
+    now = time.monotonic()
+    for sym, data in reads.items():
+        price = _validate(sym, data)
+        # A failed read keeps the last good price until it ages out of the stale window
+        if price is not None or sym not in _cache or _cache[sym][0] is None:
+            _cache[sym] = (price, now)
+
+def _unknown(sym: str) -> None:
+    logger.warning(f"No Chainlink feed configured for symbol {sym}")
+    chainlink_feed_healthy.labels(symbol=sym).set(0)
+
+def _age(sym: str) -> float:
+    entry = _cache.get(sym)
+    return time.monotonic() - entry[1] if entry else math.inf
+
+def _cached(sym: str) -> Optional[float]:
+    """Last good price, or None once it is older than the TTL plus the stale window."""
+    entry = _cache.get(sym)
+    if entry is None or time.monotonic() - entry[1] > _PRICE_TTL_SEC + _PRICE_STALE_SEC:
+        return None
+    return entry[0]
+
+async def _refresh() -> None:
+    _store(await _read_feeds())
+
+async def refresh_prices() -> None:
+    """Re-read every configured feed in one multicall; concurrent callers share the read."""
+    global _refresh_task
+    if _refresh_task is None or _refresh_task.done():
+        _refresh_task = asyncio.ensure_future(_refresh())
+    await asyncio.shield(_refresh_task)
+
+def _refresh_in_background() -> None:
+    global _refresh_task
+    if _refresh_task is None or _refresh_task.done():
+        _refresh_task = asyncio.ensure_future(_refresh())
+        _refresh_task.add_done_callback(lambda t: t.cancelled() or t.exception())
+
+async def get_prices_usd_async(symbols: List[str]) -> Dict[str, Optional[float]]:
+    """
+    USD prices for `symbols` without blocking the event loop. Cached prices younger
+    than the TTL are returned as is; stale ones are returned immediately while a
+    background refresh runs; missing or expired ones wait for a fresh multicall,
+    and are None if that read fails too.
+    """
+    syms = [s.upper() for s in symbols]
+    known = [s for s in syms if s in _FEED_ADDRS]
+    for s in syms:
+        if s not in _FEED_ADDRS:
+            _unknown(s)
+    if known:
+        oldest = max(_age(s) for s in known)
+        if oldest > _PRICE_TTL_SEC + _PRICE_STALE_SEC:
+            await refresh_prices()
+        elif oldest > _PRICE_TTL_SEC:
+            _refresh_in_background()
+    return {s: _cached(s) for s in syms}
+
+async def get_token_price_usd_async(symbol: str) -> Optional[float]:
+    return (await get_prices_usd_async([symbol]))[symbol.upper()]
+
+def get_token_price_usd(symbol: str) -> Optional[float]:
+    """
+    Return latest USD price for a token symbol using Chainlink feeds on Polygon.
+    Supported out of the box: ETH, MATIC, USDC, USDT, DAI (and GHO if env set).
+    """
+    return get_prices_usd([symbol])[symbol.upper()]
+
 def get_prices_usd(symbols: List[str]) -> Dict[str, Optional[float]]:
     """
-    Batch read convenience wrapper.
+    Synchronous batch read: served from the cache within the TTL, otherwise all
+    configured feeds are re-read in one multicall. If the read fails the last good
+    price is kept until it ages out of the stale window, then None is returned.
+    Use get_prices_usd_async from event-loop code.
     """
-    results: Dict[str, Optional[float]] = {}
-    for s in symbols:
-        try:
-            results[s.upper()] = get_token_price_usd(s)
-        except Exception as e:
-            logger.error(f"Failed to get price for {s}: {e}")
-            results[s.upper()] = None
-    return results
+    syms = [s.upper() for s in symbols]
+    for s in syms:
+        if s not in _FEED_ADDRS:
+            _unknown(s)
+    known = [s for s in syms if s in _FEED_ADDRS]
+    if known and max(_age(s) for s in known) > _PRICE_TTL_SEC:
+        _store(_read_feeds_sync())
+    return {s: _cached(s) for s in syms}
 
 def usd_value_of(amount: float, symbol: str, decimals: int) -> Optional[float]:
     """
@@ -43,9 +43,12 @@ REDIS_URL = _env("REDIS_URL", required=True)
 KILL_SWITCH_KEY = _env("KILL_SWITCH_KEY", "atom:kill_switch")
 
 # Enable only these bots (comma separated); default runs them all
-DEFAULT_BOTS = "stablecoin,volatility,liquidation,triangular,cross_chain,mev,liquidity,stat_arb,nft"
+DEFAULT_BOTS = "reserves,stablecoin,volatility,liquidation,triangular,cross_chain,mev,liquidity,stat_arb,nft"
 ENABLED_BOTS = [b.strip() for b in _env("ORCH_ENABLED_BOTS", DEFAULT_BOTS).split(",") if b.strip()]
 
+# Shared reserve table: the "reserves" child writes it, the scanners read it instead of polling reserves themselves
+RESERVE_SHM_PATH = _env("RESERVE_SHM_PATH", "/dev/shm/atom_reserves_137")
+
 # Optional per-bot metrics URL overrides (http://host:port/metrics)
 # You can set ORCH_<BOT>_METRICS_URL to enable readiness probe for that bot.
 
@@ -114,6 +117,8 @@ class Orchestrator:
                 enabled=(name in ENABLED_BOTS)
             )
 
+        # first, so the table exists by the time the scanners attach
+        bots["reserves"]    = mk("reserves",    "bots/reserve_table.py")
         bots["stablecoin"]  = mk("stablecoin",  "bots/stablecoin_monitor.py")
         bots["volatility"]  = mk("volatility",  "bots/volatility_scanner.py")
         bots["liquidation"] = mk("liquidation", "bots/liquidation_bot.py")
@@ -124,6 +129,11 @@ class Orchestrator:
         bots["stat_arb"]    = mk("stat_arb",    "bots/statistical_arbitrage.py")
         bots["nft"]         = mk("nft",         "bots/nft_arbitrage.py")
 
+        # point every child at the table; without the writer they keep polling on their own
+        if bots["reserves"].enabled:
+            for s in bots.values():
+                s.env_overrides["RESERVE_SHM_PATH"] = RESERVE_SHM_PATH
+
         # mark disabled ones (not in ORCH_ENABLED_BOTS)
         for n, s in bots.items():
             MET_BOT_UP.labels(n).set(0)
@@ -15,14 +15,22 @@ import json
 import time
 import logging
 from dataclasses import dataclass, asdict
-from decimal import Decimal
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 
 import aiohttp
+import numpy as np
 import redis.asyncio as redis
 from prometheus_client import Counter, Gauge, Histogram, start_http_server
 from web3 import Web3, HTTPProvider
 
+from backend_bots.atom_core.fixed_point import (
+    chainlink_wad, from_wad, gas_cost_wad, parse_wad, percent_mul, to_wad,
+)
+from backend_bots.atom_core.multicall import Call, aggregate3, decode_result, encode_call
+from backend_bots.atom_core.ratelimit import SCANNING, rate_limit_middleware
+from backend_bots.atom_core.rpc_pool import RPCPool
+from backend_bots.atom_core.rpc_metrics import metrics_middleware, summary_loop as rpc_summary_loop
+
 # ---------------- Env ----------------
 
 def _env(name: str, default: Optional[str] = None, required: bool = False) -> str:
@@ -33,6 +41,7 @@ def _env(name: str, default: Optional[str] = None, required: bool = False) -> st
 
 # Core infra
 RPC_URL = _env("POLYGON_RPC_URL", required=True)
+RPC_URLS = [u for u in (RPC_URL, _env("POLYGON_RPC_BACKUP"), _env("POLYGON_RPC_BACKUP2")) if u]
 REDIS_URL = _env("REDIS_URL", required=True)
 
 # Aave v3 (Polygon) subgraph + pool
@@ -42,12 +51,12 @@ AAVE_V3_POOL_ADDR = Web3.to_checksum_address(_env("AAVE_V3_POOL_ADDR", "0x794a61
 # Optional Compound v3 subgraph (set to enable)
 COMPOUND_V3_SUBGRAPH_URL = _env("COMPOUND_V3_SUBGRAPH_URL", "")
 
-# Economics and thresholds
-MIN_NET_PROFIT_USD = Decimal(_env("LIQ_MIN_NET_PROFIT_USD", "100"))
+# Economics and thresholds (USD in WAD, see atom_core.fixed_point)
+MIN_NET_PROFIT_USD = parse_wad(_env("LIQ_MIN_NET_PROFIT_USD", "100"))
 AAVE_CLOSE_FACTOR_BPS = int(_env("AAVE_CLOSE_FACTOR_BPS", "5000"))           # 50%
 AAVE_LIQ_BONUS_BPS_DEFAULT = int(_env("AAVE_LIQ_BONUS_BPS_DEFAULT", "500"))  # 5% default if per-reserve bonus unavailable
-AAVE_FLASH_FEE_BPS = Decimal(_env("AAVE_FLASH_FEE_BPS", "9"))                # 0.09%
-LIQ_MAX_REPAY_USD = Decimal(_env("LIQ_MAX_REPAY_USD", "100000"))
+AAVE_FLASH_FEE_BPS = int(_env("AAVE_FLASH_FEE_BPS", "9"))                   # 0.09%
+LIQ_MAX_REPAY_USD = parse_wad(_env("LIQ_MAX_REPAY_USD", "100000"))
 GAS_LIMIT_ESTIMATE = int(_env("LIQ_GAS_LIMIT", "850000"))                    # liquidation+flash overhead
 
 # Candidate discovery
@@ -55,6 +64,13 @@ AAVE_HF_QUERY_LT = _env("AAVE_HF_QUERY_LT", "1.00")  # pull HF < this to reduce
 DISCOVERY_PAGE_SIZE = int(_env("LIQ_DISCOVERY_PAGE", "250"))
 DISCOVERY_INTERVAL_SEC = float(_env("LIQ_DISCOVERY_INTERVAL_SEC", "30"))
 SCAN_INTERVAL_SEC = float(_env("LIQ_SCAN_INTERVAL_SEC", "5.0"))
+MAX_CANDIDATES = int(_env("LIQ_MAX_CANDIDATES", "5000"))  # per confirmation pass
+# getUserAccountData calls per aggregate3; each one walks the user's reserves, so keep
+# chunks well under the node's eth_call gas cap. A failed chunk only loses its own users.
+CONFIRM_CHUNK = max(1, int(_env("LIQ_CONFIRM_CHUNK", "100")))
+# Confirm again as soon as a new block lands (bounded by LIQ_SCAN_INTERVAL_SEC) instead of on a fixed timer
+SCAN_EVERY_BLOCK = _env("LIQ_SCAN_EVERY_BLOCK", "false").lower() == "true"
+BLOCK_POLL_SEC = float(_env("LIQ_BLOCK_POLL_SEC", "0.5"))
 
 # Chainlink MATIC/USD on Polygon
 CHAINLINK_MATIC_USD = Web3.to_checksum_address(
@@ -87,6 +103,8 @@ MET_ERRORS       = Counter("atom_liq_errors_total", "Errors")
 MET_OPPS         = Counter("atom_liq_opportunities_total", "Opportunities published")
 MET_BEST_NET     = Gauge("atom_liq_best_net_profit_usd", "Best net profit last publish")
 MET_CANDIDATES   = Gauge("atom_liq_candidates", "Candidates per discovery")
+MET_CONFIRMED    = Gauge("atom_liq_confirmed_liquidatable", "Candidates with HF < 1 in last confirmation pass")
+MET_PASS_BLOCK   = Gauge("atom_liq_confirm_block", "Block the last confirmation pass read")
 
 # ---------------- Minimal ABIs ----------------
 
@@ -115,8 +133,12 @@ class LiqOpp:
 class LiquidationScanner:
     def __init__(self):
         self.w3 = Web3(HTTPProvider(RPC_URL, request_kwargs={"timeout": 10}))
+        self.w3.middleware_onion.add(metrics_middleware, "rpc_metrics")
+        self.w3.middleware_onion.add(rate_limit_middleware(SCANNING), "rate_limit")
+        self.rpc = RPCPool(RPC_URLS)
         self.redis: Optional[redis.Redis] = None
         self.session: Optional[aiohttp.ClientSession] = None
+        self.last_block = 0
 
         self.aave_pool = self.w3.eth.contract(AAVE_V3_POOL_ADDR, abi=AAVE_POOL_ABI)
         self.chainlink_matic = self.w3.eth.contract(CHAINLINK_MATIC_USD, abi=CL_AGG_ABI)
@@ -197,65 +219,104 @@ class LiquidationScanner:
             jlog("error", event="compound_discovery_error", err=str(e))
             return []
 
-    # -------- Chainlink price --------
-
-    async def matic_usd(self) -> Decimal:
-        try:
-            rd = await asyncio.to_thread(self.chainlink_matic.functions.latestRoundData().call)
-            return Decimal(rd[1]) / Decimal(10**8)
-        except Exception as e:
-            MET_ERRORS.inc()
-            jlog("error", event="chainlink_error", err=str(e))
-            return Decimal("0")
-
     # -------- On-chain confirm + economics --------
 
-    def _confirm_aave(self, user: str) -> Optional[LiqOpp]:
-        """Confirm liquidation on-chain and compute economics."""
-        try:
-            data = self.aave_pool.functions.getUserAccountData(Web3.to_checksum_address(user)).call()
-            total_debt_base = Decimal(data[1])          # base currency 1e8
-            health_factor = Decimal(data[5]) / Decimal(10**18)
-            if total_debt_base <= 0 or health_factor >= 1:
-                return None
-
-            # Convert base to USD (Aave v3 Polygon uses USD base 1e8)
-            total_debt_usd = total_debt_base / Decimal(10**8)
-
-            close_factor = Decimal(AAVE_CLOSE_FACTOR_BPS) / Decimal(10000)
-            repay_usd = min(total_debt_usd * close_factor, LIQ_MAX_REPAY_USD)
-
-            bonus_bps = Decimal(AAVE_LIQ_BONUS_BPS_DEFAULT)
-            bonus_usd = repay_usd * (bonus_bps / Decimal(10000))
-
-            # Costs
-            gas_price = self.w3.eth.gas_price
-            matic_price = asyncio.run(self.matic_usd())  # safe short call here
-            gas_cost_usd = (Decimal(gas_price) * Decimal(GAS_LIMIT_ESTIMATE) / Decimal(1e18)) * matic_price
-            flash_fee_usd = repay_usd * (AAVE_FLASH_FEE_BPS / Decimal(10000))
-
-            net = bonus_usd - gas_cost_usd - flash_fee_usd
-            if net < MIN_NET_PROFIT_USD:
-                return None
-
-            return LiqOpp(
+    async def confirm_aave_bulk(self, users: List[str]) -> List[LiqOpp]:
+        """
+        Confirm every candidate at one block: Chainlink MATIC/USD and each user's
+        getUserAccountData go through Multicall3 reads pinned to the head, in
+        chunks of LIQ_CONFIRM_CHUNK; gas price is fetched once alongside, and the
+        economics run as one vectorized pass. A chunk that errors is logged and
+        its users skipped for this pass.
+        """
+        if not users:
+            return []
+        users = [Web3.to_checksum_address(u) for u in users]
+        calls = [Call(AAVE_V3_POOL_ADDR, encode_call("getUserAccountData(address)", ["address"], [u])) for u in users]
+        chunks = [[Call(CHAINLINK_MATIC_USD, encode_call("latestRoundData()"))]]
+        chunks += [calls[i:i + CONFIRM_CHUNK] for i in range(0, len(calls), CONFIRM_CHUNK)]
+        block, gas_price = await asyncio.gather(self.rpc.block_number(), self.rpc.gas_price())
+        parts = await asyncio.gather(*(aggregate3(self.rpc, c, block, CONFIRM_CHUNK) for c in chunks),
+                                     return_exceptions=True)
+        res: List[Tuple[bool, bytes]] = []
+        for i, (chunk, part) in enumerate(zip(chunks, parts)):
+            if isinstance(part, BaseException):
+                jlog("error", event="aave_confirm_chunk_error", chunk=i, calls=len(chunk), block=block, err=str(part))
+                part = [(False, b"")] * len(chunk)
+            res.extend(part)
+        self.last_block = block
+        MET_PASS_BLOCK.set(block)
+
+        rd = decode_result(["uint80", "int256", "uint256", "uint256", "uint80"], res[0])
+        if rd is None:
+            MET_ERRORS.inc()
+            jlog("error", event="chainlink_error", block=block)
+        gas_cost_usd = gas_cost_wad(gas_price, GAS_LIMIT_ESTIMATE, chainlink_wad(rd[1]) if rd else 0)
+
+        # getUserAccountData: six uint256 words; debt is word 1 (base currency 1e8), HF word 5 (1e18)
+        n = len(users)
+        debt_raw = [0] * n
+        debt_base = np.zeros(n)
+        hf = np.full(n, np.inf)
+        failed = 0
+        for i, (ok, ret) in enumerate(res[1:]):
+            if not ok or len(ret) < 192:
+                failed += 1
+                continue
+            debt_raw[i] = int.from_bytes(ret[32:64], "big")
+            debt_base[i] = float(debt_raw[i])
+            hf[i] = float(int.from_bytes(ret[160:192], "big")) / 1e18
+        if failed:
+            MET_ERRORS.inc(failed)
+            jlog("error", event="aave_confirm_error", failed=failed, block=block)
+
+        # Convert base to USD (Aave v3 Polygon uses USD base 1e8)
+        total_debt_usd = debt_base / 1e8
+        liquidatable = (debt_base > 0) & (hf < 1.0)
+        MET_CONFIRMED.set(int(liquidatable.sum()))
+
+        # float screen over everyone, a hair under the floor so rounding cannot drop a hit;
+        # the few that pass are re-costed exactly below
+        close_factor = AAVE_CLOSE_FACTOR_BPS / 10000
+        repay_usd = np.minimum(total_debt_usd * close_factor, from_wad(LIQ_MAX_REPAY_USD))
+        bonus_bps = AAVE_LIQ_BONUS_BPS_DEFAULT
+        net = repay_usd * ((bonus_bps - AAVE_FLASH_FEE_BPS) / 10000) - from_wad(gas_cost_usd)
+        hits = np.nonzero(liquidatable & (net >= from_wad(MIN_NET_PROFIT_USD) * 0.999))[0]
+
+        ts = int(time.time())
+        opps: List[LiqOpp] = []
+        for i in hits.tolist():
+            # PercentageMath as the Pool applies it: close factor, bonus and premium round half up
+            repay = min(to_wad(percent_mul(debt_raw[i], AAVE_CLOSE_FACTOR_BPS), 8), LIQ_MAX_REPAY_USD)
+            bonus = percent_mul(repay, bonus_bps)
+            flash = percent_mul(repay, AAVE_FLASH_FEE_BPS)
+            net_i = bonus - gas_cost_usd - flash
+            if net_i < MIN_NET_PROFIT_USD:
+                continue
+            opps.append(LiqOpp(
                 protocol="aave_v3",
-                user=Web3.to_checksum_address(user),
-                health_factor=float(health_factor),
-                total_debt_usd=float(total_debt_usd),
+                user=users[i],
+                health_factor=float(hf[i]),
+                total_debt_usd=from_wad(to_wad(debt_raw[i], 8)),
                 close_factor_bps=int(AAVE_CLOSE_FACTOR_BPS),
                 liquidation_bonus_bps=int(bonus_bps),
-                repay_usd=float(repay_usd),
-                bonus_usd=float(bonus_usd),
-                flash_fee_usd=float(flash_fee_usd),
-                gas_cost_usd=float(gas_cost_usd),
-                net_profit_usd=float(net),
-                ts=int(time.time())
-            )
-        except Exception as e:
-            MET_ERRORS.inc()
-            jlog("error", event="aave_confirm_error", user=user, err=str(e))
-            return None
+                repay_usd=from_wad(repay),
+                bonus_usd=from_wad(bonus),
+                flash_fee_usd=from_wad(flash),
+                gas_cost_usd=from_wad(gas_cost_usd),
+                net_profit_usd=from_wad(net_i),
+                ts=ts,
+            ))
+        return opps
+
+    async def _wait_next_block(self, deadline: float):
+        while time.perf_counter() < deadline:
+            try:
+                if await self.rpc.block_number() > self.last_block:
+                    return
+            except Exception:
+                pass
+            await asyncio.sleep(BLOCK_POLL_SEC)
 
     # -------- Publish --------
 
@@ -294,7 +355,8 @@ class LiquidationScanner:
         await self.init()
         jlog("info", event="liquidation_scanner_started",
              aave_subgraph=AAVE_V3_SUBGRAPH_URL, compound_subgraph=bool(COMPOUND_V3_SUBGRAPH_URL),
-             min_net=float(MIN_NET_PROFIT_USD))
+             min_net=from_wad(MIN_NET_PROFIT_USD))
+        asyncio.create_task(rpc_summary_loop(jlog))
 
         # periodic discovery
         async def periodic_discovery():
@@ -320,11 +382,7 @@ class LiquidationScanner:
                     continue
 
                 # confirm on-chain for current candidates
-                opps: List[LiqOpp] = []
-                for user in self.candidates[:1000]:  # sanity cap
-                    o = await asyncio.to_thread(self._confirm_aave, user)
-                    if o:
-                        opps.append(o)
+                opps = await self.confirm_aave_bulk(self.candidates[:MAX_CANDIDATES])
 
                 # publish
                 await self.publish(opps)
@@ -337,7 +395,10 @@ class LiquidationScanner:
 
             dur = time.perf_counter() - t0
             MET_SCAN_LAT.observe(dur)
-            await asyncio.sleep(max(0.0, SCAN_INTERVAL_SEC - dur))
+            if SCAN_EVERY_BLOCK:
+                await self._wait_next_block(t0 + SCAN_INTERVAL_SEC)
+            else:
+                await asyncio.sleep(max(0.0, SCAN_INTERVAL_SEC - dur))
 
 if __name__ == "__main__":
     try:
@@ -16,13 +16,19 @@ import json
 import asyncio
 import logging
 from dataclasses import dataclass, asdict
-from decimal import Decimal
 from typing import Dict, List, Optional, Tuple
 
 import redis.asyncio as redis
 from prometheus_client import Counter, Gauge, Histogram, start_http_server
 from web3 import Web3, HTTPProvider
 
+from backend_bots.atom_core.fixed_point import WAD, from_wad, mul_div, parse_wad, to_wad
+from backend_bots.atom_core.multicall import Call, aggregate3, decode_result, encode_call
+from backend_bots.atom_core.ratelimit import SCANNING, rate_limit_middleware
+from backend_bots.atom_core.rpc_pool import RPCPool
+from backend_bots.atom_core.rpc_metrics import metrics_middleware, summary_loop as rpc_summary_loop
+from backend_bots.atom_core.token_meta import TokenRegistry
+
 # ---------------- Env helpers ----------------
 
 def _env(name: str, default: Optional[str] = None, required: bool = False) -> str:
@@ -37,6 +43,7 @@ if LM_CHAIN != "polygon":
     raise RuntimeError("LM_CHAIN must be 'polygon' for this scanner")
 
 POLYGON_RPC_URL = _env("POLYGON_RPC_URL", required=True)
+RPC_URLS = [u for u in (POLYGON_RPC_URL, _env("POLYGON_RPC_BACKUP"), _env("POLYGON_RPC_BACKUP2")) if u]
 CHAIN_ID_EXPECTED = int(_env("LM_CHAIN_ID", "137"))
 
 # Redis & ops
@@ -48,13 +55,15 @@ PAUSE_KEY = _env("LM_PAUSE_KEY", "atom:lm:paused")
 METRICS_PORT = int(_env("METRICS_PORT", "9115"))
 SCAN_INTERVAL_SEC = float(_env("LM_SCAN_INTERVAL_SEC", "600"))  # every 10 min
 MAX_POOLS = int(_env("LM_MAX_POOLS", "80"))  # scan first N pools per protocol
+# Evaluate every farm each interval regardless of LM_MAX_POOLS (the batched reads make this cheap)
+SCAN_ALL_POOLS = _env("LM_SCAN_ALL_POOLS", "false").lower() == "true"
 
-# Economics & filters
-MIN_TVL_USD = Decimal(_env("LM_MIN_TVL_USD", "20000"))
-MIN_TOTAL_APR = Decimal(_env("LM_MIN_TOTAL_APR", "5"))       # %
+# Economics & filters (USD and APR % in WAD, see atom_core.fixed_point)
+MIN_TVL_USD = parse_wad(_env("LM_MIN_TVL_USD", "20000"))
+MIN_TOTAL_APR = parse_wad(_env("LM_MIN_TOTAL_APR", "5"))       # %
 STABLE_TOKENS = set([s.strip().upper() for s in _env("LM_STABLE_TOKENS", "USDC,USDT,DAI,GUSD,FRAX,TUSD,USDC.E").split(",")])
-SECONDS_PER_YEAR = Decimal("31536000")
-POLYGON_BLOCKS_PER_YEAR = Decimal(_env("LM_BLOCKS_PER_YEAR", "15768000"))  # ~2s blocks
+SECONDS_PER_YEAR = 31536000
+POLYGON_BLOCKS_PER_YEAR = int(_env("LM_BLOCKS_PER_YEAR", "15768000"))  # ~2s blocks
 
 # Protocol addresses (env-overridable)
 QS_MASTERCHEF = Web3.to_checksum_address(_env("QUICKSWAP_MASTERCHEF", "0x68678CF174695fc2D27bd312DF67A3984364FFDd"))
@@ -121,6 +130,7 @@ MET_OPPS         = Counter("atom_lm_opportunities_total", "Published opportuniti
 MET_POOLS_SCANNED= Gauge("atom_lm_pools_scanned", "Pools scanned in last run")
 MET_BEST_APR     = Gauge("atom_lm_best_total_apr", "Best total APR seen (percent)")
 MET_LAST_TS      = Gauge("atom_lm_last_scan_ts", "Unix ts of last successful scan")
+MET_PIDS_LOADED  = Gauge("atom_lm_pids_loaded", "Pool ids loaded per protocol in last run", ["protocol"])
 
 # ---------------- Data models ----------------
 
@@ -149,11 +159,14 @@ class FarmingOpportunity:
 class LiquidityMiningScanner:
     def __init__(self):
         self.w3 = Web3(HTTPProvider(POLYGON_RPC_URL, request_kwargs={"timeout": 12}))
+        self.w3.middleware_onion.add(metrics_middleware, "rpc_metrics")
+        self.w3.middleware_onion.add(rate_limit_middleware(SCANNING), "rate_limit")
         cid = self.w3.eth.chain_id
         if cid != CHAIN_ID_EXPECTED:
             raise RuntimeError(f"Wrong network: expected chain_id {CHAIN_ID_EXPECTED}, got {cid}")
 
         self.redis: Optional[redis.Redis] = None
+        self.rpc = RPCPool(RPC_URLS)
 
         # Contracts
         self.qs_mc = self.w3.eth.contract(QS_MASTERCHEF, abi=MC_ABI)
@@ -161,216 +174,200 @@ class LiquidityMiningScanner:
         self.qs_router = self.w3.eth.contract(QS_ROUTER, abi=ROUTER_ABI)
         self.sushi_router = self.w3.eth.contract(SUSHI_ROUTER, abi=ROUTER_ABI)
 
-        # Caches
-        self.decimals: Dict[str, int] = {}
-        self.symbols: Dict[str, str] = {}
+        # Immutable token/LP metadata, shared with the other bots
+        self.meta = TokenRegistry(self.rpc, CHAIN_ID_EXPECTED)
 
     async def init(self):
         self.redis = await redis.from_url(REDIS_URL, encoding="utf-8", decode_responses=True)
+        await self.meta.load(self.redis)
         jlog("info", event="lm_init", chain=LM_CHAIN, rpc=POLYGON_RPC_URL, protocols=LM_PROTOCOLS)
 
     # ----- utils -----
 
-    def _erc20(self, addr: str):
-        return self.w3.eth.contract(addr, abi=ERC20_ABI)
-
-    def _pair(self, addr: str):
-        return self.w3.eth.contract(addr, abi=PAIR_ABI)
-
-    def _dec(self, token: str) -> int:
-        if token in self.decimals:
-            return self.decimals[token]
-        try:
-            d = self._erc20(token).functions.decimals().call()
-            self.decimals[token] = int(d)
-        except Exception:
-            self.decimals[token] = 18
-        return self.decimals[token]
-
-    def _sym(self, token: str) -> str:
-        if token in self.symbols:
-            return self.symbols[token]
-        try:
-            s = self._erc20(token).functions.symbol().call()
-            self.symbols[token] = str(s)
-        except Exception:
-            self.symbols[token] = token[:6]
-        return self.symbols[token]
+    # Reward-rate getters across MasterChef/MiniChef variants, probed in one multicall
+    REWARD_RATE_FNS = [
+        ("rewardPerSecond", "second"),
+        ("rewardsPerSecond", "second"),
+        ("sushiPerSecond", "second"),
+        ("rewardPerBlock", "block"),
+        ("rewardsPerBlock", "block"),
+        ("quickPerBlock", "block"),
+    ]
+
+    @staticmethod
+    def _uint(result) -> Optional[int]:
+        dec = decode_result(["uint256"], result)
+        return int(dec[0]) if dec else None
+
+    @staticmethod
+    def _addr(result) -> Optional[str]:
+        dec = decode_result(["address"], result)
+        if not dec or int(dec[0], 16) == 0:
+            return None
+        return Web3.to_checksum_address(dec[0])
 
-    def _get_reward_rate(self, mc) -> Tuple[Decimal, str]:
+    @staticmethod
+    def _pool_info(lp_result, info_result) -> Tuple[Optional[str], int]:
         """
-        Return (perSecond, unit) where unit is "second" or "block".
-        We probe a handful of common function names.
+        (lpToken, allocPoint) for one pid. MasterChef-style poolInfo is
+        (lpToken, allocPoint, lastRewardBlock, acc...); MiniChef-style exposes
+        lpToken(pid) and poolInfo is (accPerShare, lastRewardTime, allocPoint).
         """
-        candidates = [
-            ("rewardPerSecond", "second"),
-            ("rewardsPerSecond", "second"),
-            ("sushiPerSecond", "second"),
-            ("rewardPerBlock", "block"),
-            ("rewardsPerBlock", "block"),
-            ("quickPerBlock", "block"),
-        ]
-        for fn, unit in candidates:
-            try:
-                v = getattr(mc.functions, fn)().call()
-                if v and int(v) > 0:
-                    return (Decimal(int(v)), unit)
-            except Exception:
-                continue
-        return (Decimal(0), "second")
-
-    def _get_pool_length(self, mc) -> int:
-        try:
-            return int(mc.functions.poolLength().call())
-        except Exception:
-            return 0
-
-    def _get_total_alloc(self, mc) -> int:
-        try:
-            return int(mc.functions.totalAllocPoint().call())
-        except Exception:
-            return 0
-
-    def _get_lp_for_pid(self, mc, pid: int) -> Optional[str]:
-        # Prefer explicit lpToken(pid)
-        try:
-            a = mc.functions.lpToken(pid).call()
-            if a and int(a, 16) != 0:
-                return Web3.to_checksum_address(a)
-        except Exception:
-            pass
-        # Fallback: poolInfo(pid).lpToken or first tuple element if address
-        try:
-            info = mc.functions.poolInfo(pid).call()
-            if isinstance(info, (list, tuple)):
-                for v in info:
-                    if isinstance(v, str) and v.startswith("0x") and len(v) == 42:
-                        return Web3.to_checksum_address(v)
-            if isinstance(info, dict) and "lpToken" in info:
-                return Web3.to_checksum_address(info["lpToken"])
-        except Exception:
-            pass
-        return None
+        lp = LiquidityMiningScanner._addr(lp_result)
+        ok, ret = info_result
+        if not ok or len(ret) < 96:
+            return lp, 0
+        words = [int.from_bytes(ret[i:i + 32], "big") for i in range(0, len(ret) - len(ret) % 32, 32)]
+        if lp is not None:
+            return lp, words[2]
+        lp_word = words[0]
+        if lp_word == 0 or lp_word >> 160:
+            return None, 0
+        return Web3.to_checksum_address("0x" + lp_word.to_bytes(20, "big").hex()), words[1]
 
-    def _get_alloc_for_pid(self, mc, pid: int) -> int:
-        try:
-            info = mc.functions.poolInfo(pid).call()
-            if isinstance(info, dict) and "allocPoint" in info:
-                return int(info["allocPoint"])
-            if isinstance(info, (list, tuple)):
-                # try to find int field
-                for v in info:
-                    if isinstance(v, int):
-                        return int(v)
-        except Exception:
-            pass
-        return 0
-
-    def _price_token_in_usdc(self, router, token: str, amount_in_wei: int) -> Optional[Decimal]:
-        try:
-            if token.lower() == USDC.lower():
-                return Decimal(amount_in_wei) / Decimal(10**6)
-            path = [Web3.to_checksum_address(token), USDC]
-            amts = router.functions.getAmountsOut(amount_in_wei, path).call()
-            out = int(amts[-1])
-            return Decimal(out) / Decimal(10**6)
-        except Exception:
-            return None
-
-    def _pair_tvl_usd(self, router, lp_addr: str) -> Optional[Decimal]:
-        try:
-            pair = self._pair(lp_addr)
-            t0 = Web3.to_checksum_address(pair.functions.token0().call())
-            t1 = Web3.to_checksum_address(pair.functions.token1().call())
-            r0, r1, _ = pair.functions.getReserves().call()
-            d0 = self._dec(t0)
-            d1 = self._dec(t1)
-            # price 1 full token of each side
-            p0 = self._price_token_in_usdc(router, t0, 10**d0)
-            p1 = self._price_token_in_usdc(router, t1, 10**d1)
-            if p0 is None or p1 is None:
-                return None
-            v0 = (Decimal(r0) / Decimal(10**d0)) * p0
-            v1 = (Decimal(r1) / Decimal(10**d1)) * p1
-            return v0 + v1
-        except Exception:
-            return None
+    def _dec(self, token: str) -> int:
+        dec = self.meta.decimals_of(token)
+        return dec if dec <= 36 else 18
+
+    async def _usdc_prices(self, router_addr: str, tokens: List[str], block: int) -> Dict[str, int]:
+        """USDC value of one full token (WAD) via router getAmountsOut, every token in one multicall."""
+        prices: Dict[str, int] = {}
+        todo = []
+        for t in dict.fromkeys(tokens):
+            if t.lower() == USDC.lower():
+                prices[t] = WAD
+            else:
+                todo.append(t)
+        calls = [
+            Call(router_addr, encode_call("getAmountsOut(uint256,address[])", ["uint256", "address[]"],
+                                          [10 ** self._dec(t), [t, USDC]]))
+            for t in todo
+        ]
+        for t, r in zip(todo, await aggregate3(self.rpc, calls, block)):
+            amts = decode_result(["uint256[]"], r)
+            if amts and amts[0]:
+                prices[t] = to_wad(int(amts[0][-1]), 6)
+        return prices
 
     def _is_stable_pair(self, sym0: str, sym1: str) -> bool:
         return sym0.upper() in STABLE_TOKENS and sym1.upper() in STABLE_TOKENS
 
-    def _fee_apr_heuristic(self, tvl_usd: Decimal) -> Decimal:
+    def _fee_apr_heuristic(self, tvl_usd: int) -> int:
         # Conservative heuristic fee APR; you can override via LM_FEE_APR_BPS
-        bps = Decimal(_env("LM_FEE_APR_BPS", "300"))  # 3% default
-        return bps / Decimal(100)
+        bps = parse_wad(_env("LM_FEE_APR_BPS", "300"))  # 3% default
+        return bps // 100
 
-    def _compound_hours(self, total_apr: Decimal) -> int:
+    def _compound_hours(self, total_apr: int) -> int:
         # Higher APR -> compound more often; capped range
-        if total_apr >= 50:
+        if total_apr >= 50 * WAD:
             return 12
-        if total_apr >= 20:
+        if total_apr >= 20 * WAD:
             return 24
         return 48
 
     # ----- protocol scans -----
 
-    def _scan_masterchef(
+    async def _scan_masterchef(
         self,
         name: str,
         mc,
         router,
         reward_token: str
     ) -> List[FarmingOpportunity]:
+        """
+        Batched scan pinned to one block: header, every pid's pool info, LP
+        composition/reserves, token metadata and USDC prices are each loaded with
+        chunked Multicall3 reads, then APRs are computed in memory.
+        """
         opps: List[FarmingOpportunity] = []
         try:
-            plen = self._get_pool_length(mc)
-            total_alloc = self._get_total_alloc(mc)
+            block = await self.rpc.block_number()
+            mc_addr = mc.address
+
+            header = await aggregate3(self.rpc, [
+                Call(mc_addr, encode_call("poolLength()")),
+                Call(mc_addr, encode_call("totalAllocPoint()")),
+                *[Call(mc_addr, encode_call(f"{fn}()")) for fn, _ in self.REWARD_RATE_FNS],
+            ], block)
+            plen = self._uint(header[0]) or 0
+            total_alloc = self._uint(header[1]) or 0
             if plen == 0 or total_alloc == 0:
                 return opps
 
-            reward_rate, unit = self._get_reward_rate(mc)
+            reward_rate, unit = 0, "second"
+            for (fn, u), r in zip(self.REWARD_RATE_FNS, header[2:]):
+                v = self._uint(r)
+                if v:
+                    reward_rate, unit = v, u
+                    break
             if reward_rate <= 0:
                 return opps
 
-            # annual reward units (token/year)
+            # annual reward in base units of the reward token
             if unit == "second":
                 annual_reward_total = reward_rate * SECONDS_PER_YEAR
             else:
                 annual_reward_total = reward_rate * POLYGON_BLOCKS_PER_YEAR
 
+            # every pid: lpToken(pid) + poolInfo(pid)
+            pid_calls = []
+            for pid in range(plen):
+                pid_calls += [Call(mc_addr, encode_call("lpToken(uint256)", ["uint256"], [pid])),
+                              Call(mc_addr, encode_call("poolInfo(uint256)", ["uint256"], [pid]))]
+            pid_res = await aggregate3(self.rpc, pid_calls, block)
+            pools: List[Tuple[int, str, int]] = []
+            for pid in range(plen):
+                lp, alloc = self._pool_info(pid_res[2 * pid], pid_res[2 * pid + 1])
+                if lp and alloc > 0:
+                    pools.append((pid, lp, alloc))
+            MET_PIDS_LOADED.labels(name).set(plen)
+
+            # LP composition comes from the registry; only reserves are read per scan
+            lps = list(dict.fromkeys(lp for _, lp, _ in pools))
+            await self.meta.ensure_pairs(lps, block)
+            lps = [lp for lp in lps if lp in self.meta.pair_tokens]
+            lp_res = await aggregate3(self.rpc, [Call(lp, encode_call("getReserves()")) for lp in lps], block)
+            lp_state: Dict[str, Tuple[str, str, int, int]] = {}
+            for lp, r in zip(lps, lp_res):
+                rs = decode_result(["uint112", "uint112", "uint32"], r)
+                if rs:
+                    lp_state[lp] = (*self.meta.pair_tokens[lp], rs[0], rs[1])
+
+            tokens = [reward_token] + [t for st in lp_state.values() for t in st[:2]]
+            await self.meta.ensure_tokens(tokens, block)
+            prices = await self._usdc_prices(router.address, tokens, block)
+
             # reward price in USDC
-            reward_dec = self._dec(reward_token)
-            reward_price_1 = self._price_token_in_usdc(router, reward_token, 10**reward_dec)
+            reward_price_1 = prices.get(reward_token)
             if reward_price_1 is None or reward_price_1 <= 0:
                 return opps
+            reward_dec = self._dec(reward_token)
 
             scanned = 0
-            for pid in range(plen):
-                if scanned >= MAX_POOLS:
+            for pid, lp, alloc in pools:
+                if not SCAN_ALL_POOLS and scanned >= MAX_POOLS:
                     break
-                alloc = self._get_alloc_for_pid(mc, pid)
-                if alloc <= 0:
+                st = lp_state.get(lp)
+                if st is None:
                     continue
-                lp = self._get_lp_for_pid(mc, pid)
-                if not lp:
+                t0, t1, r0, r1 = st
+                p0, p1 = prices.get(t0), prices.get(t1)
+                if p0 is None or p1 is None:
                     continue
-
-                tvl = self._pair_tvl_usd(router, lp)
-                if tvl is None or tvl < MIN_TVL_USD:
+                d0, d1 = self._dec(t0), self._dec(t1)
+                tvl = mul_div(r0, p0, 10**d0) + mul_div(r1, p1, 10**d1)
+                if tvl <= 0 or tvl < MIN_TVL_USD:
                     continue
 
                 # LP pair tokens and symbols
-                pair = self._pair(lp)
-                t0 = Web3.to_checksum_address(pair.functions.token0().call())
-                t1 = Web3.to_checksum_address(pair.functions.token1().call())
-                s0 = self._sym(t0)
-                s1 = self._sym(t1)
+                s0 = self.meta.symbol_of(t0)
+                s1 = self.meta.symbol_of(t1)
 
                 # pool's share of rewards
-                pool_annual_reward = (annual_reward_total * Decimal(alloc)) / Decimal(total_alloc)
-                pool_annual_reward_usd = pool_annual_reward * reward_price_1
+                pool_annual_reward = annual_reward_total * alloc // total_alloc
+                pool_annual_reward_usd = mul_div(pool_annual_reward, reward_price_1, 10**reward_dec)
 
-                reward_apr = (pool_annual_reward_usd / tvl) * Decimal(100)  # %
+                reward_apr = mul_div(pool_annual_reward_usd, 100 * WAD, tvl)  # %
                 fee_apr = self._fee_apr_heuristic(tvl)
                 total_apr = reward_apr + fee_apr
 
@@ -387,13 +384,13 @@ class LiquidityMiningScanner:
                     token1=t1,
                     symbol0=s0,
                     symbol1=s1,
-                    tvl_usd=float(tvl),
+                    tvl_usd=from_wad(tvl),
                     reward_token=reward_token,
-                    reward_token_symbol=self._sym(reward_token),
-                    reward_price_usd=float(reward_price_1),
-                    reward_apr=float(reward_apr),
-                    fee_apr=float(fee_apr),
-                    total_apr=float(total_apr),
+                    reward_token_symbol=self.meta.symbol_of(reward_token),
+                    reward_price_usd=from_wad(reward_price_1),
+                    reward_apr=from_wad(reward_apr),
+                    fee_apr=from_wad(fee_apr),
+                    total_apr=from_wad(total_apr),
                     il_risk=float(il),
                     compound_hours=self._compound_hours(total_apr),
                     ts=int(time.time()),
@@ -405,11 +402,11 @@ class LiquidityMiningScanner:
             jlog("error", event="scan_masterchef_error", protocol=name, err=str(e))
         return opps
 
-    def scan_quickswap(self) -> List[FarmingOpportunity]:
-        return self._scan_masterchef("quickswap", self.qs_mc, self.qs_router, QS_REWARD_TOKEN) if "quickswap" in LM_PROTOCOLS else []
+    async def scan_quickswap(self) -> List[FarmingOpportunity]:
+        return await self._scan_masterchef("quickswap", self.qs_mc, self.qs_router, QS_REWARD_TOKEN) if "quickswap" in LM_PROTOCOLS else []
 
-    def scan_sushiswap(self) -> List[FarmingOpportunity]:
-        return self._scan_masterchef("sushiswap", self.sushi_mc, self.sushi_router, SUSHI_REWARD_TOKEN) if "sushiswap" in LM_PROTOCOLS else []
+    async def scan_sushiswap(self) -> List[FarmingOpportunity]:
+        return await self._scan_masterchef("sushiswap", self.sushi_mc, self.sushi_router, SUSHI_REWARD_TOKEN) if "sushiswap" in LM_PROTOCOLS else []
 
     # ----- publishing & control -----
 
@@ -448,10 +445,8 @@ class LiquidityMiningScanner:
                 await asyncio.sleep(1.0)
                 return
             all_opps: List[FarmingOpportunity] = []
-            if "quickswap" in LM_PROTOCOLS:
-                all_opps.extend(self.scan_quickswap())
-            if "sushiswap" in LM_PROTOCOLS:
-                all_opps.extend(self.scan_sushiswap())
+            for found in await asyncio.gather(self.scan_quickswap(), self.scan_sushiswap()):
+                all_opps.extend(found)
 
             MET_POOLS_SCANNED.set(len(all_opps))
             await self.publish(all_opps)
@@ -469,7 +464,8 @@ class LiquidityMiningScanner:
     async def run(self):
         start_http_server(METRICS_PORT)
         await self.init()
-        jlog("info", event="lm_started", protocols=LM_PROTOCOLS, min_tvl=float(MIN_TVL_USD), min_apr=float(MIN_TOTAL_APR))
+        jlog("info", event="lm_started", protocols=LM_PROTOCOLS, min_tvl=from_wad(MIN_TVL_USD), min_apr=from_wad(MIN_TOTAL_APR))
+        asyncio.create_task(rpc_summary_loop(jlog))
         while True:
             await self.run_once()
             await asyncio.sleep(SCAN_INTERVAL_SEC)
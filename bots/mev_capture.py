@@ -28,6 +28,13 @@ from prometheus_client import Counter, Gauge, Histogram, start_http_server
 from web3 import Web3, HTTPProvider
 from eth_abi import decode as abi_decode
 
+from backend_bots.atom_core.call_cache import CALL_CACHE
+from backend_bots.atom_core.rpc_pool import RPCPool
+from backend_bots.atom_core.pair_index import PairIndex
+from backend_bots.atom_core.shm_reserves import open_reserves
+from backend_bots.atom_core.rpc_metrics import summary_loop as rpc_summary_loop
+from backend_bots.atom_core.token_meta import TokenRegistry
+
 # ---------------- Env helpers ----------------
 
 def _env(name: str, default: Optional[str] = None, required: bool = False) -> str:
@@ -43,6 +50,9 @@ if CHAIN not in ("polygon", "ethereum"):
 # RPC / optional WSS for mempool subscribe (eth_subscribe)
 RPC_URL = _env("POLYGON_RPC_URL" if CHAIN == "polygon" else "ETHEREUM_RPC_URL", required=True)
 WSS_URL = _env("POLYGON_WSS_URL" if CHAIN == "polygon" else "ETHEREUM_WSS_URL", "")
+# Optional backups for quote reads; hedged across endpoints when RPC_HEDGE=true
+RPC_URLS = [u for u in (RPC_URL, _env("POLYGON_RPC_BACKUP" if CHAIN == "polygon" else "ETHEREUM_RPC_BACKUP"),
+                        _env("POLYGON_RPC_BACKUP2" if CHAIN == "polygon" else "ETHEREUM_RPC_BACKUP2")) if u]
 
 REDIS_URL = _env("REDIS_URL", required=True)
 
@@ -81,18 +91,27 @@ USDT = Web3.to_checksum_address(
          else "0xdAC17F958D2ee523a2206206994597C13D831ec7")
 )
 
-# Router allowlist (Uniswap V2-style)
+# Router allowlist (Uniswap V2-style) and each router's factory, for local quotes
 ROUTERS: Dict[str, str] = {}
+ROUTER_FACTORIES: Dict[str, str] = {}
 if CHAIN == "polygon":
-    ROUTERS = {
-        Web3.to_checksum_address(_env("QUICKSWAP_V2_ROUTER", "0xa5E0829CaCEd8fFDD4De3c43696c57F7D7A678ff")): "QuickSwapV2",
-        Web3.to_checksum_address(_env("SUSHI_V2_ROUTER",     "0x1b02dA8Cb0d097eB8D57A175b88c7D8b47997506")): "SushiV2",
+    _qs = Web3.to_checksum_address(_env("QUICKSWAP_V2_ROUTER", "0xa5E0829CaCEd8fFDD4De3c43696c57F7D7A678ff"))
+    _su = Web3.to_checksum_address(_env("SUSHI_V2_ROUTER",     "0x1b02dA8Cb0d097eB8D57A175b88c7D8b47997506"))
+    ROUTERS = {_qs: "QuickSwapV2", _su: "SushiV2"}
+    ROUTER_FACTORIES = {
+        _qs: Web3.to_checksum_address(_env("QUICKSWAP_V2_FACTORY", "0x5757371414417b8C6CAad45bAeF941aBc7d3Ab32")),
+        _su: Web3.to_checksum_address(_env("SUSHI_V2_FACTORY",     "0xc35DADB65012eC5796536bD9864eD8773aBc74C4")),
     }
 else:
-    ROUTERS = {
-        Web3.to_checksum_address(_env("UNISWAP_V2_ROUTER",   "0x7a250d5630B4cF539739dF2C5dAcb4c659F2488D")): "UniswapV2",
-        Web3.to_checksum_address(_env("SUSHI_V2_ROUTER",     "0xd9e1cE17f2641f24aE83637ab66a2cca9C378B9F")): "SushiV2",
+    _uni = Web3.to_checksum_address(_env("UNISWAP_V2_ROUTER",   "0x7a250d5630B4cF539739dF2C5dAcb4c659F2488D"))
+    _su = Web3.to_checksum_address(_env("SUSHI_V2_ROUTER",     "0xd9e1cE17f2641f24aE83637ab66a2cca9C378B9F"))
+    ROUTERS = {_uni: "UniswapV2", _su: "SushiV2"}
+    ROUTER_FACTORIES = {
+        _uni: Web3.to_checksum_address(_env("UNISWAP_V2_FACTORY", "0x5C69bEe701ef814a2B6a3EDD4B1652CB9cc5aA6f")),
+        _su: Web3.to_checksum_address(_env("SUSHI_V2_FACTORY",   "0xC0AEe478e3658e2610c5F7A4A2E1777cE9e4f2Ac")),
     }
+# 0.30% LP fee on all of the above
+V2_FEE_NUM, V2_FEE_DEN = 997, 1000
 
 # ---------------- ABIs & selectors ----------------
 
@@ -152,22 +171,37 @@ class MEVSignal:
 class MEVCaptureScanner:
     def __init__(self):
         self.w3 = Web3(HTTPProvider(RPC_URL, request_kwargs={"timeout": 10}))
+        self.rpc = RPCPool(RPC_URLS)
         self.redis: Optional[redis.Redis] = None
         self.native_oracle = self.w3.eth.contract(CHAINLINK_NATIVE_USD, abi=CL_AGG_ABI)
         self.routers = {addr: self.w3.eth.contract(addr, abi=ROUTER_ABI) for addr in ROUTERS.keys()}
 
-        # token caches
-        self.decimals: Dict[str, int] = {}
-        self.symbols: Dict[str, str] = {}
-
         # network guard
         cid = self.w3.eth.chain_id
         expect = 137 if CHAIN == "polygon" else 1
         if cid != expect:
             raise RuntimeError(f"Wrong network: expected chain_id={expect} for {CHAIN}, got {cid}")
 
+        # immutable token metadata, shared with the other bots
+        self.meta = TokenRegistry(self.rpc, expect)
+        # pair lookup and Sync-fed reserves for local getAmountsOut; pairs are tracked as swaps touch them
+        self.index = PairIndex(self.rpc, {ROUTERS[r]: f for r, f in ROUTER_FACTORIES.items()}, expect)
+        self.state = open_reserves(self.rpc, expect)
+
     async def init(self):
         self.redis = await redis.from_url(REDIS_URL, encoding="utf-8", decode_responses=True)
+        await asyncio.gather(self.meta.load(self.redis), self.index.load(self.redis))
+        try:
+            # a cold index catches up in the background; unindexed hops fall back to the router meanwhile
+            await self.index.refresh()
+        except Exception as e:
+            MET_ERRORS.inc()
+            jlog("error", event="pair_index_error", err=str(e))
+        try:
+            await self.meta.ensure_tokens([USDC, USDT])
+        except Exception as e:
+            MET_ERRORS.inc()
+            jlog("error", event="token_meta_error", err=str(e))
         jlog("info", event="mev_scanner_init", chain=CHAIN, rpc=RPC_URL, wss=bool(WSS_URL), mempool=MEMPOOL_ENABLED)
 
     # -------- helpers --------
@@ -186,7 +220,8 @@ class MEVCaptureScanner:
 
     async def native_usd(self) -> Decimal:
         try:
-            rd = await asyncio.to_thread(self.native_oracle.functions.latestRoundData().call)
+            raw = await self.rpc.eth_call(self.native_oracle.address, self.native_oracle.encodeABI(fn_name="latestRoundData"))
+            rd = abi_decode(["uint80", "int256", "uint256", "uint256", "uint80"], raw)
             return Decimal(rd[1]) / Decimal(10**8)
         except Exception as e:
             MET_ERRORS.inc()
@@ -195,33 +230,50 @@ class MEVCaptureScanner:
             return Decimal("0.70") if CHAIN == "polygon" else Decimal("3000")
 
     def _decimals(self, token: str) -> int:
-        if token in self.decimals:
-            return self.decimals[token]
-        try:
-            erc = self.w3.eth.contract(token, abi=ERC20_ABI)
-            d = erc.functions.decimals().call()
-            self.decimals[token] = int(d)
-            return self.decimals[token]
-        except Exception:
-            self.decimals[token] = 6 if token in (USDC, USDT) else 18
-            return self.decimals[token]
+        return self.meta.decimals_of(token, 6 if token in (USDC, USDT) else 18)
 
     def _symbol(self, token: str) -> str:
-        if token in self.symbols:
-            return self.symbols[token]
-        try:
-            erc = self.w3.eth.contract(token, abi=ERC20_ABI)
-            s = erc.functions.symbol().call()
-            self.symbols[token] = str(s)
-            return self.symbols[token]
-        except Exception:
-            return token[:6]
+        return self.meta.symbol_of(token)
+
+    def _local_amounts_out(self, router_addr: str, amount_in: int, path: List[str]) -> Optional[List[int]]:
+        """
+        getAmountsOut from the local reserve table. None when a hop's pair is not
+        indexed or its reserves are not loaded yet; the pair is tracked from then on.
+        """
+        dex = ROUTERS[router_addr]
+        amounts = [amount_in]
+        missing = []
+        for a, b in zip(path, path[1:]):
+            pair = self.index.pair(dex, Web3.to_checksum_address(a), Web3.to_checksum_address(b))
+            if pair is None:
+                return None
+            reserves = self.state.get(pair)
+            if reserves is None:
+                missing.append(pair)
+                continue
+            if missing:
+                continue
+            t0, _ = self.index.tokens_of(pair)
+            r_in, r_out = reserves if t0 == Web3.to_checksum_address(a) else reserves[::-1]
+            x = amounts[-1] * V2_FEE_NUM
+            amounts.append(x * r_out // (r_in * V2_FEE_DEN + x) if r_in and r_out else 0)
+        if missing:
+            self.state.track(missing)
+            return None
+        return amounts
+
+    async def _amounts_out(self, router_addr: str, amount_in: int, path: List[str]) -> List[int]:
+        local = self._local_amounts_out(router_addr, amount_in, path)
+        if local is not None:
+            return local
+        router = self.routers[router_addr]
+        raw = await self.rpc.eth_call(router_addr, router.encodeABI(fn_name="getAmountsOut", args=[amount_in, path]))
+        return list(abi_decode(["uint256[]"], raw)[0])
 
     async def _expected_out(self, router_addr: str, amount_in: int, path: List[str]) -> Optional[int]:
         try:
-            router = self.routers[router_addr]
-            amts = await asyncio.to_thread(router.functions.getAmountsOut(amount_in, path).call)
-            if isinstance(amts, list) and len(amts) == len(path):
+            amts = await self._amounts_out(router_addr, amount_in, path)
+            if len(amts) == len(path):
                 return int(amts[-1])
         except Exception as e:
             MET_ERRORS.inc()
@@ -237,7 +289,7 @@ class MEVCaptureScanner:
                 return Decimal(amount_in) / Decimal(10**d)
             # attempt to append USDC to path if not already present
             new_path = path + [USDC] if path[-1] != USDC else path
-            amt = await asyncio.to_thread(self.routers[router_addr].functions.getAmountsOut(amount_in, new_path).call)
+            amt = await self._amounts_out(router_addr, amount_in, new_path)
             d = self._decimals(USDC)
             return Decimal(amt[-1]) / Decimal(10**d)
         except Exception:
@@ -329,8 +381,7 @@ class MEVCaptureScanner:
             txs = block["transactions"] or []
             MET_LAST_BLOCK.set(block_number)
 
-            native_usd = await self.native_usd()
-            gas_price = self.w3.eth.gas_price
+            native_usd, gas_price = await asyncio.gather(self.native_usd(), self.rpc.gas_price())
             gas_usd = (Decimal(gas_price) * Decimal(GAS_LIMIT_BACKRUN) / Decimal(1e18)) * native_usd
             flash_fee_factor = AAVE_FLASH_FEE_BPS / Decimal(10000)
 
@@ -420,6 +471,8 @@ class MEVCaptureScanner:
                     await asyncio.sleep(1.0)
                     continue
                 cur = self.w3.eth.block_number
+                # scope cached getAmountsOut quotes to the current head
+                CALL_CACHE.advance(cur)
                 if cur > last:
                     for b in range(last + 1, cur + 1):
                         await self.scan_block(b)
@@ -454,7 +507,8 @@ class MEVCaptureScanner:
         await self.init()
         jlog("info", event="mev_scanner_started", chain=CHAIN, routers=len(self.routers), mempool=MEMPOOL_ENABLED)
 
-        tasks = [asyncio.create_task(self.block_loop())]
+        tasks = [asyncio.create_task(self.block_loop()), asyncio.create_task(self.state.run()),
+                 asyncio.create_task(rpc_summary_loop(jlog))]
         if MEMPOOL_ENABLED:
             tasks.append(asyncio.create_task(self.mempool_loop()))
         await asyncio.gather(*tasks)
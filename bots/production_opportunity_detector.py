@@ -16,6 +16,7 @@ from typing import Dict, List, Optional
 from web3 import Web3
 import redis
 from config.secure_config import SecureConfig
+from backend_bots.atom_core.v3_pool import UNISWAP_V3_FACTORY, V3Pools
 
 logger = logging.getLogger("production_opportunity_detector")
 logging.basicConfig(level=logging.INFO)
@@ -97,6 +98,9 @@ class ProductionOpportunityDetector:
             abi=self.v2_abi,
         )
 
+        # local V3 pool mirrors: quotes run the swap math here, the quoter is only the fallback
+        self.v3 = V3Pools(self.w3, _cfg.env.get("UNISWAP_V3_FACTORY", UNISWAP_V3_FACTORY))
+
         self.running = False
 
     def _get_v2_price(self, router, token_in, token_out, amount_in) -> Optional[int]:
@@ -110,6 +114,10 @@ class ProductionOpportunityDetector:
 
     def _get_v3_price(self, token_in, token_out, amount_in, fee=3000) -> Optional[int]:
         try:
+            out = self.v3.quote(token_in, token_out, fee, amount_in)
+            if out is not None or self.v3.pool_of(token_in, token_out, fee) is None:
+                return out
+            # swap runs past the ticks held locally
             return self.uniswap_quoter.functions.quoteExactInputSingle(
                 token_in, token_out, fee, amount_in, 0
             ).call()
@@ -163,6 +171,10 @@ class ProductionOpportunityDetector:
         self.running = True
         while self.running:
             found = []
+            try:
+                self.v3.update()
+            except Exception as e:
+                logger.warning(f"V3 pool update error: {e}")
             for a, b, c in triangles:
                 for amt in test_amounts:
                     opp = await self.calculate_triangular(self.tokens[a], self.tokens[b], self.tokens[c], amt)
@@ -13,6 +13,7 @@ from typing import Dict, Optional
 
 from web3 import Web3
 from config.secure_config import SecureConfig
+from backend_bots.atom_core.v3_pool import UNISWAP_V3_FACTORY, V3Pools
 
 logger = logging.getLogger("profit_calculator")
 logging.basicConfig(level=logging.INFO)
@@ -64,10 +65,15 @@ class ProfitCalculator:
         }]
         self.quickswap = self.w3.eth.contract(address=self.routers["QUICKSWAP_ROUTER"], abi=self.v2_abi)
         self.sushiswap = self.w3.eth.contract(address=self.routers["SUSHISWAP_ROUTER"], abi=self.v2_abi)
+        # local V3 pool mirrors, brought to head once per validation
+        self.v3 = V3Pools(self.w3, _cfg.env.get("UNISWAP_V3_FACTORY", UNISWAP_V3_FACTORY))
 
     def _quote(self, dex: str, token_in: str, token_out: str, amount_in: int) -> Optional[int]:
         try:
             if dex == "uniswap_v3":
+                out = self.v3.quote(token_in, token_out, 3000, amount_in)
+                if out is not None or self.v3.pool_of(token_in, token_out, 3000) is None:
+                    return out
                 return self.uniswap_quoter.functions.quoteExactInputSingle(token_in, token_out, 3000, amount_in, 0).call()
             if dex == "quickswap":
                 return self.quickswap.functions.getAmountsOut(amount_in, [token_in, token_out]).call()[-1]
@@ -81,6 +87,10 @@ class ProfitCalculator:
         try:
             a, b, c = opp["token_a"], opp["token_b"], opp["token_c"]
             amt = opp["amount_in"]
+            try:
+                self.v3.update()
+            except Exception as e:
+                logger.debug(f"V3 pool update error: {e}")
             ab = self._quote(opp["dex_a"], a, b, amt)
             if not ab:
                 return {"profitable": False, "error": "step1"}
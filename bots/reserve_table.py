@@ -0,0 +1,67 @@
+# bots/reserve_table.py
+"""
+ATOM Reserve Table Writer (Polygon mainnet)
+- Single process that follows V2 reserves for every pair the scanners ask for
+- Publishes them into a memory-mapped table (RESERVE_SHM_PATH) the scanners read
+- One Sync-log poll per block for the whole host instead of one per scanner
+- Prometheus metrics on METRICS_PORT
+- Strict: no private keys, no signing
+- Hard fail if not on chain_id=137 (Polygon)
+"""
+
+import os
+import asyncio
+import json
+import logging
+from typing import Optional
+
+import redis.asyncio as redis
+from prometheus_client import start_http_server
+
+from backend_bots.atom_core.rpc_pool import RPCPool
+from backend_bots.atom_core.rpc_metrics import summary_loop as rpc_summary_loop
+from backend_bots.atom_core.shm_reserves import ReserveTable, default_path
+
+# ---------- Env ----------
+
+def _env(name: str, default: Optional[str] = None, required: bool = False) -> str:
+    v = os.getenv(name, default)
+    if required and (v is None or str(v).strip() == ""):
+        raise RuntimeError(f"Missing required env: {name}")
+    return "" if v is None else str(v)
+
+RPC_URL = _env("POLYGON_RPC_URL", required=True)
+RPC_URLS = [u for u in (RPC_URL, _env("POLYGON_RPC_BACKUP"), _env("POLYGON_RPC_BACKUP2")) if u]
+REDIS_URL = _env("REDIS_URL", required=True)
+METRICS_PORT = int(_env("METRICS_PORT", "9118"))
+SHM_PATH = _env("RESERVE_SHM_PATH") or default_path(137)
+
+# ---------- Logging ----------
+
+log = logging.getLogger("atom.reserve_table")
+_h = logging.StreamHandler()
+_h.setFormatter(logging.Formatter("%(message)s"))
+log.addHandler(_h)
+log.setLevel(logging.INFO)
+
+def jlog(level: str, **kw):
+    getattr(log, level.lower())(json.dumps(kw, separators=(",", ":")))
+
+# ---------- Writer ----------
+
+async def main():
+    start_http_server(METRICS_PORT)
+    rpc = RPCPool(RPC_URLS)
+    cid = await rpc.chain_id()
+    if cid != 137:
+        raise RuntimeError(f"Not on Polygon mainnet (137). chain_id={cid}")
+    r = await redis.from_url(REDIS_URL, encoding="utf-8", decode_responses=True)
+    table = ReserveTable(rpc, SHM_PATH, 137, redis=r)
+    jlog("info", event="reserve_table_started", path=SHM_PATH, slots=table.capacity, pairs=len(table.slots))
+    await asyncio.gather(table.run(), rpc_summary_loop(jlog))
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
@@ -13,16 +13,23 @@ import asyncio
 import json
 import time
 import logging
-import math
 from dataclasses import asdict, dataclass
-from decimal import Decimal
 from typing import Dict, List, Tuple, Optional
-from concurrent.futures import ThreadPoolExecutor
 
 import redis.asyncio as redis
 from prometheus_client import Counter, Gauge, Histogram, start_http_server
 from web3 import Web3, HTTPProvider
 
+from backend_bots.atom_core.rpc_pool import RPCPool
+from backend_bots.atom_core.fixed_point import (
+    BPS, chainlink_wad, from_wad, gas_cost_wad, mul_div, parse_wad, percent_mul, price_wad,
+)
+from backend_bots.atom_core.multicall import decode_result, encode_call
+from backend_bots.atom_core.rpc_metrics import summary_loop as rpc_summary_loop
+from backend_bots.atom_core.pair_index import PairIndex
+from backend_bots.atom_core.reserve_state import ReserveState
+from backend_bots.atom_core.shm_reserves import open_reserves
+
 # ---------- Config ----------
 
 def _env(name: str, default: Optional[str] = None, required: bool = False) -> str:
@@ -32,13 +39,14 @@ def _env(name: str, default: Optional[str] = None, required: bool = False) -> st
     return str(val) if val is not None else ""
 
 RPC_URL = _env("POLYGON_RPC_URL", required=True)
+RPC_URLS = [u for u in (RPC_URL, _env("POLYGON_RPC_BACKUP"), _env("POLYGON_RPC_BACKUP2")) if u]
 REDIS_URL = _env("REDIS_URL", required=True)
 SCAN_INTERVAL_SEC = float(_env("STABLESCAN_INTERVAL_SEC", "1.0"))
-MAX_WORKERS = int(_env("STABLESCAN_MAX_WORKERS", "16"))
 SPREAD_BPS_THRESHOLD = int(_env("STABLESCAN_SPREAD_BPS", "35"))  # 0.35%
-MIN_PROFIT_USD = Decimal(_env("STABLESCAN_MIN_PROFIT_USD", "100"))
-TRADE_SIZE_USD = Decimal(_env("STABLESCAN_TRADE_SIZE_USD", "25000"))
-AAVE_FEE_BPS = Decimal(_env("AAVE_FLASH_FEE_BPS", "9"))  # 0.09%
+# USD amounts and prices are WAD ints (atom_core.fixed_point)
+MIN_PROFIT_USD = parse_wad(_env("STABLESCAN_MIN_PROFIT_USD", "100"))
+TRADE_SIZE_USD = parse_wad(_env("STABLESCAN_TRADE_SIZE_USD", "25000"))
+AAVE_FEE_BPS = int(_env("AAVE_FLASH_FEE_BPS", "9"))  # 0.09%
 GAS_LIMIT_ARB = int(_env("STABLESCAN_GAS_LIMIT", "400000"))
 METRICS_PORT = int(_env("METRICS_PORT", "9109"))
 REDIS_STREAM = _env("STABLESCAN_REDIS_STREAM", "atom:opps:stablecoin")
@@ -73,10 +81,6 @@ STABLES = {
     "MAI":  {"addr": Web3.to_checksum_address("0xa3Fa99A148fA48D14Ed51d610c367C61876997F1"), "dec": 18},
 }
 
-PAIR_ABI = json.loads('[{"constant":true,"inputs":[],"name":"getReserves","outputs":[{"name":"reserve0","type":"uint112"},{"name":"reserve1","type":"uint112"},{"name":"blockTimestampLast","type":"uint32"}],"type":"function"},{"constant":true,"inputs":[],"name":"token0","outputs":[{"name":"","type":"address"}],"type":"function"},{"constant":true,"inputs":[],"name":"token1","outputs":[{"name":"","type":"address"}],"type":"function"}]')
-FACTORY_ABI = json.loads('[{"constant":true,"inputs":[{"name":"tokenA","type":"address"},{"name":"tokenB","type":"address"}],"name":"getPair","outputs":[{"name":"pair","type":"address"}],"type":"function"}]')
-CL_AGG_ABI = json.loads('[{"inputs":[],"name":"latestRoundData","outputs":[{"name":"roundId","type":"uint80"},{"name":"answer","type":"int256"},{"name":"startedAt","type":"uint256"},{"name":"updatedAt","type":"uint256"},{"name":"answeredInRound","type":"uint80"}],"stateMutability":"view","type":"function"}]')
-
 # ---------- Logging ----------
 
 log = logging.getLogger("atom.stables")
@@ -114,17 +118,21 @@ class Opportunity:
     net_profit_usd: float
     amount_usd: float
     ts: int
+    block: int = 0  # every quote in the opportunity was read at this block
 
 # ---------- Monitor ----------
 
 class StablecoinPegMonitor:
     def __init__(self):
         self.w3 = Web3(HTTPProvider(RPC_URL, request_kwargs={"timeout": 10}))
+        self.rpc = RPCPool(RPC_URLS)
         self.redis: Optional[redis.Redis] = None
-        self.executor = ThreadPoolExecutor(max_workers=MAX_WORKERS)
-        self.factories = {name: self.w3.eth.contract(addr["factory"], abi=FACTORY_ABI) for name, addr in DEXES.items()}
-        self.matic_usd = self.w3.eth.contract(CHAINLINK_MATIC_USD, abi=CL_AGG_ABI)
         self.pairs: Dict[str, Dict[str, Dict[str, str]]] = {}  # pairs[dex][key] -> {pair, t0, t1}
+        self.index = PairIndex(self.rpc, {name: d["factory"] for name, d in DEXES.items()}, 137)
+        self.state = open_reserves(self.rpc, 137)  # reserves of the stable pairs, fed by Sync logs
+        # state of the last price sweep, all read at one block
+        self.block = 0
+        self.matic_usd_price = 0  # WAD
         self._ensure_chain()
 
     def _ensure_chain(self):
@@ -134,6 +142,7 @@ class StablecoinPegMonitor:
 
     async def init(self):
         self.redis = await redis.from_url(REDIS_URL, encoding="utf-8", decode_responses=True)
+        await self.index.load(self.redis)
         await self.discover_pairs()
         jlog("info", event="init", pairs=sum(len(x) for x in self.pairs.values()), rpc=RPC_URL, redis=REDIS_URL)
 
@@ -146,106 +155,95 @@ class StablecoinPegMonitor:
                 combos.append((tokens[i], tokens[j]))
 
         self.pairs = {dex: {} for dex in DEXES.keys()}
-
-        async def get_one(dex: str, a: str, b: str):
-            fa = self.factories[dex]
-            a_addr = STABLES[a]["addr"]
-            b_addr = STABLES[b]["addr"]
-            try:
-                pair_addr = await asyncio.to_thread(fa.functions.getPair(a_addr, b_addr).call)
-                if pair_addr and int(pair_addr, 16) != 0:
-                    # confirm token order to compute price correctly
-                    pair = self.w3.eth.contract(pair_addr, abi=PAIR_ABI)
-                    t0 = await asyncio.to_thread(pair.functions.token0().call)
-                    t1 = await asyncio.to_thread(pair.functions.token1().call)
-                    key = f"{a}-{b}"
-                    self.pairs[dex][key] = {"pair": pair_addr, "t0": t0, "t1": t1}
-            except Exception as e:
-                MET_ERRORS.inc()
-                jlog("error", event="discover_error", dex=dex, a=a, b=b, err=str(e))
-
-        tasks = []
+        try:
+            # PairCreated index instead of a getPair per combination; it also knows token0/token1.
+            # A cold index catches up in the background, and the combos are read with getPair meanwhile.
+            if not await self.index.refresh():
+                await self.index.lookup((dex, STABLES[a]["addr"], STABLES[b]["addr"]) for dex in DEXES for a, b in combos)
+        except Exception as e:
+            MET_ERRORS.inc()
+            jlog("error", event="discover_error", err=str(e))
         for dex in DEXES.keys():
             for a, b in combos:
-                tasks.append(get_one(dex, a, b))
-        await asyncio.gather(*tasks)
+                pair_addr = self.index.pair(dex, STABLES[a]["addr"], STABLES[b]["addr"])
+                if pair_addr is None:
+                    continue
+                t0, t1 = self.index.tokens_of(pair_addr)
+                # confirm token order to compute price correctly
+                self.pairs[dex][f"{a}-{b}"] = {"pair": pair_addr, "t0": t0, "t1": t1}
+
+        self.state.track(info["pair"] for m in self.pairs.values() for info in m.values())
 
         # persist to Redis for other services
         if self.redis:
             await self.redis.set("atom:stablecoin:pairs", json.dumps(self.pairs))
 
-    @staticmethod
-    def _adj(reserve: int, decimals: int) -> Decimal:
-        return Decimal(reserve) / Decimal(10 ** decimals)
-
-    async def _pair_price(self, dex: str, pair_info: Dict, a: str, b: str) -> Optional[Decimal]:
-        """Price as token_b per token_a (i.e., how many b for 1 a)"""
+    def _pair_price(self, pair_info: Dict, a: str, b: str, reserves: Tuple[int, int]) -> Optional[int]:
+        """Price as token_b per token_a (i.e., how many b for 1 a), in WAD"""
+        # map token0/token1 to a/b order
+        t0 = pair_info["t0"]
+        t1 = pair_info["t1"]
+        a_addr = STABLES[a]["addr"]
+        b_addr = STABLES[b]["addr"]
+        dec_a = STABLES[a]["dec"]
+        dec_b = STABLES[b]["dec"]
+        if t0 == a_addr and t1 == b_addr:
+            return price_wad(reserves[0], reserves[1], dec_a, dec_b) or None
+        elif t0 == b_addr and t1 == a_addr:
+            return price_wad(reserves[1], reserves[0], dec_a, dec_b) or None
+        return None
+
+    async def scan_prices(self) -> Dict[str, Dict[str, int]]:
+        """
+        Returns prices[dex][a-b] = price_b_per_a. Reserves come from the
+        Sync-fed state table, all current at one block, so cross-DEX spreads
+        compare a single consistent state; only Chainlink MATIC/USD is read,
+        at that same block. The block and the reserves are copied together
+        before any await, since the table keeps advancing while we wait.
+        """
+        out: Dict[str, Dict[str, int]] = {dex: {} for dex in DEXES.keys()}
+        quotes = [(dex, key, info) for dex, m in self.pairs.items() for key, info in m.items()]
+        self.block = self.state.block
+        reserves_at = {info["pair"]: self.state.get(info["pair"]) for _, _, info in quotes}
+        rd = None
         try:
-            pair = self.w3.eth.contract(pair_info["pair"], abi=PAIR_ABI)
-            reserves = await asyncio.to_thread(pair.functions.getReserves().call)
-            # map token0/token1 to a/b order
-            t0 = pair_info["t0"]
-            t1 = pair_info["t1"]
-            a_addr = STABLES[a]["addr"]
-            b_addr = STABLES[b]["addr"]
-            dec_a = STABLES[a]["dec"]
-            dec_b = STABLES[b]["dec"]
-            if Web3.to_checksum_address(t0) == a_addr and Web3.to_checksum_address(t1) == b_addr:
-                r0 = self._adj(reserves[0], dec_a)
-                r1 = self._adj(reserves[1], dec_b)
-                if r0 > 0:
-                    return r1 / r0
-            elif Web3.to_checksum_address(t0) == b_addr and Web3.to_checksum_address(t1) == a_addr:
-                r0 = self._adj(reserves[0], dec_b)
-                r1 = self._adj(reserves[1], dec_a)
-                if r1 > 0:
-                    return r0 / r1
-            return None
-        except Exception as e:
+            raw = await self.rpc.eth_call(CHAINLINK_MATIC_USD, "0x" + encode_call("latestRoundData()").hex(),
+                                          self.block or "latest")
+            rd = decode_result(["uint80", "int256", "uint256", "uint256", "uint80"], (True, raw))
+        except Exception:
+            pass
+        if rd is None:
             MET_ERRORS.inc()
-            jlog("error", event="price_error", dex=dex, pair=pair_info.get("pair"), err=str(e))
-            return None
-
-    async def scan_prices(self) -> Dict[str, Dict[str, Decimal]]:
-        """Returns prices[dex][a-b] = price_b_per_a"""
-        out: Dict[str, Dict[str, Decimal]] = {dex: {}} for dex in DEXES.keys()
-        tasks = []
-        for dex, m in self.pairs.items():
-            for key, info in m.items():
-                a, b = key.split("-")
-                tasks.append(self._fill_price(out, dex, key, info, a, b))
-        await asyncio.gather(*tasks)
-        return out
-
-    async def _fill_price(self, out, dex, key, info, a, b):
-        p = await self._pair_price(dex, info, a, b)
-        if p is not None:
-            out[dex][key] = p
+            jlog("error", event="chainlink_error", block=self.block)
+        # Chainlink price with 8 decimals
+        self.matic_usd_price = chainlink_wad(rd[1]) if rd else 0
 
-    async def _matic_usd_price(self) -> Decimal:
-        try:
-            roundData = await asyncio.to_thread(self.matic_usd.functions.latestRoundData().call)
-            # Chainlink price with 8 decimals
-            return Decimal(roundData[1]) / Decimal(10 ** 8)
-        except Exception as e:
-            MET_ERRORS.inc()
-            jlog("error", event="chainlink_error", err=str(e))
-            return Decimal("0")
+        for dex, key, info in quotes:
+            reserves = reserves_at[info["pair"]]
+            if reserves is None:
+                MET_ERRORS.inc()
+                jlog("error", event="price_error", dex=dex, pair=info.get("pair"), block=self.block)
+                continue
+            a, b = key.split("-")
+            p = self._pair_price(info, a, b, reserves)
+            if p is not None:
+                out[dex][key] = p
+        return out
 
-    async def detect_opps(self, prices: Dict[str, Dict[str, Decimal]]) -> List[Opportunity]:
+    async def detect_opps(self, prices: Dict[str, Dict[str, int]]) -> List[Opportunity]:
         opps: List[Opportunity] = []
         tokens = list(STABLES.keys())
-        matic_usd = await self._matic_usd_price()
-        gas_price_wei = self.w3.eth.gas_price
-        gas_cost_usd = (Decimal(gas_price_wei) * GAS_LIMIT_ARB / Decimal(1e18)) * matic_usd
-        flash_fee_usd = TRADE_SIZE_USD * (AAVE_FEE_BPS / Decimal(10000))
+        matic_usd = self.matic_usd_price
+        gas_price_wei = await self.rpc.gas_price()
+        gas_cost_usd = gas_cost_wad(gas_price_wei, GAS_LIMIT_ARB, matic_usd)
+        flash_fee_usd = percent_mul(TRADE_SIZE_USD, AAVE_FEE_BPS)
 
         for i in range(len(tokens)):
             for j in range(i + 1, len(tokens)):
                 a, b = tokens[i], tokens[j]
                 key = f"{a}-{b}"
                 # collect available dex quotes
-                dex_quotes: List[Tuple[str, Decimal]] = []
+                dex_quotes: List[Tuple[str, int]] = []
                 for dex in DEXES.keys():
                     p = prices.get(dex, {}).get(key)
                     if p is not None and p > 0:
@@ -261,13 +259,13 @@ class StablecoinPegMonitor:
                             (dex_a, dex_b, pa, pb),
                             (dex_b, dex_a, pb, pa),
                         ]:
+                            # spread over the mid price: 2 * spread / (sell + buy)
                             spread = abs(sell_p - buy_p)
-                            avg = (sell_p + buy_p) / 2
-                            spread_bps = int((spread / avg) * 10000)
+                            spread_bps = mul_div(2 * spread, BPS, sell_p + buy_p)
                             if spread_bps < SPREAD_BPS_THRESHOLD:
                                 continue
 
-                            gross = TRADE_SIZE_USD * (spread / avg)
+                            gross = mul_div(TRADE_SIZE_USD, 2 * spread, sell_p + buy_p)
                             net = gross - gas_cost_usd - flash_fee_usd
                             if net >= MIN_PROFIT_USD:
                                 opps.append(
@@ -276,15 +274,16 @@ class StablecoinPegMonitor:
                                         token_b=b,
                                         dex_buy=buy_dex,
                                         dex_sell=sell_dex,
-                                        price_buy=float(buy_p),
-                                        price_sell=float(sell_p),
+                                        price_buy=from_wad(buy_p),
+                                        price_sell=from_wad(sell_p),
                                         spread_bps=spread_bps,
-                                        gross_profit_usd=float(gross),
-                                        gas_cost_usd=float(gas_cost_usd),
-                                        flash_fee_usd=float(flash_fee_usd),
-                                        net_profit_usd=float(net),
-                                        amount_usd=float(TRADE_SIZE_USD),
+                                        gross_profit_usd=from_wad(gross),
+                                        gas_cost_usd=from_wad(gas_cost_usd),
+                                        flash_fee_usd=from_wad(flash_fee_usd),
+                                        net_profit_usd=from_wad(net),
+                                        amount_usd=from_wad(TRADE_SIZE_USD),
                                         ts=int(time.time()),
+                                        block=self.block,
                                     )
                                 )
 
@@ -324,8 +323,17 @@ class StablecoinPegMonitor:
         start_http_server(METRICS_PORT)
         await self.init()
         jlog("info", event="stablecoin_monitor_started", interval=SCAN_INTERVAL_SEC, spread_bps=SPREAD_BPS_THRESHOLD)
+        asyncio.create_task(rpc_summary_loop(jlog))
+
+        asyncio.create_task(self.state.run())
+        updates = self.state.subscribe()
+        tracked = {info["pair"] for m in self.pairs.values() for info in m.values()}
 
         while True:
+            # re-price only when a block moved one of the stable pairs
+            _, changed = await ReserveState.changes(updates, timeout=SCAN_INTERVAL_SEC)
+            if not changed & tracked:
+                continue
             t0 = time.perf_counter()
             try:
                 if await self.paused():
@@ -346,11 +354,7 @@ class StablecoinPegMonitor:
                 jlog("error", event="main_loop_error", err=str(e))
                 await asyncio.sleep(1.0)
 
-            dur = time.perf_counter() - t0
-            MET_SCAN_LAT.observe(dur)
-            # keep loop pacing stable
-            sleep_left = max(0.0, SCAN_INTERVAL_SEC - dur)
-            await asyncio.sleep(sleep_left)
+            MET_SCAN_LAT.observe(time.perf_counter() - t0)
 
 
 if __name__ == "__main__":
@@ -1,8 +1,10 @@
 # bots/triangular_arbitrage.py
 """
 ATOM Triangular Arbitrage Scanner (Polygon mainnet)
-- Discovers 3-token cycles across QuickSwap & Sushi
+- Discovers 3-token cycles across QuickSwap & Sushi, and 4..TRI_MAX_HOPS-leg ones
+  through the bridge tokens by a depth-bounded, bound-pruned DFS over the -log(rate) graph
 - Prices edges from on-chain reserves with proper decimals and DEX fees
+- Sizes each cycle by its closed-form optimal input and exact output
 - Estimates net PnL with Chainlink gas costing and Aave flash fee
 - Publishes signals to Redis Stream 'atom:opps:triangular'
 - Prometheus metrics on METRICS_PORT
@@ -15,14 +17,28 @@ import asyncio
 import json
 import time
 import logging
+import collections
 from dataclasses import dataclass, asdict
-from decimal import Decimal
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, List, Optional, Sequence, Tuple
 
+import numpy as np
 import redis.asyncio as redis
 from prometheus_client import Counter, Gauge, Histogram, start_http_server
 from web3 import Web3, HTTPProvider
 
+from backend_bots.atom_core.rpc_pool import RPCPool
+from backend_bots.atom_core.cycle_graph import RateGraph
+from backend_bots.atom_core.cp_cycle import cycle_output, optimal_input
+from backend_bots.atom_core.fixed_point import (
+    BPS, WAD, chainlink_wad, from_wad, gas_cost_wad, mul_div, parse_wad, percent_mul, price_wad,
+)
+from backend_bots.atom_core.multicall import decode_result, encode_call
+from backend_bots.atom_core.rpc_metrics import summary_loop as rpc_summary_loop
+from backend_bots.atom_core.pair_index import PairIndex
+from backend_bots.atom_core.reserve_state import ReserveState
+from backend_bots.atom_core.shm_reserves import open_reserves
+from backend_bots.atom_core.token_meta import TokenRegistry
+
 # ---------- Env ----------
 
 def _env(name: str, default: Optional[str] = None, required: bool = False) -> str:
@@ -32,17 +48,30 @@ def _env(name: str, default: Optional[str] = None, required: bool = False) -> st
     return "" if v is None else str(v)
 
 RPC_URL = _env("POLYGON_RPC_URL", required=True)
+# Optional backups; reads fail over (and hedge when RPC_HEDGE=true) across all of them
+RPC_URLS = [u for u in (RPC_URL, _env("POLYGON_RPC_BACKUP"), _env("POLYGON_RPC_BACKUP2")) if u]
 REDIS_URL = _env("REDIS_URL", required=True)
 
 # Scan cadence & discovery
 SCAN_INTERVAL_SEC = float(_env("TRI_SCAN_INTERVAL_SEC", "3.0"))
 DISCOVERY_INTERVAL_SEC = float(_env("TRI_DISCOVERY_INTERVAL_SEC", "900"))
 
-# Economics
-TRADE_SIZE_USD = Decimal(_env("TRI_TRADE_SIZE_USD", "25000"))
-AAVE_FLASH_FEE_BPS = Decimal(_env("AAVE_FLASH_FEE_BPS", "9"))
-MIN_NET_PROFIT_USD = Decimal(_env("TRI_MIN_NET_PROFIT_USD", "75"))
+# Economics (USD in WAD, see atom_core.fixed_point)
+# Notional cap per cycle; below it the size is solved per cycle from the reserves
+TRADE_SIZE_USD = parse_wad(_env("TRI_TRADE_SIZE_USD", "25000"))
+AAVE_FLASH_FEE_BPS = int(_env("AAVE_FLASH_FEE_BPS", "9"))
+MIN_NET_PROFIT_USD = parse_wad(_env("TRI_MIN_NET_PROFIT_USD", "75"))
 GAS_LIMIT_TRI = int(_env("TRI_GAS_LIMIT", "650000"))
+# Best cycles kept between blocks and considered for signals each scan
+TOP_K = int(_env("TRI_TOP_K", "25"))
+# Longest cycle the rate-graph search looks for; 3 keeps the scanner to triangles
+MAX_HOPS = int(_env("TRI_MAX_HOPS", "5"))
+# Tokens a longer cycle may start from (flash-loan assets)
+CYCLE_SOURCES = [s.strip() for s in _env("TRI_CYCLE_SOURCES", "WMATIC,WETH,USDC,USDT,DAI").split(",") if s.strip()]
+# Extra tokens from the pair index: those paired with at least two TOKENS, most connected first (0 = TOKENS only)
+UNIVERSE_MAX = int(_env("TRI_UNIVERSE_MAX", "0"))
+# Return bounds only tighten between blocks; recompute them once this many edges have worsened
+BOUND_REBUILD_EDGES = int(_env("TRI_BOUND_REBUILD_EDGES", "256"))
 
 # Streams/metrics/controls
 METRICS_PORT = int(_env("METRICS_PORT", "9112"))
@@ -109,6 +138,12 @@ MET_ERRORS       = Counter("atom_tri_errors_total", "Errors")
 MET_OPPS         = Counter("atom_tri_opportunities_total", "Opportunities")
 MET_BEST_NET     = Gauge("atom_tri_best_net_profit_usd", "Best net profit last scan")
 MET_TRIANGLES    = Gauge("atom_tri_triangles_scanned", "Triangles scanned per loop")
+MET_TOUCHED      = Histogram("atom_tri_triangles_touched", "Triangles re-evaluated per block",
+                             buckets=(0, 1, 5, 10, 25, 50, 100, 250, 500, 1000, 5000))
+MET_TRI_INDEXED  = Gauge("atom_tri_triangles_indexed", "Oriented triangles with a pair on every edge")
+MET_UNIVERSE     = Gauge("atom_tri_tokens", "Tokens in the scanned graph")
+MET_CYCLES       = Gauge("atom_tri_cycles_found", "Cycles of four or more legs above the gain floor, last scan")
+MET_BOUND_REBUILDS = Counter("atom_tri_bound_rebuilds_total", "Full recomputes of the cycle-search return bounds")
 
 # ---------- Models ----------
 @dataclass
@@ -133,21 +168,63 @@ class TriSignal:
     flash_fee_usd: float
     net_profit_usd: float
     amount_usd: float
+    # optimal input and exact output, in base units of token a
+    amount_in: str
+    amount_out: str
+    ts: int
+
+@dataclass
+class CycleSignal:
+    # tokens[0] == tokens[-1]; leg i swaps tokens[i] -> tokens[i+1] on dexes[i]
+    tokens: List[str]
+    symbols: List[str]
+    dexes: List[str]
+    prices: List[float]
+    legs: int
+    product: float
+    gross_profit_usd: float
+    gas_cost_usd: float
+    flash_fee_usd: float
+    net_profit_usd: float
+    amount_usd: float
+    # optimal input and exact output, in base units of tokens[0]
+    amount_in: str
+    amount_out: str
     ts: int
 
 # ---------- Scanner ----------
 class TriangularArbScanner:
     def __init__(self):
         self.w3 = Web3(HTTPProvider(RPC_URL, request_kwargs={"timeout": 10}))
+        self.rpc = RPCPool(RPC_URLS)
         self.redis: Optional[redis.Redis] = None
         self.factories = {name: self.w3.eth.contract(info["factory"], abi=FACTORY_ABI) for name, info in DEXES.items()}
         self.matic_usd = self.w3.eth.contract(CHAINLINK_MATIC_USD, abi=CL_AGG_ABI)
 
         # caches
         self.pairs: Dict[str, Dict[Tuple[str, str], str]] = {dex: {} for dex in DEXES.keys()}  # (a,b)->pair
+        self.meta = TokenRegistry(self.rpc, 137)
+        self.index = PairIndex(self.rpc, {name: info["factory"] for name, info in DEXES.items()}, 137)
+        self.state = open_reserves(self.rpc, 137)  # reserves of every discovered pair, fed by Sync logs
+        self.pair_tokens: Dict[str, Tuple[str, str]] = self.meta.pair_tokens  # pair -> (token0, token1)
         self.decimals: Dict[str, int] = {}
         self.symbols: Dict[str, str] = {}
 
+        # incremental search: oriented cycles, pair -> cycles using it, each cycle
+        # as token indices into the rate matrix, and its float product as of its last evaluation
+        self.triangles: List[Tuple[str, str, str]] = []
+        self.pair_triangles: Dict[str, List[int]] = {}
+        self.tri_idx = np.zeros((0, 3), dtype=np.intp)
+        self.products = np.zeros(0)
+        self.tok_idx: Dict[str, int] = {}
+        self.rates = np.zeros((0, 0))  # best after-fee rate src -> dst, 0 where there is no pair
+        self.dirty: Optional[set] = None  # pairs changed since the last scan; None = re-evaluate everything
+        # every scanned token (TOKENS first), the pairs among them, and best-rate edges for longer cycles
+        self.universe: List[str] = list(TOKENS.values())
+        self.indexed_pairs: set = set()
+        self.graph = RateGraph()
+        self.graph.track([TOKENS[s] for s in CYCLE_SOURCES if s in TOKENS], max(MAX_HOPS - 1, 0))
+
         self._ensure_chain()
 
     def _ensure_chain(self):
@@ -157,6 +234,7 @@ class TriangularArbScanner:
 
     async def init(self):
         self.redis = await redis.from_url(REDIS_URL, encoding="utf-8", decode_responses=True)
+        await asyncio.gather(self.meta.load(self.redis), self.index.load(self.redis))
         await self._discover_pairs()
         await self._prime_token_metadata()
         jlog("info", event="init", rpc=RPC_URL, redis=REDIS_URL,
@@ -164,26 +242,30 @@ class TriangularArbScanner:
 
     # ---------- Discovery ----------
     async def _discover_pairs(self):
+        """
+        Pairs among TOKENS from the PairCreated index; only blocks since the last
+        sync are scanned. A cold index catches up in the background, and the pairs
+        among TOKENS are read with getPair until it is current.
+        """
         t0 = time.perf_counter()
-        tokens = list(TOKENS.values())
-        async def get_pair_once(dex: str, a: str, b: str):
-            try:
-                fa = self.factories[dex]
-                addr = await asyncio.to_thread(fa.functions.getPair(a, b).call)
-                if addr and int(addr, 16) != 0:
-                    self.pairs[dex][(a, b)] = Web3.to_checksum_address(addr)
-                    self.pairs[dex][(b, a)] = Web3.to_checksum_address(addr)
-            except Exception as e:
-                MET_ERRORS.inc()
-                jlog("error", event="getPair_error", dex=dex, a=a, b=b, err=str(e))
-
-        tasks = []
-        for i in range(len(tokens)):
-            for j in range(i + 1, len(tokens)):
-                a, b = tokens[i], tokens[j]
-                for dex in DEXES.keys():
-                    tasks.append(get_pair_once(dex, a, b))
-        await asyncio.gather(*tasks)
+        try:
+            new = 0
+            if not await self.index.refresh():
+                core = list(TOKENS.values())
+                new = await self.index.lookup((dex, a, b) for dex in DEXES for i, a in enumerate(core) for b in core[i + 1:])
+        except Exception as e:
+            MET_ERRORS.inc()
+            jlog("error", event="pair_index_error", err=str(e))
+            new = 0
+        self.universe = self._universe()
+        MET_UNIVERSE.set(len(self.universe))
+        for dex, a, b, pair in self.index.pairs_among(self.universe):
+            self.pairs[dex][(a, b)] = pair
+            self.pairs[dex][(b, a)] = pair
+            self.pair_tokens[pair] = (a, b)
+        await self._load_pair_tokens()
+        self.state.track(self.pair_tokens)
+        jlog("info", event="pairs_discovered", new_indexed=new, pairs=sum(len(m) for m in self.pairs.values()) // 2)
 
         # persist in Redis for visibility
         try:
@@ -196,23 +278,32 @@ class TriangularArbScanner:
 
         MET_DISCOVER_LAT.observe(time.perf_counter() - t0)
 
+    def _universe(self) -> List[str]:
+        """TOKENS plus up to UNIVERSE_MAX indexed tokens that could close a cycle through them."""
+        core = list(TOKENS.values())
+        if UNIVERSE_MAX <= 0:
+            return core
+        links = collections.Counter(t for c in core for t in self.index.neighbors(c) if t not in TOKENS.values())
+        return core + [t for t, n in links.most_common() if n >= 2][:UNIVERSE_MAX]
+
+    async def _load_pair_tokens(self):
+        try:
+            await self.meta.ensure_pairs({p for m in self.pairs.values() for p in m.values()})
+        except Exception as e:
+            MET_ERRORS.inc()
+            jlog("error", event="pair_tokens_error", err=str(e))
+
     async def _prime_token_metadata(self):
-        async def fetch_one(addr: str):
-            if addr in self.decimals and addr in self.symbols:
-                return
-            try:
-                erc = self.w3.eth.contract(addr, abi=ERC20_ABI)
-                dec = await asyncio.to_thread(erc.functions.decimals().call)
-                sym = await asyncio.to_thread(erc.functions.symbol().call)
-                self.decimals[addr] = int(dec)
-                self.symbols[addr] = str(sym)
-            except Exception:
-                # fallbacks
-                self.decimals.setdefault(addr, 6 if addr in (USDC, USDT) else 18)
-                self.symbols.setdefault(addr, next((s for s,a in TOKENS.items() if a == addr), addr[:6]))
-
-        tasks = [fetch_one(a) for a in TOKENS.values()]
-        await asyncio.gather(*tasks)
+        try:
+            await self.meta.ensure_tokens(self.universe)
+        except Exception as e:
+            MET_ERRORS.inc()
+            jlog("error", event="token_meta_error", err=str(e))
+        for addr in self.universe:
+            # fallbacks until the registry has a real read
+            self.decimals[addr] = self.meta.decimals.get(addr, 6 if addr in (USDC, USDT) else 18)
+            self.symbols[addr] = self.meta.symbols.get(addr, next((s for s, a in TOKENS.items() if a == addr), addr[:6]))
+        self._index_triangles()
 
         # persist
         try:
@@ -224,111 +315,320 @@ class TriangularArbScanner:
             jlog("error", event="redis_set_meta", err=str(e))
 
     # ---------- Pricing ----------
-    def _edge_price_after_fee(self, pair_addr: str, src: str, dst: str, fee_bps: int) -> Optional[Decimal]:
+    async def _snapshot(self) -> Tuple[int, Dict[str, Tuple[int, int]], int]:
+        """
+        Reserves from the Sync-fed state table (no network) plus Chainlink MATIC/USD
+        read at the table's block. Returns (block, pair -> (r0, r1), matic_usd WAD).
+        The reserves are a shallow copy taken with the block before any await: the
+        live table is advanced by Sync logs while the Chainlink read is in flight.
+        """
+        block = self.state.block
+        reserves = dict(self.state.reserves)
+        rd = None
         try:
-            pair = self.w3.eth.contract(pair_addr, abi=PAIR_ABI)
-            t0 = Web3.to_checksum_address(pair.functions.token0().call())
-            t1 = Web3.to_checksum_address(pair.functions.token1().call())
-            r0, r1, _ = pair.functions.getReserves().call()
-
-            d0 = self.decimals.get(t0, 18)
-            d1 = self.decimals.get(t1, 18)
-
-            if t0 == src and t1 == dst and r0 > 0:
-                price = (Decimal(r1) / Decimal(10**d1)) / (Decimal(r0) / Decimal(10**d0))
-            elif t0 == dst and t1 == src and r1 > 0:
-                price = (Decimal(r0) / Decimal(10**d0)) / (Decimal(r1) / Decimal(10**d1))
-            else:
-                return None
-
-            return price * (Decimal(10000 - fee_bps) / Decimal(10000))
-        except Exception as e:
+            raw = await self.rpc.eth_call(self.matic_usd.address, "0x" + encode_call("latestRoundData()").hex(), block or "latest")
+            rd = decode_result(["uint80", "int256", "uint256", "uint256", "uint80"], (True, raw))
+        except Exception:
+            pass
+        if rd is None:
             MET_ERRORS.inc()
-            jlog("error", event="price_error", pair=pair_addr, src=src, dst=dst, err=str(e))
+            jlog("error", event="chainlink_error", block=block)
+        matic_usd = chainlink_wad(rd[1]) if rd else 0
+        return block, reserves, matic_usd
+
+    def _edge_price_after_fee(self, reserves: Dict[str, Tuple[int, int]], pair_addr: str,
+                              src: str, dst: str, fee_bps: int) -> Optional[int]:
+        """Whole dst per whole src after the fee, in WAD."""
+        tokens = self.pair_tokens.get(pair_addr)
+        res = reserves.get(pair_addr)
+        if tokens is None or res is None:
+            return None
+        t0, t1 = tokens
+        r0, r1 = res
+
+        if t0 == src and t1 == dst:
+            r_in, r_out = r0, r1
+        elif t0 == dst and t1 == src:
+            r_in, r_out = r1, r0
+        else:
             return None
+        return price_wad(r_in, r_out, self.decimals.get(src, 18), self.decimals.get(dst, 18), fee_bps) or None
 
-    async def _best_direct_price(self, src: str, dst: str) -> Tuple[Optional[Decimal], Optional[str]]:
-        best: Optional[Decimal] = None
+    def _best_direct_price(self, reserves: Dict[str, Tuple[int, int]], src: str, dst: str) -> Tuple[Optional[int], Optional[str]]:
+        best: Optional[int] = None
         best_dex: Optional[str] = None
         for dex, m in self.pairs.items():
             pair = m.get((src, dst))
             if not pair:
                 continue
             fee = DEXES[dex]["fee_bps"]
-            p = await asyncio.to_thread(self._edge_price_after_fee, pair, src, dst, fee)
+            p = self._edge_price_after_fee(reserves, pair, src, dst, fee)
             if p and p > 0 and (best is None or p > best):
                 best = p
                 best_dex = dex
         return best, best_dex
 
-    async def _matic_usd(self) -> Decimal:
-        try:
-            rd = await asyncio.to_thread(self.matic_usd.functions.latestRoundData().call)
-            return Decimal(rd[1]) / Decimal(10**8)
-        except Exception as e:
-            MET_ERRORS.inc()
-            jlog("error", event="chainlink_error", err=str(e))
-            return Decimal("0")
-
     # ---------- Triangle search ----------
-    async def scan_triangles(self) -> List[TriSignal]:
-        tokens = list(TOKENS.values())
-        triangles_scanned = 0
-        signals: List[TriSignal] = []
-
-        matic_usd = await self._matic_usd()
-        gas_price = self.w3.eth.gas_price
-        gas_cost_usd = (Decimal(gas_price) * Decimal(GAS_LIMIT_TRI) / Decimal(1e18)) * matic_usd
-        flash_fee_usd = TRADE_SIZE_USD * (AAVE_FLASH_FEE_BPS / Decimal(10000))
-
-        n = len(tokens)
-        for i in range(n):
-            for j in range(i+1, n):
-                for k in range(j+1, n):
-                    a, b, c = tokens[i], tokens[j], tokens[k]
-
-                    # Try both orientations: a->b->c->a and a->c->b->a
-                    for order in ((a,b,c), (a,c,b)):
-                        x, y, z = order
-                        p_xy, dex_xy = await self._best_direct_price(x, y)
-                        p_yz, dex_yz = await self._best_direct_price(y, z)
-                        p_zx, dex_zx = await self._best_direct_price(z, x)
-                        triangles_scanned += 1
-
-                        if not (p_xy and p_yz and p_zx):
-                            continue
-
-                        product = p_xy * p_yz * p_zx
-                        profit_ratio = product - Decimal(1)
-
-                        if profit_ratio <= Decimal(0):
-                            continue
-
-                        gross = TRADE_SIZE_USD * profit_ratio
-                        net = gross - gas_cost_usd - flash_fee_usd
-                        if net < MIN_NET_PROFIT_USD:
-                            continue
-
-                        sig = TriSignal(
-                            a=x, b=y, c=z,
-                            a_symbol=self.symbols.get(x, x[:6]),
-                            b_symbol=self.symbols.get(y, y[:6]),
-                            c_symbol=self.symbols.get(z, z[:6]),
-                            dex_ab=dex_xy or "unknown",
-                            dex_bc=dex_yz or "unknown",
-                            dex_ca=dex_zx or "unknown",
-                            p_ab=float(p_xy), p_bc=float(p_yz), p_ca=float(p_zx),
-                            product=float(product),
-                            gross_profit_usd=float(gross),
-                            gas_cost_usd=float(gas_cost_usd),
-                            flash_fee_usd=float(flash_fee_usd),
-                            net_profit_usd=float(net),
-                            amount_usd=float(TRADE_SIZE_USD),
-                            ts=int(time.time()),
-                        )
-                        signals.append(sig)
-
-        MET_TRIANGLES.set(triangles_scanned)
+    def _index_triangles(self):
+        """
+        Rebuild the oriented cycle list and the pair -> cycles index from the
+        discovered pairs, walking the pair adjacency rather than every token
+        triple. Everything is re-evaluated on the next scan.
+        """
+        order = {t: i for i, t in enumerate(self.universe)}
+        adj: Dict[str, set] = {}
+        for m in self.pairs.values():
+            for a, b in m:
+                if a in order and b in order:
+                    adj.setdefault(a, set()).add(b)
+        triangles: List[Tuple[str, str, str]] = []
+        pair_triangles: Dict[str, List[int]] = {}
+        for x, nx in adj.items():
+            # x is the lowest-ordered token of each cycle it starts, so every oriented cycle appears once
+            for y in nx:
+                if order[y] <= order[x]:
+                    continue
+                for z in adj.get(y, ()):
+                    if order[z] <= order[x] or x not in adj.get(z, ()):
+                        continue
+                    idx = len(triangles)
+                    triangles.append((x, y, z))
+                    for src, dst in ((x, y), (y, z), (z, x)):
+                        for m in self.pairs.values():
+                            pair = m.get((src, dst))
+                            if pair and idx not in pair_triangles.get(pair, ()):
+                                pair_triangles.setdefault(pair, []).append(idx)
+        self.triangles = triangles
+        self.pair_triangles = pair_triangles
+        self.indexed_pairs = {p for m in self.pairs.values() for p in m.values()}
+        self.tok_idx = {t: i for i, t in enumerate(self.universe)}
+        self.rates = np.zeros((len(self.universe), len(self.universe)))
+        self.tri_idx = np.array([[self.tok_idx[t] for t in tri] for tri in triangles], dtype=np.intp).reshape(-1, 3)
+        self.products = np.zeros(len(triangles))
+        self.dirty = None
+        MET_TRI_INDEXED.set(len(triangles))
+
+    def _evaluate(self, reserves: Dict[str, Tuple[int, int]], idx: int):
+        """Exact WAD re-price of one shortlisted cycle: (product, prices, dexes), or None if it is not above 1."""
+        x, y, z = self.triangles[idx]
+        p_xy, dex_xy = self._best_direct_price(reserves, x, y)
+        p_yz, dex_yz = self._best_direct_price(reserves, y, z)
+        p_zx, dex_zx = self._best_direct_price(reserves, z, x)
+        if not (p_xy and p_yz and p_zx):
+            return None
+        product = mul_div(mul_div(p_xy, p_yz, WAD), p_zx, WAD)
+        if product <= WAD:
+            return None
+        return product, (p_xy, p_yz, p_zx), (dex_xy, dex_yz, dex_zx)
+
+    def _edge_rate(self, reserves: Dict[str, Tuple[int, int]], pair: str, src: str, dst: str,
+                   fee_bps: int) -> Optional[float]:
+        """_edge_price_after_fee in float, for the rate matrix."""
+        tokens = self.pair_tokens.get(pair)
+        res = reserves.get(pair)
+        if tokens is None or res is None:
+            return None
+        (t0, t1), (r0, r1) = tokens, res
+        if t0 == src and t1 == dst:
+            r_in, r_out = r0, r1
+        elif t0 == dst and t1 == src:
+            r_in, r_out = r1, r0
+        else:
+            return None
+        if r_in <= 0 or r_out <= 0:
+            return None
+        scale = 10.0 ** (self.decimals.get(src, 18) - self.decimals.get(dst, 18))
+        return r_out / r_in * scale * (10000 - fee_bps) / 10000
+
+    def _refresh_rates(self, reserves: Dict[str, Tuple[int, int]], pairs, tighten: bool = True) -> None:
+        """
+        Re-price both directions of the token pair behind each of `pairs` on its
+        best DEX, into the rate matrix and the cycle graph. tighten=False skips the
+        incremental bound updates; the caller rebuilds the bounds afterwards.
+        """
+        done = set()
+        for pair in pairs:
+            tokens = self.pair_tokens.get(pair)
+            if tokens is None or tokens in done:
+                continue
+            done.add(tokens)
+            a, b = tokens
+            for src, dst in ((a, b), (b, a)):
+                best, best_dex = 0.0, None
+                for dex, m in self.pairs.items():
+                    p = m.get((src, dst))
+                    rate = self._edge_rate(reserves, p, src, dst, DEXES[dex]["fee_bps"]) if p else None
+                    if rate and rate > best:
+                        best, best_dex = rate, dex
+                i, j = self.tok_idx.get(src), self.tok_idx.get(dst)
+                if i is not None and j is not None:
+                    self.rates[i, j] = best
+                self.graph.set_edge(src, dst, best or None, best_dex, tighten)
+
+    def _start_at_source(self, body: Sequence[str]) -> int:
+        """Offset that starts the cycle at a flash-loan token, in TRI_CYCLE_SOURCES order; 0 if it has none."""
+        for s in CYCLE_SOURCES:
+            if TOKENS.get(s) in body:
+                return body.index(TOKENS[s])
+        return 0
+
+    def _usd_price(self, reserves: Dict[str, Tuple[int, int]], token: str, matic_usd: int) -> Optional[int]:
+        """USD per whole token in WAD: stables at par, WMATIC from Chainlink, others by their best USDC or WMATIC rate."""
+        if token in (USDC, USDT, TOKENS.get("DAI")):
+            return WAD
+        wmatic = TOKENS.get("WMATIC")
+        if token == wmatic:
+            return matic_usd or None
+        p, _ = self._best_direct_price(reserves, token, USDC)
+        if p:
+            return p
+        p, _ = self._best_direct_price(reserves, token, wmatic) if wmatic else (None, None)
+        if p and matic_usd:
+            return mul_div(p, matic_usd, WAD)
+        return None
+
+    def _size(self, reserves: Dict[str, Tuple[int, int]], body: Sequence[str], dexes: Sequence[str],
+              matic_usd: int) -> Optional[Tuple[int, int, int, int]]:
+        """
+        Optimal input for the cycle from body[0] (closed form net of the flash fee,
+        capped at TRADE_SIZE_USD) and its exact output: (amount in, amount out,
+        size USD, gross profit USD), USD in WAD. None if it cannot be priced or does not pay.
+        """
+        hops = []
+        for (src, dst), dex in zip(zip(body, list(body[1:]) + [body[0]]), dexes):
+            pair = self.pairs.get(dex, {}).get((src, dst))
+            tokens, res = self.pair_tokens.get(pair), reserves.get(pair)
+            if not (tokens and res):
+                return None
+            r_in, r_out = res if tokens[0] == src else res[::-1]
+            hops.append((r_in, r_out, 10000 - DEXES[dex]["fee_bps"], 10000))
+        price = self._usd_price(reserves, body[0], matic_usd)
+        if not price:
+            return None
+        unit = 10 ** self.decimals.get(body[0], 18)
+        amount_in = min(optimal_input(hops, AAVE_FLASH_FEE_BPS), mul_div(TRADE_SIZE_USD, unit, price))
+        if amount_in <= 0:
+            return None
+        out = cycle_output(amount_in, hops)
+        return amount_in, out, mul_div(amount_in, price, unit), mul_div(out - amount_in, price, unit)
+
+    def _scan_cycles(self, reserves: Dict[str, Tuple[int, int]], gas_cost_usd: int,
+                     matic_usd: int) -> List[CycleSignal]:
+        """Cycles of 4..MAX_HOPS legs through the flash-loan tokens, by pruned DFS over the rate graph."""
+        if MAX_HOPS < 4:
+            return []
+        # a cycle whose first unit does not beat the flash fee cannot pay at any size
+        found = self.graph.cycles(MAX_HOPS, min_len=4, min_gain=AAVE_FLASH_FEE_BPS / BPS)
+        MET_CYCLES.set(len(found))
+        out: List[CycleSignal] = []
+        for product, cycle in found[:TOP_K]:
+            body = list(cycle[:-1])
+            k = self._start_at_source(body)
+            body = body[k:] + body[:k]
+            edges = [self.graph.edge(u, v) for u, v in zip(body, body[1:] + body[:1])]
+            dexes = [e[1] for e in edges]
+            sized = self._size(reserves, body, dexes, matic_usd)
+            if sized is None:
+                continue
+            amount_in, amount_out, size_usd, gross = sized
+            legs = len(body)
+            gas = gas_cost_usd * legs // 3  # TRI_GAS_LIMIT covers three swaps
+            flash = percent_mul(size_usd, AAVE_FLASH_FEE_BPS)
+            net = gross - gas - flash
+            if net < MIN_NET_PROFIT_USD:
+                continue
+            out.append(CycleSignal(
+                tokens=body + body[:1],
+                symbols=[self.symbols.get(t, t[:6]) for t in body + body[:1]],
+                dexes=[d or "unknown" for d in dexes],
+                prices=[e[0] for e in edges],
+                legs=legs,
+                product=product,
+                gross_profit_usd=from_wad(gross),
+                gas_cost_usd=from_wad(gas),
+                flash_fee_usd=from_wad(flash),
+                net_profit_usd=from_wad(net),
+                amount_usd=from_wad(size_usd),
+                amount_in=str(amount_in),
+                amount_out=str(amount_out),
+                ts=int(time.time()),
+            ))
+        return out
+
+    async def scan_triangles(self) -> List:
+        """
+        Re-price the edges of pairs that changed since the last scan, then the
+        cycles through them as one gather-and-multiply over the rate matrix. The
+        top-K floats are re-checked in integer WAD and become signals at current gas
+        cost, next to any longer cycles the rate-graph search finds. Best net first.
+        """
+        signals: List = []
+
+        # one round-trip: the oracle read and gas price share an HTTP batch
+        (block, reserves, matic_usd), gas_price = await asyncio.gather(self._snapshot(), self.rpc.gas_price())
+        if self.rpc.call_cache is not None:
+            self.rpc.call_cache.advance(block)
+        gas_cost_usd = gas_cost_wad(gas_price, GAS_LIMIT_TRI, matic_usd)
+
+        if self.dirty is None:
+            touched = np.arange(len(self.triangles), dtype=np.intp)
+            # bulk load, then one rebuild: tightening edge by edge would be wasted work
+            self.graph.clear()
+            self._refresh_rates(reserves, self.indexed_pairs, tighten=False)
+            self.graph.rebuild()
+        else:
+            touched = np.fromiter({idx for p in self.dirty for idx in self.pair_triangles.get(p, ())}, dtype=np.intp)
+            self._refresh_rates(reserves, self.dirty)
+            if self.graph.loosened > BOUND_REBUILD_EDGES:
+                self.graph.rebuild()
+                MET_BOUND_REBUILDS.inc()
+        self.dirty = set()
+        if len(touched):
+            x, y, z = self.tri_idx[touched].T
+            self.products[touched] = self.rates[x, y] * self.rates[y, z] * self.rates[z, x]
+        MET_TOUCHED.observe(len(touched))
+        MET_TRIANGLES.set(len(touched))
+
+        above = np.flatnonzero(self.products > 1.0)
+        if len(above) > TOP_K:
+            above = above[np.argpartition(self.products[above], -TOP_K)[-TOP_K:]]
+        shortlist = [(idx, self._evaluate(reserves, idx)) for idx in above.tolist()]
+        shortlist = sorted(((i, c) for i, c in shortlist if c), key=lambda ic: ic[1][0], reverse=True)
+
+        for idx, (product, prices, dexes) in shortlist:
+            k = self._start_at_source(self.triangles[idx])
+            x, y, z = self.triangles[idx][k:] + self.triangles[idx][:k]
+            p_xy, p_yz, p_zx = prices[k:] + prices[:k]
+            dex_xy, dex_yz, dex_zx = dexes[k:] + dexes[:k]
+            sized = self._size(reserves, (x, y, z), (dex_xy, dex_yz, dex_zx), matic_usd)
+            if sized is None:
+                continue
+            amount_in, amount_out, size_usd, gross = sized
+            flash = percent_mul(size_usd, AAVE_FLASH_FEE_BPS)
+            net = gross - gas_cost_usd - flash
+            if net < MIN_NET_PROFIT_USD:
+                continue
+            sig = TriSignal(
+                a=x, b=y, c=z,
+                a_symbol=self.symbols.get(x, x[:6]),
+                b_symbol=self.symbols.get(y, y[:6]),
+                c_symbol=self.symbols.get(z, z[:6]),
+                dex_ab=dex_xy or "unknown",
+                dex_bc=dex_yz or "unknown",
+                dex_ca=dex_zx or "unknown",
+                p_ab=from_wad(p_xy), p_bc=from_wad(p_yz), p_ca=from_wad(p_zx),
+                product=from_wad(product),
+                gross_profit_usd=from_wad(gross),
+                gas_cost_usd=from_wad(gas_cost_usd),
+                flash_fee_usd=from_wad(flash),
+                net_profit_usd=from_wad(net),
+                amount_usd=from_wad(size_usd),
+                amount_in=str(amount_in),
+                amount_out=str(amount_out),
+                ts=int(time.time()),
+            )
+            signals.append(sig)
+        signals.extend(self._scan_cycles(reserves, gas_cost_usd, matic_usd))
         signals.sort(key=lambda s: s.net_profit_usd, reverse=True)
         return signals
 
@@ -367,7 +667,8 @@ class TriangularArbScanner:
         await self.init()
         jlog("info", event="triangular_scanner_started",
              pairs=sum(len(v) for v in self.pairs.values()),
-             min_net=float(MIN_NET_PROFIT_USD), trade_usd=float(TRADE_SIZE_USD))
+             min_net=from_wad(MIN_NET_PROFIT_USD), trade_usd=from_wad(TRADE_SIZE_USD))
+        asyncio.create_task(rpc_summary_loop(jlog))
 
         async def periodic_discovery():
             while True:
@@ -377,10 +678,23 @@ class TriangularArbScanner:
                 except Exception as e:
                     MET_ERRORS.inc()
                     jlog("error", event="periodic_discovery_error", err=str(e))
-                await asyncio.sleep(DISCOVERY_INTERVAL_SEC)
+                # rediscover as soon as a background catch-up lands, not a full interval later
+                if self.index.catching_up:
+                    await self.index.wait_caught_up(DISCOVERY_INTERVAL_SEC)
+                else:
+                    await asyncio.sleep(DISCOVERY_INTERVAL_SEC)
         asyncio.create_task(periodic_discovery())
+        asyncio.create_task(self.state.run())
+        updates = self.state.subscribe()
 
         while True:
+            # wake on a block that moved one of our pairs; quiet blocks cost nothing
+            _, changed = await ReserveState.changes(updates, timeout=SCAN_INTERVAL_SEC)
+            changed &= self.indexed_pairs
+            if self.dirty is not None:
+                self.dirty |= changed
+            if not changed:
+                continue
             t0 = time.perf_counter()
             try:
                 if await self.paused():
@@ -395,7 +709,6 @@ class TriangularArbScanner:
                 jlog("error", event="main_loop_error", err=str(e))
                 await asyncio.sleep(1.0)
             MET_SCAN_LAT.observe(time.perf_counter() - t0)
-            await asyncio.sleep(max(0.0, SCAN_INTERVAL_SEC - (time.perf_counter() - t0)))
 
 
 if __name__ == "__main__":
@@ -17,7 +17,6 @@ import time
 import logging
 from collections import deque
 from dataclasses import dataclass, asdict
-from decimal import Decimal
 from typing import Dict, List, Optional, Tuple
 
 import aiohttp
@@ -25,6 +24,13 @@ import redis.asyncio as redis
 from prometheus_client import Counter, Gauge, Histogram, start_http_server
 from web3 import Web3, HTTPProvider
 
+from backend_bots.atom_core.pair_index import PairIndex
+from backend_bots.atom_core.shm_reserves import open_reserves
+from backend_bots.atom_core.rpc_pool import RPCPool
+from backend_bots.atom_core.fixed_point import (
+    WAD, chainlink_wad, from_wad, gas_cost_wad, mul_div, parse_wad, percent_mul, price_wad,
+)
+
 # ---------- Env & Constants ----------
 
 def _env(name: str, default: Optional[str] = None, required: bool = False) -> str:
@@ -35,6 +41,7 @@ def _env(name: str, default: Optional[str] = None, required: bool = False) -> st
 
 # RPC/Redis
 RPC_URL = _env("POLYGON_RPC_URL", required=True)
+RPC_URLS = [u for u in (RPC_URL, _env("POLYGON_RPC_BACKUP"), _env("POLYGON_RPC_BACKUP2")) if u]
 REDIS_URL = _env("REDIS_URL", required=True)
 
 # Subgraphs (require explicit config; defaults are safe to change at runtime)
@@ -54,9 +61,9 @@ DUMP_5M_CHANGE = float(_env("VOL_DUMP_5M_CHANGE", "-0.06"))           # -6% in 5
 VOL_SPIKE_MULTIPLE = float(_env("VOL_VOLUME_SPIKE_MULTIPLE", "3.0"))   # recent vs baseline
 CONF_THRESHOLD = float(_env("VOL_CONF_THRESHOLD", "0.6"))
 
-# Economic params
-TRADE_SIZE_USD = Decimal(_env("VOL_TRADE_SIZE_USD", "25000"))
-AAVE_FEE_BPS = Decimal(_env("AAVE_FLASH_FEE_BPS", "9"))  # 0.09%
+# Economic params (USD in WAD, see atom_core.fixed_point)
+TRADE_SIZE_USD = parse_wad(_env("VOL_TRADE_SIZE_USD", "25000"))
+AAVE_FEE_BPS = int(_env("AAVE_FLASH_FEE_BPS", "9"))  # 0.09%
 
 # Metrics / Streams
 METRICS_PORT = int(_env("METRICS_PORT", "9110"))
@@ -133,6 +140,9 @@ class VolatilityScanner:
             "sushiswap": self.w3.eth.contract(SU_FACTORY, abi=FACTORY_ABI),
         }
         self.matic_usd = self.w3.eth.contract(CHAINLINK_MATIC_USD, abi=CL_AGG_ABI)
+        self.rpc = RPCPool(RPC_URLS)
+        self.index = PairIndex(self.rpc, {"quickswap": QS_FACTORY, "sushiswap": SU_FACTORY}, 137)
+        self.state = open_reserves(self.rpc, 137)  # token/USDC reserves, fed by Sync logs
 
         # token_addr -> symbol, pair cache per dex
         self.tracked_tokens: Dict[str, Dict] = {}
@@ -150,6 +160,7 @@ class VolatilityScanner:
     async def init(self):
         self.redis = await redis.from_url(REDIS_URL, encoding="utf-8", decode_responses=True)
         self.session = aiohttp.ClientSession()
+        await self.index.load(self.redis)
         await self.discover_tokens()
         await self.build_pairs_cache()
         jlog("info", event="init", tokens=len(self.tracked_tokens), rpc=RPC_URL, redis=REDIS_URL)
@@ -219,23 +230,22 @@ class VolatilityScanner:
             jlog("error", event="redis_set_error", key="atom:vol:tokens", err=str(e))
 
     async def build_pairs_cache(self):
-        """Cache token/USDC pair addresses for both dexes."""
-        async def get_pair(dex: str, token: str) -> Optional[str]:
-            try:
-                fa = self.factories[dex]
-                pair_addr = await asyncio.to_thread(fa.functions.getPair(token, USDC).call)
-                if pair_addr and int(pair_addr, 16) != 0:
-                    self.pairs[dex][token] = Web3.to_checksum_address(pair_addr)
-                    return self.pairs[dex][token]
-            except Exception as e:
-                MET_ERRORS.inc()
-                jlog("error", event="getPair_error", dex=dex, token=token, err=str(e))
-            return None
-
-        tasks = []
-        for token in self.tracked_tokens.keys():
-            tasks += [get_pair("quickswap", token), get_pair("sushiswap", token)]
-        await asyncio.gather(*tasks)
+        """
+        Cache token/USDC pair addresses for both dexes from the PairCreated index;
+        while a cold index catches up in the background they are read with getPair.
+        """
+        try:
+            if not await self.index.refresh():
+                await self.index.lookup((dex, token, USDC) for dex in self.pairs for token in self.tracked_tokens)
+        except Exception as e:
+            MET_ERRORS.inc()
+            jlog("error", event="pair_index_error", err=str(e))
+        for dex in self.pairs:
+            for token in self.tracked_tokens.keys():
+                pair_addr = self.index.pair(dex, token, USDC)
+                if pair_addr:
+                    self.pairs[dex][token] = pair_addr
+        self.state.track(p for m in self.pairs.values() for p in m.values())
 
         try:
             if self.redis:
@@ -246,55 +256,54 @@ class VolatilityScanner:
 
     # ---------- Price/Volume ----------
 
-    def _price_from_reserves(self, pair_addr: str, token: str) -> Optional[Decimal]:
-        try:
-            pair = self.w3.eth.contract(pair_addr, abi=PAIR_ABI)
-            t0 = Web3.to_checksum_address(pair.functions.token0().call())
-            t1 = Web3.to_checksum_address(pair.functions.token1().call())
-            r0, r1, _ = pair.functions.getReserves().call()
-            # USDC has 6 decimals
-            if t0 == token and t1 == USDC and r0 > 0:
-                return Decimal(r1) / Decimal(10**6) / (Decimal(r0) / Decimal(10**18))
-            if t0 == USDC and t1 == token and r1 > 0:
-                return (Decimal(r0) / Decimal(10**6)) / (Decimal(r1) / Decimal(10**18))
-            return None
-        except Exception as e:
-            MET_ERRORS.inc()
-            jlog("error", event="price_reserve_error", pair=pair_addr, token=token, err=str(e))
+    def _price_from_reserves(self, pair_addr: str, token: str) -> Optional[int]:
+        """Spot USDC per token in WAD from the local reserve table; token order comes from the pair index."""
+        tokens = self.index.tokens_of(pair_addr)
+        reserves = self.state.get(pair_addr)
+        if tokens is None or reserves is None:
             return None
+        t0, t1 = tokens
+        r0, r1 = reserves
+        # USDC has 6 decimals
+        if t0 == token and t1 == USDC:
+            return price_wad(r0, r1, 18, 6) or None
+        if t0 == USDC and t1 == token:
+            return price_wad(r1, r0, 18, 6) or None
+        return None
 
-    async def _price_token_usd(self, token: str) -> Optional[Decimal]:
+    async def _price_token_usd(self, token: str) -> Optional[int]:
         """Try QS first then SU for token/USDc spot via reserves."""
         for dex in ("quickswap", "sushiswap"):
             pair = self.pairs[dex].get(token)
             if not pair:
                 continue
-            p = await asyncio.to_thread(self._price_from_reserves, pair, token)
+            p = self._price_from_reserves(pair, token)
             if p and p > 0:
                 return p
         return None
 
-    async def _token_volume_24h(self, url: str, token: str) -> Optional[Decimal]:
+    async def _token_volume_24h(self, url: str, token: str) -> Optional[float]:
         q = f'{{ token(id: "{token.lower()}") {{ volumeUSD }} }}'
         try:
             assert self.session is not None
             async with self.session.post(url, json={"query": q}, timeout=20) as r:
                 data = await r.json()
                 v = data.get("data", {}).get("token", {}).get("volumeUSD")
-                return Decimal(v) if v is not None else None
+                return float(v) if v is not None else None
         except Exception as e:
             MET_ERRORS.inc()
             jlog("error", event="subgraph_token_error", url=url, token=token, err=str(e))
             return None
 
-    async def _matic_usd_price(self) -> Decimal:
+    async def _matic_usd_price(self) -> int:
+        """MATIC/USD in WAD, 0 if the feed cannot be read."""
         try:
             roundData = await asyncio.to_thread(self.matic_usd.functions.latestRoundData().call)
-            return Decimal(roundData[1]) / Decimal(10**8)  # 8 decimals
+            return chainlink_wad(roundData[1])  # 8 decimals
         except Exception as e:
             MET_ERRORS.inc()
             jlog("error", event="chainlink_error", err=str(e))
-            return Decimal("0")
+            return 0
 
     async def update_feeds(self):
         """Minute-level price/volume updates."""
@@ -303,7 +312,7 @@ class VolatilityScanner:
                 for token in self.tracked_tokens.keys():
                     price = await self._price_token_usd(token)
                     if price:
-                        self.price_history[token].append((int(time.time()), float(price)))
+                        self.price_history[token].append((int(time.time()), from_wad(price)))
                     # alternate subgraph sources to reduce load
                     vol = await self._token_volume_24h(QS_SUBGRAPH_URL, token)
                     if vol is None:
@@ -357,8 +366,8 @@ class VolatilityScanner:
         matic_usd = await self._matic_usd_price()
         gas_price = self.w3.eth.gas_price
         # assume 450k budget for a quick two-hop execution
-        gas_cost_usd = (Decimal(gas_price) * Decimal(450000) / Decimal(1e18)) * matic_usd
-        flash_fee_usd = TRADE_SIZE_USD * (AAVE_FEE_BPS / Decimal(10000))
+        gas_cost_usd = gas_cost_wad(gas_price, 450000, matic_usd)
+        flash_fee_usd = percent_mul(TRADE_SIZE_USD, AAVE_FEE_BPS)
 
         for token, meta in self.tracked_tokens.items():
             ph = [p for _, p in self.price_history.get(token, [])]
@@ -386,9 +395,9 @@ class VolatilityScanner:
             if conf < CONF_THRESHOLD:
                 continue
 
-            price = Decimal(str(ph[-1]))
+            price = ph[-1]
             # crude expected pnl from a 1-leg move size
-            gross = TRADE_SIZE_USD * Decimal(abs(ret5))
+            gross = mul_div(TRADE_SIZE_USD, int(abs(ret5) * WAD), WAD)
             net = gross - gas_cost_usd - flash_fee_usd
 
             sig = VolSignal(
@@ -402,10 +411,10 @@ class VolatilityScanner:
                 vol_spike=float(vspike),
                 pattern=pattern,
                 confidence=float(conf),
-                gas_cost_usd=float(gas_cost_usd),
-                flash_fee_usd=float(flash_fee_usd),
-                net_profit_usd=float(net),
-                amount_usd=float(TRADE_SIZE_USD),
+                gas_cost_usd=from_wad(gas_cost_usd),
+                flash_fee_usd=from_wad(flash_fee_usd),
+                net_profit_usd=from_wad(net),
+                amount_usd=from_wad(TRADE_SIZE_USD),
                 ts=int(time.time()),
             )
             signals.append(sig)
@@ -454,6 +463,7 @@ class VolatilityScanner:
              thresholds=dict(std=VOL_RET_STD_THRESHOLD, pump=PUMP_5M_CHANGE, dump=DUMP_5M_CHANGE))
 
         # background updaters
+        asyncio.create_task(self.state.run())
         asyncio.create_task(self.update_feeds())
 
         # periodic rediscovery
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark: the scanners' per-scan arithmetic in Decimal (as it was) against
+atom_core.fixed_point on ints (as it is now), on the same random reserves.
+
+    python scripts/bench_fixed_point.py [--edges 3000] [--repeat 5]
+"""
+
+import argparse
+import os
+import random
+import time
+from decimal import Decimal
+
+# atom_core reads REDIS_URL on import; nothing here connects
+os.environ.setdefault("REDIS_URL", "redis://localhost:6379/0")
+
+from backend_bots.atom_core.fixed_point import (
+    WAD, chainlink_wad, from_wad, gas_cost_wad, mul_div, percent_mul, price_wad,
+)
+
+FEE_BPS = 30
+FLASH_BPS = 9
+TRADE_USD = 25000
+GAS_LIMIT = 650000
+
+def _reserves(n: int):
+    rnd = random.Random(7)
+    out = []
+    for _ in range(n):
+        d0, d1 = rnd.choice((6, 18)), rnd.choice((6, 18))
+        out.append((rnd.randrange(10 ** 3, 10 ** 9) * 10 ** d0, rnd.randrange(10 ** 3, 10 ** 9) * 10 ** d1, d0, d1))
+    return out
+
+def scan_decimal(edges, gas_price: int, answer: int) -> float:
+    matic_usd = Decimal(answer) / Decimal(10 ** 8)
+    gas = (Decimal(gas_price) * Decimal(GAS_LIMIT) / Decimal(1e18)) * matic_usd
+    trade = Decimal(TRADE_USD)
+    flash = trade * (Decimal(FLASH_BPS) / Decimal(10000))
+    best = Decimal(0)
+    for i in range(0, len(edges) - 2, 3):
+        prices = []
+        for r0, r1, d0, d1 in edges[i:i + 3]:
+            price = (Decimal(r1) / Decimal(10 ** d1)) / (Decimal(r0) / Decimal(10 ** d0))
+            prices.append(price * (Decimal(10000 - FEE_BPS) / Decimal(10000)))
+        product = prices[0] * prices[1] * prices[2]
+        spread = abs(prices[1] - prices[0])
+        gross = trade * (spread / ((prices[0] + prices[1]) / 2)) + trade * (product - 1)
+        best = max(best, gross - gas - flash)
+    return float(best)
+
+def scan_fixed(edges, gas_price: int, answer: int) -> float:
+    gas = gas_cost_wad(gas_price, GAS_LIMIT, chainlink_wad(answer))
+    trade = TRADE_USD * WAD
+    flash = percent_mul(trade, FLASH_BPS)
+    best = 0
+    for i in range(0, len(edges) - 2, 3):
+        prices = [price_wad(r0, r1, d0, d1, FEE_BPS) for r0, r1, d0, d1 in edges[i:i + 3]]
+        product = mul_div(mul_div(prices[0], prices[1], WAD), prices[2], WAD)
+        spread = abs(prices[1] - prices[0])
+        gross = mul_div(trade, 2 * spread, prices[0] + prices[1]) + mul_div(trade, product - WAD, WAD)
+        best = max(best, gross - gas - flash)
+    return from_wad(best)
+
+def _time(fn, *args, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(*args)
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--edges", type=int, default=3000, help="edges priced per scan (3 per cycle)")
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args()
+
+    edges = _reserves(args.edges)
+    gas_price, answer = 45 * 10 ** 9, 52_000_000
+    a, b = scan_decimal(edges, gas_price, answer), scan_fixed(edges, gas_price, answer)
+    print(f"best net: decimal={a:.6f} fixed={b:.6f} diff={abs(a - b):.2e} USD")
+    td = _time(scan_decimal, edges, gas_price, answer, repeat=args.repeat)
+    tf = _time(scan_fixed, edges, gas_price, answer, repeat=args.repeat)
+    per = args.edges / 3
+    print(f"decimal: {td * 1e3:8.2f} ms/scan  {td / per * 1e6:6.2f} us/cycle")
+    print(f"fixed:   {tf * 1e3:8.2f} ms/scan  {tf / per * 1e6:6.2f} us/cycle")
+    print(f"saved:   {(td - tf) * 1e3:8.2f} ms/scan  ({td / tf:.1f}x)")
+
+if __name__ == "__main__":
+    main()
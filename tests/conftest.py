@@ -0,0 +1,24 @@
+"""
+The bots import their shared code as `backend_bots`, but it lives in
+backend-bots/, which is not an importable name; register it under that name.
+"""
+
+import importlib.util
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PKG = os.path.join(ROOT, "backend-bots")
+
+# atom_core reads REDIS_URL on import; nothing under test connects
+os.environ.setdefault("REDIS_URL", "redis://localhost:6379/0")
+
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+if "backend_bots" not in sys.modules:
+    spec = importlib.util.spec_from_file_location("backend_bots", os.path.join(PKG, "__init__.py"),
+                                                  submodule_search_locations=[PKG])
+    module = importlib.util.module_from_spec(spec)
+    sys.modules["backend_bots"] = module
+    spec.loader.exec_module(module)
@@ -0,0 +1,58 @@
+import time
+
+from backend_bots.atom_core.call_cache import BlockCallCache
+
+TO = "0x00000000000000000000000000000000000000AA"
+CALL = {"to": TO, "data": "0x0902F1AC"}
+
+def test_latest_is_scoped_to_head_and_dropped_on_advance():
+    c = BlockCallCache(maxsize=16, head_ttl=60)
+    c.advance(100)
+    k = c.key(CALL, "latest")
+    assert k == (100, TO.lower(), "0x0902f1ac")
+    c.put(k, "r100")
+    assert c.get(c.key(CALL, "latest")) == "r100"
+    c.advance(101)
+    # the block-100 result must never answer a block-101 read
+    assert c.key(CALL, "latest") == (101, TO.lower(), "0x0902f1ac")
+    assert c.is_miss(c.get(c.key(CALL, "latest")))
+    assert c.is_miss(c.get(k))
+    assert len(c._data) == 0
+
+def test_older_blocks_are_ignored():
+    c = BlockCallCache(maxsize=16, head_ttl=60)
+    c.advance(200)
+    c.put(c.key(CALL, 199), "old")
+    assert c.is_miss(c.get(c.key(CALL, 199)))
+    c.advance(150)  # a lagging head report does not move the cache back
+    assert c.head == 200
+    c.put(c.key(CALL, hex(201)), "ahead")
+    c.advance(201)
+    assert c.get(c.key(CALL, 201)) == "ahead"
+
+def test_uncacheable_reads_bypass():
+    c = BlockCallCache(maxsize=16, head_ttl=60)
+    assert c.key(CALL, "latest") is None  # no head yet
+    c.advance(5)
+    assert c.key(CALL, "pending") is None
+    assert c.key(dict(CALL, **{"from": TO}), "latest") is None
+    assert c.key(dict(CALL, value=1), 5) is None
+    assert c.is_miss(c.get(None))
+
+def test_stale_head_bypasses_latest():
+    c = BlockCallCache(maxsize=16, head_ttl=0.01)
+    c.advance(7)
+    c.head_ts = time.monotonic() - 1
+    assert c.key(CALL, "latest") is None
+    assert c.key(CALL, 7) is not None  # pinned reads stay cacheable
+
+def test_lru_eviction():
+    c = BlockCallCache(maxsize=2, head_ttl=60)
+    c.advance(1)
+    keys = [c.key({"to": TO, "data": hex(i)}, 1) for i in range(3)]
+    c.put(keys[0], 0)
+    c.put(keys[1], 1)
+    assert c.get(keys[0]) == 0  # touch 0 so 1 is the eviction candidate
+    c.put(keys[2], 2)
+    assert c.is_miss(c.get(keys[1]))
+    assert c.get(keys[0]) == 0 and c.get(keys[2]) == 2
@@ -0,0 +1,93 @@
+import random
+from fractions import Fraction
+
+from backend_bots.atom_core.cp_cycle import amount_out, compose, cycle_output, optimal_input
+
+V2 = (997, 1000)
+
+def _profit(x, hops, cost_bps=0):
+    return cycle_output(x, hops) - x - x * cost_bps // 10000
+
+def _golden_max(hops, cost_bps, hi):
+    """Integer golden-section search for the best input in [0, hi] (profit is unimodal)."""
+    lo, phi = 0, (5 ** 0.5 - 1) / 2
+    while hi - lo > 3:
+        m1 = hi - int((hi - lo) * phi)
+        m2 = lo + int((hi - lo) * phi)
+        if m1 >= m2:
+            m1, m2 = (lo + hi) // 2, (lo + hi) // 2 + 1
+        if _profit(m1, hops, cost_bps) < _profit(m2, hops, cost_bps):
+            lo = m1
+        else:
+            hi = m2
+    return max(_profit(x, hops, cost_bps) for x in range(lo, hi + 1))
+
+def _cycle(rnd, legs, skew):
+    """Reserves pricing a cycle that gains about `skew` before fees."""
+    hops = []
+    for i in range(legs):
+        r_in = rnd.randrange(10 ** 20, 10 ** 24)
+        r_out = r_in * (1 + (skew if i == 0 else 0))
+        hops.append((r_in, int(r_out), *V2))
+    return hops
+
+def test_amount_out_is_v2_get_amount_out():
+    assert amount_out(10 ** 18, 10 ** 21, 2 * 10 ** 21) == 10 ** 18 * 997 * 2 * 10 ** 21 // (10 ** 21 * 1000 + 10 ** 18 * 997)
+    assert amount_out(0, 1, 1) == 0
+    assert amount_out(1, 0, 1) == 0
+
+def test_compose_is_the_exact_chain():
+    rnd = random.Random(1)
+    for _ in range(50):
+        hops = _cycle(rnd, rnd.randint(2, 5), 0.03)
+        a, b, c = compose(hops)
+        x = rnd.randrange(1, 10 ** 22)
+        exact = Fraction(x)
+        for r_in, r_out, n, d in hops:
+            exact = n * exact * r_out / (d * r_in + n * exact)
+        assert Fraction(a * x, b + c * x) == exact
+        # the pairs round down at every hop, so the chain is at most a few wei below the curve
+        assert 0 <= exact - cycle_output(x, hops) < len(hops)
+
+def test_optimal_input_matches_brute_force_small_reserves():
+    hops = [(1000, 1200, *V2), (1000, 1000, *V2), (1000, 1000, *V2)]
+    best = max(range(0, 400), key=lambda x: _profit(x, hops))
+    x = optimal_input(hops)
+    assert _profit(x, hops) >= _profit(best, hops) - 1
+
+def test_optimal_input_matches_golden_section():
+    rnd = random.Random(2)
+    for _ in range(100):
+        legs = rnd.randint(2, 5)
+        hops = _cycle(rnd, legs, rnd.uniform(0.02, 0.2))
+        cost = rnd.choice((0, 5, 9, 30))
+        x = optimal_input(hops, cost)
+        assert x > 0
+        best = _golden_max(hops, cost, 4 * x + 10)
+        # rounding at each hop can move the integer optimum by a few wei of profit
+        assert _profit(x, hops, cost) >= best - legs - 1
+
+def test_unprofitable_cycle_returns_zero():
+    balanced = [(10 ** 21, 10 ** 21, *V2)] * 3
+    assert optimal_input(balanced) == 0
+    # a 0.5% edge does not survive three 0.30% fees
+    assert optimal_input(_cycle(random.Random(3), 3, 0.005)) == 0
+    # profitable before the flash fee, not after it
+    hops = _cycle(random.Random(4), 2, 0.0065)
+    assert optimal_input(hops) > 0
+    assert optimal_input(hops, cost_bps=30) == 0
+    assert optimal_input([]) == 0
+
+def test_extreme_reserve_ratios():
+    # 6-decimal stable against an 18-decimal token at a 1e15 price ratio, and dust pools
+    hops = [(10 ** 12, 5 * 10 ** 26, *V2), (4 * 10 ** 26, 10 ** 12, *V2)]
+    x = optimal_input(hops, 9)
+    assert x > 0
+    assert _profit(x, hops, 9) >= _golden_max(hops, 9, 4 * x + 10) - 3
+    dust = [(3, 10 ** 30, *V2), (10 ** 30, 2, *V2)]
+    x = optimal_input(dust)
+    assert _profit(x, dust) >= max(_profit(y, dust) for y in range(0, 50))
+    huge = [(10 ** 38, 10 ** 38 * 11 // 10, *V2), (10 ** 38, 10 ** 38, *V2)]
+    x = optimal_input(huge)
+    assert 0 < x < 10 ** 38
+    assert _profit(x, huge) >= _profit(x - 10 ** 30, huge) and _profit(x, huge) >= _profit(x + 10 ** 30, huge)
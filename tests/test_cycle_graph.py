@@ -0,0 +1,119 @@
+import math
+import random
+
+from backend_bots.atom_core.cycle_graph import RateGraph
+
+def _canon(body):
+    i = body.index(min(body))
+    return tuple(body[i:] + body[:i])
+
+def _enumerate(g, sources, max_len, min_len, min_gain):
+    """Unpruned: every simple cycle through a source, by product."""
+    found = {}
+    def walk(s, path, product):
+        for v, (w, _) in g.out.get(path[-1], {}).items():
+            rate = product * math.exp(-w)
+            if v == s:
+                if len(path) >= min_len and rate > 1 + min_gain:
+                    found[_canon(path)] = rate
+            elif v not in path and len(path) < max_len:
+                walk(s, path + [v], rate)
+    for s in sources:
+        walk(s, [s], 1.0)
+    return found
+
+def _result(g, max_len, min_len, min_gain):
+    return {_canon(list(c[:-1])): p for p, c in g.cycles(max_len, min_len, min_gain)}
+
+def _unit_graph(tokens, rnd, spread=0.004):
+    """Rates priced off random token values, so cycles hover around 1 and the bounds must do the pruning."""
+    price = {t: 10 ** rnd.uniform(-3, 4) for t in tokens}
+    g = RateGraph()
+    for u in tokens:
+        for v in rnd.sample(tokens, 5):
+            if u != v:
+                g.set_edge(u, v, price[u] / price[v] * 0.997 * rnd.uniform(1 - spread, 1 + spread), "dex")
+    return g
+
+def test_pruning_keeps_the_best_four_and_five_leg_cycles():
+    g = RateGraph()
+    # a 4-leg cycle worth 1.02 and a 5-leg one worth 1.05; every 3-leg shortcut and decoy loses
+    for u, v, r in [("W", "A", 2000.0), ("A", "B", 0.5), ("B", "C", 1.02), ("C", "W", 0.001),
+                    ("W", "D", 3.0), ("D", "E", 1.0), ("E", "F", 0.5), ("F", "G", 1.4), ("G", "W", 0.5),
+                    ("A", "W", 0.00049), ("B", "W", 0.00098), ("D", "W", 0.33), ("E", "W", 0.33),
+                    ("A", "D", 0.001), ("F", "W", 0.6)]:
+        g.set_edge(u, v, r, "dex")
+    g.track(["W"], 4)
+    got = g.cycles(5, min_len=4, min_gain=0.0009)
+    assert [round(p, 6) for p, _ in got] == [1.05, 1.02]
+    assert got[0][1] == ("W", "D", "E", "F", "G", "W")
+    assert got[1][1] == ("W", "A", "B", "C", "W")
+    assert _result(g, 5, 4, 0.0009).keys() == _enumerate(g, ["W"], 5, 4, 0.0009).keys()
+    # capped by the tracked depth and by max_len
+    assert [c for _, c in g.cycles(4, min_len=4)] == [("W", "A", "B", "C", "W")]
+
+def test_matches_unpruned_enumeration_on_random_graphs():
+    rnd = random.Random(5)
+    for _ in range(25):
+        tokens = [f"T{i}" for i in range(30)]
+        g = _unit_graph(tokens, rnd, spread=0.012)
+        sources = tokens[:4]
+        g.track(sources, 4)
+        for min_len, min_gain in ((4, 0.0009), (2, 0.0), (3, 0.005)):
+            got = _result(g, 5, min_len, min_gain)
+            want = _enumerate(g, sources, 5, min_len, min_gain)
+            assert got.keys() == want.keys()
+            for k in got:
+                assert math.isclose(got[k], want[k], rel_tol=1e-9)
+
+def test_each_cycle_reported_once_across_sources():
+    rnd = random.Random(6)
+    g = _unit_graph([f"T{i}" for i in range(20)], rnd, spread=0.02)
+    g.track([f"T{i}" for i in range(6)], 4)
+    cycles = [_canon(list(c[:-1])) for _, c in g.cycles(5, 2)]
+    assert len(cycles) == len(set(cycles))
+
+def test_incremental_bounds_stay_admissible():
+    """After edges move both ways the kept bounds may be loose, never tighter than exact."""
+    rnd = random.Random(7)
+    tokens = [f"T{i}" for i in range(25)]
+    g = _unit_graph(tokens, rnd)
+    g.track(tokens[:3], 4)
+    for _ in range(10):
+        for u in rnd.sample(tokens, 8):
+            for v, (w, tag) in list(g.out.get(u, {}).items()):
+                if rnd.random() < 0.1:
+                    g.remove_edge(u, v)
+                else:
+                    g.set_edge(u, v, math.exp(-w) * rnd.uniform(0.99, 1.01), tag)
+        exact = RateGraph()
+        exact.out, exact.inc = g.out, g.inc
+        exact.track(tokens[:3], 4)
+        for s in tokens[:3]:
+            for k in range(5):
+                for x, d in exact.bounds[s][k].items():
+                    assert g.bounds[s][k].get(x, math.inf) <= d + 1e-12
+        assert _result(g, 5, 4, 0.0009).keys() == _enumerate(g, tokens[:3], 5, 4, 0.0009).keys()
+    assert g.loosened > 0
+    g.rebuild()
+    assert g.loosened == 0
+
+def test_bulk_load_then_rebuild_matches_incremental():
+    rnd = random.Random(8)
+    tokens = [f"T{i}" for i in range(25)]
+    ref = _unit_graph(tokens, rnd, spread=0.012)
+    ref.track(tokens[:3], 4)
+    edges = [(u, v, math.exp(-w), tag) for u, vs in ref.out.items() for v, (w, tag) in vs.items()]
+    g = RateGraph()
+    g.track(tokens[:3], 4)
+    g.clear()
+    for u, v, rate, tag in edges:
+        g.set_edge(u, v, rate, tag, tighten=False)
+    assert g.bounds[tokens[0]][1] == {tokens[0]: 0.0}  # untouched until the rebuild
+    g.rebuild()
+    assert _result(g, 5, 2, 0.0) == _result(ref, 5, 2, 0.0)
+    for s in tokens[:3]:
+        for k in range(5):
+            assert g.bounds[s][k].keys() == ref.bounds[s][k].keys()
+            for x, d in ref.bounds[s][k].items():
+                assert math.isclose(g.bounds[s][k][x], d, abs_tol=1e-12)
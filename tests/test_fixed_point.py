@@ -0,0 +1,97 @@
+from decimal import Decimal
+
+import pytest
+
+from backend_bots.atom_core.fixed_point import (
+    BPS, WAD, after_fee, chainlink_wad, from_wad, gas_cost_wad, mul_div, mul_div_up, parse_wad,
+    percent_mul, price_wad, to_wad, wad_div, wad_mul,
+)
+
+def test_parse_wad_is_exact():
+    assert parse_wad("25000") == 25000 * WAD
+    assert parse_wad("0.35") == 35 * 10 ** 16
+    assert parse_wad(".5") == WAD // 2
+    assert parse_wad("1.") == WAD
+    assert parse_wad("+2") == 2 * WAD
+    assert parse_wad(9) == 9 * WAD
+    assert parse_wad("0.000000000000000001") == 1
+    # binary floats would not round-trip this
+    assert parse_wad("0.1") * 3 == parse_wad("0.3")
+
+def test_parse_wad_negative():
+    assert parse_wad("-1.5") == -15 * 10 ** 17
+    assert parse_wad("-0.000000000000000001") == -1
+
+@pytest.mark.parametrize("bad", ["", "-", ".", "1e3", "abc", "1.2.3", "0.0000000000000000001", "1,5", "--1"])
+def test_parse_wad_rejects(bad):
+    with pytest.raises(ValueError):
+        parse_wad(bad)
+
+def test_to_wad_scaling():
+    assert to_wad(1_500_000, 6) == parse_wad("1.5")
+    assert to_wad(7, 18) == 7
+    assert to_wad(1, 0) == WAD
+    # more than 18 decimals floors
+    assert to_wad(10 ** 24 - 1, 24) == WAD - 1
+    assert from_wad(parse_wad("1234.5")) == 1234.5
+
+def test_mul_div_rounding_direction():
+    assert mul_div(7, 3, 2) == 10
+    assert mul_div_up(7, 3, 2) == 11
+    assert mul_div(6, 3, 2) == mul_div_up(6, 3, 2) == 9
+    # past 256 bits the intermediate is still exact
+    big = 2 ** 255
+    assert mul_div(big, big, big) == big
+
+def test_mul_div_negative_floors():
+    # a loss rounds away from zero so it is never understated
+    assert mul_div(-7, 3, 2) == -11
+    assert mul_div(-6, 3, 2) == -9
+    assert mul_div_up(-7, 3, 2) == -10
+
+def test_wad_math_rounds_half_up():
+    assert wad_mul(WAD // 2, 3) == 2          # 1.5 -> 2
+    assert wad_mul(WAD // 2 - 1, 3) == 1      # 1.4999.. -> 1
+    assert wad_mul(3 * WAD, 2 * WAD) == 6 * WAD
+    assert wad_div(1, 2 * WAD) == 1           # 0.5 -> 1
+    assert wad_div(1, 3 * WAD) == 0
+    assert wad_div(6 * WAD, 4 * WAD) == parse_wad("1.5")
+
+def test_percent_mul_matches_aave_percentage_math():
+    # (value * bps + 5000) / 10000
+    assert percent_mul(10 ** 6, 9) == 900
+    assert percent_mul(5000, 1) == 1          # 0.5 -> 1
+    assert percent_mul(4999, 1) == 0
+    assert percent_mul(parse_wad("25000"), 9) == parse_wad("22.5")
+    assert percent_mul(123, BPS) == 123
+    assert percent_mul(123, 0) == 0
+
+def test_after_fee_is_v2_floor():
+    assert after_fee(1000, 30) == 997
+    assert after_fee(1001, 30) == 997         # 997.997 floors
+    assert after_fee(10 ** 18, 25) == 9975 * 10 ** 14
+
+def test_price_wad_decimals_and_fee():
+    # 2000 USDC (6) per WETH (18)
+    assert price_wad(10 ** 18, 2000 * 10 ** 6, 18, 6) == 2000 * WAD
+    assert price_wad(2000 * 10 ** 6, 10 ** 18, 6, 18) == WAD // 2000
+    assert price_wad(10 ** 18, 2000 * 10 ** 6, 18, 6, 30) == 1994 * WAD
+    assert price_wad(0, 1, 18, 18) == 0
+    assert price_wad(1, 0, 18, 18) == 0
+    # agrees with the Decimal formula it replaced, to the last WAD unit
+    r0, r1 = 123456789012345678901234, 987654321098
+    dec = (Decimal(r1) / Decimal(10 ** 6)) / (Decimal(r0) / Decimal(10 ** 18)) * Decimal(9970) / Decimal(10000)
+    assert abs(price_wad(r0, r1, 18, 6, 30) - int(dec * WAD)) <= 1
+
+def test_chainlink_wad():
+    assert chainlink_wad(52_000_000) == parse_wad("0.52")
+    assert chainlink_wad(1, 8) == 10 ** 10
+    assert chainlink_wad(10 ** 18, 18) == WAD
+    assert chainlink_wad(0) == 0
+    assert chainlink_wad(-5) == 0
+
+def test_gas_cost_wad():
+    # 650k gas at 30 gwei with MATIC at $0.50 = 0.0195 MATIC = $0.00975
+    assert gas_cost_wad(30 * 10 ** 9, 650_000, chainlink_wad(50_000_000)) == parse_wad("0.00975")
+    assert gas_cost_wad(0, 650_000, WAD) == 0
+    assert gas_cost_wad(1, 1, 1) == 0         # floors
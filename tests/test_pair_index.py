@@ -0,0 +1,57 @@
+import asyncio
+
+from eth_abi import decode, encode
+
+from backend_bots.atom_core import pair_index
+from backend_bots.atom_core.pair_index import PairIndex
+
+FACTORY = "0x5757371414417b8C6CAad45bAeF941aBc7d3Ab32"
+A = "0x" + "aa" * 20
+B = "0x" + "0b" * 20
+PAIR = "0x" + "cc" * 20
+
+class FakeRPC:
+    """Head far past the factory deployment; getPair knows one pair, and every log window is slow."""
+
+    def __init__(self, head):
+        self.head = head
+        self.windows = 0
+
+    async def block_number(self):
+        return self.head
+
+    async def get_logs(self, address, topics, a, b):
+        self.windows += 1
+        await asyncio.sleep(0.001)
+        return []
+
+    async def eth_call(self, to, data, block="latest"):
+        (calls,) = decode(["(address,bool,bytes)[]"], bytes.fromhex(data[2:])[4:])
+        out = []
+        for _, _, cd in calls:
+            a, b = decode(["address", "address"], cd[4:])
+            hit = {a.lower(), b.lower()} == {A, B.lower()}
+            out.append((True, encode(["address"], [PAIR if hit else "0x" + "00" * 20])))
+        return encode(["(bool,bytes)[]"], [out])
+
+def test_cold_index_catches_up_in_background_and_seeds_from_get_pair(tmp_path, monkeypatch):
+    monkeypatch.setattr(pair_index, "LOG_CONCURRENCY", 64)
+    start = pair_index.FACTORY_START_BLOCKS[FACTORY]
+    rpc = FakeRPC(start + 400_000)
+    idx = PairIndex(rpc, {"quickswap": FACTORY}, 137, path=str(tmp_path / "idx.json"))
+
+    async def main():
+        assert await idx.refresh() is False  # returns without scanning 400k blocks
+        assert idx.catching_up and rpc.windows < 200
+        assert await idx.refresh() is False  # no second catch-up while one runs
+        assert await idx.lookup([("quickswap", A, B), ("quickswap", A, PAIR)]) == 1
+        pair = idx.pair("quickswap", pair_index._cs(B), pair_index._cs(A))
+        assert pair == pair_index._cs(PAIR)
+        assert idx.tokens_of(pair) == (pair_index._cs(B), pair_index._cs(A))  # sorted like the factory does
+        assert await idx.wait_caught_up(30)
+        assert idx.checkpoint[pair_index._cs(FACTORY)] == rpc.head
+        rpc.head += 10
+        assert await idx.refresh() is True  # warm: the few new blocks are scanned inline
+        assert idx.checkpoint[pair_index._cs(FACTORY)] == rpc.head
+
+    asyncio.run(main())
@@ -0,0 +1,69 @@
+import asyncio
+import importlib
+import os
+import sys
+import time
+import types
+
+import pytest
+
+FEED = "0x0000000000000000000000000000000000000001"
+
+class _Config:
+    """Stands in for SecureConfig, which exits unless /etc/atom/backend-api.env exists."""
+
+    def __init__(self):
+        self.env = os.environ
+
+    def require(self, key):
+        return self.env.get(key) or FEED
+
+@pytest.fixture(scope="module")
+def pu():
+    saved = sys.modules.get("config.secure_config")
+    sys.modules["config.secure_config"] = types.SimpleNamespace(SecureConfig=_Config)
+    try:
+        # metrics register on import, so the module is loaded once for the file
+        return importlib.import_module("backend_bots.price_utils")
+    finally:
+        if saved is None:
+            sys.modules.pop("config.secure_config")
+        else:
+            sys.modules["config.secure_config"] = saved
+
+@pytest.fixture(autouse=True)
+def empty_cache(pu):
+    pu._cache.clear()
+    pu._refresh_task = None
+
+def _age_cache(pu, sym, seconds):
+    price, ts = pu._cache[sym]
+    pu._cache[sym] = (price, ts - seconds)
+
+def test_failed_refresh_keeps_price_until_it_expires(pu, monkeypatch):
+    reads = {"ETH": {"price": 2000.0, "updated_at": time.time()}}
+    monkeypatch.setattr(pu, "_read_feeds_sync", lambda: dict(reads))
+    assert pu.get_prices_usd(["eth"]) == {"ETH": 2000.0}
+
+    reads["ETH"] = None  # every refresh from here on fails
+    _age_cache(pu, "ETH", pu._PRICE_TTL_SEC + 1)
+    assert pu.get_prices_usd(["ETH"]) == {"ETH": 2000.0}  # stale but inside the window
+    _age_cache(pu, "ETH", pu._PRICE_STALE_SEC)
+    assert pu.get_prices_usd(["ETH"]) == {"ETH": None}
+    assert pu._cache["ETH"][0] == 2000.0  # still the last good price if a read succeeds later
+
+def test_async_getter_expires_too(pu, monkeypatch):
+    reads = {"ETH": {"price": 2000.0, "updated_at": time.time()}}
+
+    async def read():
+        return dict(reads)
+
+    monkeypatch.setattr(pu, "_read_feeds", read)
+
+    async def main():
+        first = await pu.get_prices_usd_async(["ETH"])
+        reads["ETH"] = None
+        _age_cache(pu, "ETH", pu._PRICE_TTL_SEC + pu._PRICE_STALE_SEC + 1)
+        return first, await pu.get_prices_usd_async(["ETH"])
+
+    assert asyncio.run(main()) == ({"ETH": 2000.0}, {"ETH": None})
@@ -0,0 +1,72 @@
+import asyncio
+
+import pytest
+
+from backend_bots.atom_core.ratelimit import (
+    CONFIRMATION, EXECUTION, SCANNING, PriorityTokenBucket, priority_for,
+)
+
+def _noop():
+    pass
+
+def _drained(rate, burst, now=100.0):
+    b = PriorityTokenBucket(rate, burst, label="test")
+    b.tokens = 0.0
+    b._ts = now
+    return b
+
+def test_refill_rate_and_cap():
+    b = _drained(rate=5, burst=10)
+    b._refill(100.4)
+    assert b.tokens == pytest.approx(2.0)
+    b._refill(101.0)
+    assert b.tokens == pytest.approx(5.0)
+    b._refill(200.0)
+    assert b.tokens == 10.0
+
+def test_step_sleeps_until_next_token():
+    b = _drained(rate=5, burst=10)
+    w = b._enqueue(EXECUTION, _noop, 100.0)
+    assert b._step(w, 100.0) == pytest.approx(0.2)
+    assert b._step(w, 100.2) is None
+    assert b.tokens == pytest.approx(0.0)
+
+def test_execution_beats_queued_scanning():
+    b = _drained(rate=10, burst=10)
+    scan = b._enqueue(SCANNING, _noop, 100.0)
+    execn = b._enqueue(EXECUTION, _noop, 100.0)
+    # one token arrives: it goes to the later but more urgent request
+    assert b._step(scan, 100.1) is not None
+    assert b._step(execn, 100.1) is None
+    # scanning may not dip into its reserve (25% of the burst) either
+    assert b._step(scan, 100.4) is not None
+    assert b._step(scan, 100.45) is None
+
+def test_reserve_never_starves_a_small_bucket():
+    b = _drained(rate=10, burst=1)
+    w = b._enqueue(SCANNING, _noop, 100.0)
+    assert b._step(w, 100.1) is None
+
+def test_execution_beats_scanning_under_contention_async():
+    b = PriorityTokenBucket(20, 1, label="test")
+    order = []
+
+    async def take(name, priority):
+        await b.acquire(priority)
+        order.append(name)
+
+    async def main():
+        await b.acquire(EXECUTION)  # drain the single token
+        scans = [asyncio.ensure_future(take(f"scan{i}", SCANNING)) for i in range(2)]
+        await asyncio.sleep(0)
+        execs = [asyncio.ensure_future(take(f"exec{i}", EXECUTION)) for i in range(2)]
+        await asyncio.gather(*scans, *execs)
+
+    asyncio.run(main())
+    assert order == ["exec0", "exec1", "scan0", "scan1"]
+
+def test_priority_for():
+    assert priority_for("eth_sendRawTransaction") == EXECUTION
+    assert priority_for("eth_getTransactionReceipt", SCANNING) == CONFIRMATION
+    assert priority_for("eth_call", EXECUTION) == EXECUTION
+    assert priority_for("eth_call") == SCANNING
@@ -0,0 +1,46 @@
+import asyncio
+
+import pytest
+
+from backend_bots.atom_core.safe_async import CircuitBreaker, CircuitOpenError, guard
+
+def test_cancelled_trial_releases_half_open_slot():
+    b = CircuitBreaker(fail_max=1, reset_after=0.01)
+    b.record(False)
+    assert b.state() == "open"
+
+    async def hang():
+        await asyncio.sleep(10)
+
+    async def ok():
+        return "up"
+
+    async def main():
+        await asyncio.sleep(0.02)  # half-open
+        t = asyncio.ensure_future(guard(hang, breaker=b))
+        await asyncio.sleep(0.01)
+        assert b.trials == 1
+        t.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await t
+        assert b.trials == 0
+        return await guard(ok, breaker=b)
+
+    assert asyncio.run(main()) == "up"
+    assert b.state() == "closed"
+
+def test_retries_stop_with_the_real_error_once_the_breaker_opens():
+    b = CircuitBreaker(fail_max=2, reset_after=30)
+    calls = []
+
+    async def boom():
+        calls.append(1)
+        raise ValueError("node down")
+
+    with pytest.raises(ValueError):
+        asyncio.run(guard(boom, retries=5, backoff=0, breaker=b))
+    assert len(calls) == 2
+    assert b.state() == "open"
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(guard(boom, retries=5, backoff=0, breaker=b))
+    assert len(calls) == 2
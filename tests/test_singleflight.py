@@ -0,0 +1,63 @@
+import asyncio
+
+import pytest
+
+from backend_bots.atom_core.singleflight import SingleFlight
+
+def test_concurrent_calls_share_one_factory_call():
+    sf = SingleFlight("test")
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return 42
+
+    async def main():
+        return await asyncio.gather(*(sf.do("k", fetch) for _ in range(5)))
+
+    assert asyncio.run(main()) == [42] * 5
+    assert len(calls) == 1
+    assert (sf.leaders, sf.shared) == (1, 4)
+    assert not sf.inflight("k")
+
+def test_leader_exception_reaches_every_waiter_and_clears_key():
+    sf = SingleFlight("test")
+    calls = []
+
+    async def boom():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        raise ValueError("node down")
+
+    async def ok():
+        calls.append(1)
+        return "fresh"
+
+    async def main():
+        results = await asyncio.gather(*(sf.do("k", boom) for _ in range(4)), return_exceptions=True)
+        assert not sf.inflight("k")
+        return results, await sf.do("k", ok)
+
+    results, retry = asyncio.run(main())
+    assert all(isinstance(r, ValueError) and str(r) == "node down" for r in results)
+    assert retry == "fresh"  # the failure is not cached
+    assert len(calls) == 2
+
+def test_cancelled_waiter_does_not_cancel_the_others():
+    sf = SingleFlight("test")
+
+    async def slow():
+        await asyncio.sleep(0.02)
+        return "done"
+
+    async def main():
+        leader = asyncio.ensure_future(sf.do("k", slow))
+        waiter = asyncio.ensure_future(sf.do("k", slow))
+        await asyncio.sleep(0)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await waiter
+
+    assert asyncio.run(main()) == "done"
@@ -0,0 +1,146 @@
+from decimal import Decimal, localcontext
+from fractions import Fraction
+
+import pytest
+
+from backend_bots.atom_core.v3_pool import (
+    BURN, MAX_SQRT_RATIO, MAX_TICK, MIN_SQRT_RATIO, MIN_TICK, MINT, Q96, SWAP, V3Pool, sqrt_ratio_at_tick,
+    swap_step,
+)
+
+FEE = 3000
+SPACING = 60
+
+def _topic(v: int) -> bytes:
+    return v.to_bytes(32, "big", signed=True)
+
+def _data(*words: int) -> bytes:
+    return b"".join(w.to_bytes(32, "big", signed=True) for w in words)
+
+def _sig(h: str) -> bytes:
+    return bytes.fromhex(h[2:])
+
+def _pool(positions):
+    """Pool at tick 0 with `positions` [(lower, upper, liquidity)] and bitmap words -2..1 loaded."""
+    p = V3Pool("0xpool", "0xtoken0", "0xtoken1", FEE, SPACING)
+    p.sqrt_price, p.tick = sqrt_ratio_at_tick(0), 0
+    p.set_ticks({}, (-2, 1))
+    for lower, upper, liquidity in positions:
+        p._modify(lower, upper, liquidity)
+    return p
+
+# ---------- TickMath ----------
+
+@pytest.mark.parametrize("tick,expected", [
+    (MIN_TICK, MIN_SQRT_RATIO),
+    (MIN_TICK + 1, 4295343490),
+    (0, Q96),
+    (MAX_TICK - 1, 1461373636630004318706518188784493106690254656249),
+    (MAX_TICK, MAX_SQRT_RATIO),
+])
+def test_sqrt_ratio_at_tick_known_values(tick, expected):
+    assert sqrt_ratio_at_tick(tick) == expected
+
+def test_sqrt_ratio_at_tick_tracks_the_real_price():
+    with localcontext() as ctx:
+        ctx.prec = 60
+        for tick in (-200000, -50, -1, 1, 50, 200000):
+            exact = (Decimal("1.0001") ** tick).sqrt() * Q96
+            assert abs(sqrt_ratio_at_tick(tick) / exact - 1) < Decimal("1e-15")
+
+def test_sqrt_ratio_at_tick_bounds():
+    with pytest.raises(ValueError):
+        sqrt_ratio_at_tick(MIN_TICK - 1)
+    with pytest.raises(ValueError):
+        sqrt_ratio_at_tick(MAX_TICK + 1)
+
+# ---------- swaps ----------
+
+def _reference_zero_for_one(ranges, sqrt_p, amount_in):
+    """
+    Continuous (no rounding) exact-input token0 -> token1 swap over [(lower tick, liquidity)]
+    ranges ordered downward from the price.
+    """
+    p, remaining, out = Fraction(sqrt_p, Q96), Fraction(amount_in) * (10 ** 6 - FEE) / 10 ** 6, Fraction(0)
+    for lower, liquidity in ranges:
+        target = Fraction(sqrt_ratio_at_tick(lower), Q96)
+        need = liquidity * (p - target) / (p * target)
+        if remaining <= need:
+            nxt = liquidity * p / (liquidity + remaining * p)
+            return out + liquidity * (p - nxt)
+        remaining -= need
+        out += liquidity * (p - target)
+        p = target
+    raise AssertionError("swap ran past the reference ranges")
+
+def test_quote_within_one_range_is_one_swap_step():
+    p = _pool([(-600, 600, 10 ** 21)])
+    amount = 10 ** 17
+    sqrt_next, step_in, step_out, fee_amount = swap_step(p.sqrt_price, sqrt_ratio_at_tick(-600), p.liquidity, amount, FEE)
+    assert step_in + fee_amount == amount
+    assert p.quote(True, amount) == step_out
+
+def test_quote_crossing_ticks_matches_continuous_math():
+    # wide position plus a narrow one: swapping down crosses -120 (liquidity drops) then -600 is the edge
+    wide, narrow = 10 ** 21, 4 * 10 ** 21
+    p = _pool([(-600, 600, wide), (-120, 120, narrow)])
+    assert p.liquidity == wide + narrow
+    assert p._initialized == [-10, -2, 2, 10]
+    small = 10 ** 17
+    big = 3 * 10 ** 19  # crosses -120 and stops inside [-600, -120)
+    ranges = [(-120, wide + narrow), (-600, wide)]
+    for amount in (small, big):
+        ref = _reference_zero_for_one(ranges, p.sqrt_price, amount)
+        got = p.quote(True, amount)
+        assert got <= ref  # the pool rounds in its own favour
+        assert ref - got < 10
+    # crossing lowered liquidity, so the marginal output per unit is lower past -120
+    assert p.quote(True, big) / big < p.quote(True, small) / small
+    # the quote does not move the pool
+    assert p.liquidity == wide + narrow and p.tick == 0
+
+def test_quote_one_for_zero_crosses_upward():
+    wide, narrow = 10 ** 21, 4 * 10 ** 21
+    p = _pool([(-600, 600, wide), (-120, 120, narrow)])
+    # mirror pool: swapping token1 up through +120 must equal the token0 side by symmetry at tick 0
+    down, up = p.quote(True, 3 * 10 ** 19), p.quote(False, 3 * 10 ** 19)
+    assert abs(down - up) <= 2
+
+def test_quote_leaving_loaded_words_is_none():
+    p = _pool([(-600, 600, 10 ** 18)])
+    # liquidity ends at -600; past it the search walks to the edge of word -2 and beyond
+    assert p.quote(True, 10 ** 30) is None
+    assert p.quote(True, 0) is None
+
+# ---------- logs ----------
+
+def test_mint_and_burn_update_ticks_and_liquidity():
+    p = _pool([(-600, 600, 10 ** 21)])
+    owner = _topic(0xbeef)
+    # Mint(sender, owner, tickLower, tickUpper, amount, amount0, amount1): amount is data word 1
+    p.apply_log([_sig(MINT), owner, _topic(-120), _topic(180)], _data(0xbeef, 5 * 10 ** 20, 1, 1))
+    assert p._initialized == [-10, -2, 3, 10]
+    assert p.liquidity == 15 * 10 ** 20
+    assert p.gross[-120] == p.gross[180] == 5 * 10 ** 20
+    assert p.net[-120] == 5 * 10 ** 20 and p.net[180] == -5 * 10 ** 20
+    # out of range mint: ticks only
+    p.apply_log([_sig(MINT), owner, _topic(240), _topic(360)], _data(0xbeef, 10 ** 20, 1, 1))
+    assert p._initialized == [-10, -2, 3, 4, 6, 10]
+    assert p.liquidity == 15 * 10 ** 20
+    # Burn(owner, tickLower, tickUpper, amount, amount0, amount1): amount is data word 0
+    p.apply_log([_sig(BURN), owner, _topic(-120), _topic(180)], _data(2 * 10 ** 20, 1, 1))
+    assert p.liquidity == 13 * 10 ** 20
+    assert p._initialized == [-10, -2, 3, 4, 6, 10]
+    p.apply_log([_sig(BURN), owner, _topic(-120), _topic(180)], _data(3 * 10 ** 20, 1, 1))
+    assert p.liquidity == 10 ** 21
+    assert p._initialized == [-10, 4, 6, 10]
+    assert -120 not in p.gross and 180 not in p.net
+    # a zero-amount burn (fee collection poke) changes nothing
+    p.apply_log([_sig(BURN), owner, _topic(240), _topic(360)], _data(0, 0, 0))
+    assert p._initialized == [-10, 4, 6, 10]
+
+def test_swap_log_sets_price_liquidity_tick():
+    p = _pool([(-600, 600, 10 ** 21)])
+    sqrt_p = sqrt_ratio_at_tick(-61)
+    p.apply_log([_sig(SWAP), _topic(1), _topic(2)], _data(10 ** 18, -(10 ** 18), sqrt_p, 7 * 10 ** 20, -61))
+    assert (p.sqrt_price, p.liquidity, p.tick) == (sqrt_p, 7 * 10 ** 20, -61)